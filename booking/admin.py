@@ -6,6 +6,9 @@ admin.site.register(Housing)
 admin.site.register(Review)
 admin.site.register(SearchHistory)
 admin.site.register(ViewHistory)
+admin.site.register(HousingCalendar)
+admin.site.register(HousingDailyStats)
 
 
 
+admin.site.register(TrendingSearch)
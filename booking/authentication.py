@@ -0,0 +1,83 @@
+import time
+
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Поля пользователя, которые передаются в подписанных claims токена:
+# по ним работают проверки прав API без загрузки User
+CLAIM_FIELDS = ('username', 'is_staff', 'is_superuser')
+
+
+def _denied_key(jti):
+    return f'jwt_denied:{jti}'
+
+
+def _revoked_before_key(user_id):
+    return f'jwt_revoked_before:{user_id}'
+
+
+def issue_tokens(user):
+    """
+    Пара токенов пользователя: refresh-токен с claims из CLAIM_FIELDS
+    (access-токен получает их из refresh-токена)
+    """
+    refresh = RefreshToken.for_user(user)
+    for field in CLAIM_FIELDS:
+        refresh[field] = getattr(user, field)
+    return refresh
+
+
+def deny_token(token):
+    """
+    Отзывает токен по jti до истечения его срока. Запись в списке живет
+    не дольше самого токена, поэтому список содержит только отозванные
+    и еще не истекшие токены. Возвращает False, если токен уже был отозван.
+    """
+    ttl = max(int(token['exp'] - time.time()), 1)
+    return cache.add(_denied_key(token[api_settings.JTI_CLAIM]), 1, ttl)
+
+
+def revoke_user_tokens(user_id):
+    """
+    Отзывает все токены пользователя, выпущенные до текущего момента
+    (смена пароля, блокировка, изменение прав). Одна запись на пользователя
+    живет, пока не истекут все выпущенные до нее токены.
+
+    iat токена - целые секунды, поэтому граница отзыва - начало следующей
+    секунды: токены, выпущенные в ту же секунду (в том числе сразу после
+    отзыва), тоже отзываются, выпущенные позже - принимаются.
+    """
+    ttl = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    cache.set(_revoked_before_key(user_id), int(time.time()) + 1, ttl)
+
+
+def is_denied(token):
+    """
+    Отозван ли токен: сам по jti или вместе со всеми токенами пользователя.
+    Одно обращение к кэшу.
+    """
+    denied_key = _denied_key(token.get(api_settings.JTI_CLAIM))
+    revoked_key = _revoked_before_key(token.get(api_settings.USER_ID_CLAIM))
+    entries = cache.get_many([denied_key, revoked_key])
+    if denied_key in entries:
+        return True
+    revoked_before = entries.get(revoked_key)
+    return revoked_before is not None and token.get('iat', 0) < revoked_before
+
+
+class JWTClaimsAuthentication(JWTStatelessUserAuthentication):
+    """
+    Аутентификация по access-токену без обращения к базе: request.user -
+    TokenUser с id, username, is_staff и is_superuser из claims токена.
+    Отзыв токена проверяется по списку в кэше.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_denied(token):
+            raise InvalidToken(_('Token is invalid or expired'))
+        return token
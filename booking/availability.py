@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+
+from django.utils.timezone import now
+
+from .models import Booking, HousingCalendar
+
+# Статусы бронирований, которые занимают даты объекта
+ACTIVE_STATUSES = (Booking.BookingStatus.CONFIRMED, Booking.BookingStatus.PENDING)
+
+
+def rebuild_calendar(housing_id, create=True):
+    """
+    Пересчитывает календарь занятости объекта по его активным бронированиям.
+    Прошедшие интервалы в календарь не попадают, поэтому его размер
+    определяется только будущими бронированиями.
+    При create=False обновляется только уже существующий календарь.
+    """
+    rows = Booking.objects.filter(
+        housing_id=housing_id,
+        status__in=ACTIVE_STATUSES,
+        date_from__isnull=False,
+        date_to__gte=now().date(),
+    ).order_by('date_from', 'id').values_list('date_from', 'date_to', 'id')
+
+    ranges = [[date_from.isoformat(), date_to.isoformat(), booking_id] for date_from, date_to, booking_id in rows]
+    if not create:
+        HousingCalendar.objects.filter(housing_id=housing_id).update(ranges=ranges, updated_at=now())
+        return None
+    calendar, _ = HousingCalendar.objects.update_or_create(
+        housing_id=housing_id,
+        defaults={'ranges': ranges}
+    )
+    return calendar
+
+
+def calendar_ranges(intervals):
+    """
+    Интервалы календаря из {booking_id: (date_from, date_to)} в порядке
+    rebuild_calendar, без прошедших
+    """
+    today = now().date()
+    return [
+        [date_from.isoformat(), date_to.isoformat(), booking_id]
+        for booking_id, (date_from, date_to) in sorted(intervals.items(), key=lambda item: (item[1][0], item[0]))
+        if date_to >= today
+    ]
+
+
+def get_calendar(housing_id):
+    """
+    Возвращает календарь объекта, создавая его при первом обращении
+    """
+    calendar = HousingCalendar.objects.filter(housing_id=housing_id).first()
+    if calendar is None:
+        calendar = rebuild_calendar(housing_id)
+    return calendar
+
+
+def _intervals(calendar, exclude=None):
+    """
+    Интервалы календаря в виде дат, без бронирования exclude (id или объект)
+    """
+    exclude_id = getattr(exclude, 'pk', exclude)
+    for date_from, date_to, booking_id in calendar.ranges:
+        if booking_id != exclude_id:
+            yield date.fromisoformat(date_from), date.fromisoformat(date_to)
+
+
+def busy_ranges(housing_id, start=None, end=None, exclude=None, calendar=None):
+    """
+    Возвращает занятые периоды объекта между start и end в виде
+    объединенных интервалов [(date_from, date_to), ...] (границы включительно)
+    """
+    calendar = calendar or get_calendar(housing_id)
+    merged = []
+    for date_from, date_to in sorted(_intervals(calendar, exclude)):
+        if start is not None and date_to < start:
+            continue
+        if end is not None and date_from > end:
+            continue
+        date_from = max(date_from, start) if start is not None else date_from
+        date_to = min(date_to, end) if end is not None else date_to
+        # Соседние и пересекающиеся интервалы объединяем в один
+        if merged and date_from <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], date_to))
+        else:
+            merged.append((date_from, date_to))
+    return merged
+
+
+def is_available(housing_id, date_from, date_to, exclude=None, calendar=None):
+    """
+    Проверяет, свободен ли объект на все даты периода [date_from, date_to]
+    """
+    return not busy_ranges(housing_id, date_from, date_to, exclude=exclude, calendar=calendar)
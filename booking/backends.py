@@ -1,7 +1,9 @@
 # backends.py
-from django.contrib.auth.backends import BaseBackend
+from django.conf import settings
+from django.contrib.auth.backends import BaseBackend, ModelBackend
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
 
 
 class EmailBackend(BaseBackend):
@@ -19,3 +21,50 @@ class EmailBackend(BaseBackend):
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
             return None
+
+
+def user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def permissions_cache_key(user_id):
+    return f'auth_user_permissions:{user_id}'
+
+
+def invalidate_users(user_ids):
+    """
+    Сбрасывает закэшированных пользователей и их права
+    """
+    cache.delete_many([key for user_id in user_ids
+                       for key in (user_cache_key(user_id), permissions_cache_key(user_id))])
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend с кэшем пользователя сессии и его прав на USER_CACHE_TTL сек.:
+    запросы авторизованных пользователей не читают auth_user на каждой
+    странице. Кэш сбрасывается сигналами (booking.signals) при изменении
+    пользователя, его групп и прав и при выходе из системы.
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Неактивные и удаленные пользователи не кэшируются
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TTL)
+        return user
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if obj is not None or not user_obj.is_active or user_obj.is_anonymous or hasattr(user_obj, '_perm_cache'):
+            return super().get_all_permissions(user_obj, obj)
+        key = permissions_cache_key(user_obj.pk)
+        permissions = cache.get(key)
+        if permissions is None:
+            permissions = super().get_all_permissions(user_obj)
+            cache.set(key, permissions, settings.USER_CACHE_TTL)
+        else:
+            user_obj._perm_cache = permissions
+        return permissions
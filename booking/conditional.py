@@ -0,0 +1,76 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """
+    Слабый ETag из частей ответа: представление (параметры запроса
+    и область видимости) плюс версия данных
+    """
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode(), usedforsecurity=False).hexdigest()
+    return f'W/{quote_etag(digest)}'
+
+
+def list_validators(queryset):
+    """
+    Версия списка одним запросом: MAX(updated_at) и COUNT(*) по отфильтрованным
+    записям. Количество нужно для удалений: они не меняют MAX(updated_at).
+    """
+    version = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    return version['last_modified'], version['count']
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Ответ 304, если у клиента актуальная версия (If-None-Match или
+    If-Modified-Since), иначе None
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для списков и карточек API: при совпадении
+    с If-None-Match (для карточек и If-Modified-Since) возвращается 304 без
+    сериализации. Версия списка - MAX(updated_at) и количество записей после
+    фильтров; списки отдают только ETag: дата с точностью до секунды не
+    отражает удаления и изменения в ту же секунду. Версия карточки -
+    updated_at записи, она отдает ETag и Last-Modified.
+    Вложенные через ?expand= связанные объекты в версию не входят.
+    """
+
+    def representation_key(self):
+        """
+        Все, от чего зависит ответ, кроме самих данных: путь, параметры
+        запроса (фильтры, сортировка, курсор, fields, expand) и пользователь
+        """
+        user = self.request.user
+        return self.request.get_full_path(), user.pk, user.is_staff or user.is_superuser
+
+    def list(self, request, *args, **kwargs):
+        last_modified, count = list_validators(self.filter_queryset(self.get_queryset()))
+        etag = make_etag(*self.representation_key(), last_modified, count)
+        response = not_modified(request, etag, None)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, None)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = make_etag(*self.representation_key(), instance.updated_at)
+        response = not_modified(request, etag, instance.updated_at)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return set_validators(response, etag, instance.updated_at)
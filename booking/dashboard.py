@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.db.models import Count
+from django.utils.timezone import now
+
+from .models import Booking
+
+# Статусы заявок, ожидающих решения владельца
+PENDING_STATUSES = (Booking.BookingStatus.PENDING, Booking.BookingStatus.UNCONFIRMED)
+
+
+def host_bookings(user):
+    """
+    Бронирования объектов владельца user (администратор - все бронирования)
+    """
+    if user.is_staff or user.is_superuser:
+        return Booking.objects.all()
+    return Booking.objects.filter(housing__owner_id=user.pk)
+
+
+def status_counts(bookings):
+    """
+    Количество бронирований по статусам одним групповым запросом
+    (статусы без бронирований - с нулем) и общее количество
+    """
+    rows = bookings.order_by().values_list('status').annotate(count=Count('id'))
+    counts = dict.fromkeys(Booking.BookingStatus.values, 0)
+    counts.update(rows)
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def upcoming_checkins(bookings, limit=None, today=None):
+    """
+    Ближайшие заезды: подтвержденные бронирования с датой начала
+    не раньше сегодняшней, объект и гость загружаются в том же запросе
+    """
+    return list(
+        bookings.filter(status=Booking.BookingStatus.CONFIRMED, date_from__gte=today or now().date())
+        .select_related('housing', 'owner')
+        .order_by('date_from', 'id')[:limit or settings.DASHBOARD_ROWS]
+    )
+
+
+def pending_requests(bookings, limit=None):
+    """
+    Заявки, ожидающие подтверждения, начиная с новых
+    """
+    return list(
+        bookings.filter(status__in=PENDING_STATUSES)
+        .select_related('housing', 'owner')
+        .order_by('-created_at', '-id')[:limit or settings.DASHBOARD_ROWS]
+    )
+
+
+def host_dashboard(user, limit=None):
+    """
+    Сводка владельца по всем его объектам: счетчики по статусам, ближайшие
+    заезды и ожидающие заявки. Три запроса независимо от количества
+    объектов и бронирований.
+    """
+    bookings = host_bookings(user)
+    return {
+        'counts': status_counts(bookings),
+        'upcoming': upcoming_checkins(bookings, limit),
+        'pending': pending_requests(bookings, limit),
+    }
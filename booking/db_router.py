@@ -0,0 +1,129 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Cookie, по которой запросы пользователя после записи читают из основной базы
+STICKY_COOKIE = 'db_primary'
+
+
+class RoutingState:
+    """
+    Маршрутизация текущего HTTP-запроса: реплика для чтения (None - основная
+    база) и признак того, что запрос уже писал в базу
+    """
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+_state = ContextVar('booking_db_routing', default=None)
+
+
+def choose_replica():
+    replicas = settings.READ_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def untracked_writes():
+    """
+    Служебные записи (счетчики просмотров, история поиска) внутри блока
+    не переключают запрос на основную базу и не закрепляют за ней
+    пользователя: их результат не нужно сразу читать обратно
+    """
+    token = _state.set(None)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Чтение из реплик, запись - в основную базу. Из реплики читают только
+    HTTP-запросы безопасными методами (см. ReplicaRoutingMiddleware); команды,
+    фоновые задачи и чтения внутри транзакции идут в основную базу. После
+    первой записи запрос до конца читает из основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None:
+            return DEFAULT_DB_ALIAS
+        # Транзакция (блокировки, проверка пересечений) видит только свои данные
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.replica = None
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы: связи между объектами из них допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплик приносит репликация
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Направляет чтения безопасных запросов (GET, HEAD, OPTIONS) в случайную
+    реплику из READ_REPLICAS. После запроса, который писал в базу, ставит
+    cookie на REPLICA_STICKY_SECONDS: пока она действует, запросы
+    пользователя читают из основной базы и видят свои изменения, даже если
+    реплика отстает.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.routing_state(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.process_response(request, response, state)
+
+    async def __acall__(self, request):
+        # sync_to_async копирует контекст в поток ORM, а состояние - общий
+        # изменяемый объект: запись в потоке видна здесь
+        state = self.routing_state(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.process_response(request, response, state)
+
+    def routing_state(self, request):
+        replica = None
+        if request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES:
+            replica = choose_replica()
+        return RoutingState(replica)
+
+    def process_response(self, request, response, state):
+        if settings.READ_REPLICAS and (state.wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
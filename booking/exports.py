@@ -0,0 +1,117 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .filters import BookingExportFilter, HousingExportFilter, ReviewExportFilter
+from .models import Booking, Housing, Review
+
+# Выгрузки: модель, фильтр и колонки (поля модели и связанных моделей
+# через __ - связи присоединяются в том же запросе)
+EXPORTS = {
+    'bookings': {
+        'model': Booking,
+        'filter': BookingExportFilter,
+        'columns': [
+            'id', 'status', 'date_from', 'date_to', 'created_at',
+            'housing_id', 'housing__name', 'housing__city',
+            'housing__owner_id', 'housing__owner__username',
+            'owner_id', 'owner__username', 'owner__email',
+        ],
+    },
+    'housings': {
+        'model': Housing,
+        'filter': HousingExportFilter,
+        'columns': [
+            'id', 'name', 'type', 'country', 'post_code', 'city', 'street', 'house_number',
+            'rooms', 'price', 'is_visible', 'created_at', 'views', 'review_count', 'rating_avg',
+            'owner_id', 'owner__username',
+        ],
+    },
+    'reviews': {
+        'model': Review,
+        'filter': ReviewExportFilter,
+        'columns': [
+            'id', 'rating', 'text', 'created_at',
+            'housing_id', 'housing__name', 'housing__owner_id',
+            'owner_id', 'owner__username',
+        ],
+    },
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_queryset(kind, user):
+    """
+    Записи, которые пользователь может выгрузить: администратор - все,
+    владелец объектов - записи по своим объектам и свои собственные
+    """
+    model = EXPORTS[kind]['model']
+    queryset = model.objects.all()
+    if user.is_staff or user.is_superuser:
+        return queryset
+    if model is Housing:
+        return queryset.filter(owner_id=user.pk)
+    return queryset.filter(Q(housing__owner_id=user.pk) | Q(owner_id=user.pk))
+
+
+def iter_rows(queryset, columns, chunk_size=None):
+    """
+    Строки queryset (кортежи значений columns) пачками по chunk_size
+    с продолжением после последнего id. В отличие от iterator(),
+    драйверы MySQL и SQLite при этом не загружают в память весь
+    результат сразу, а каждая пачка читается по первичному ключу.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    queryset = queryset.order_by('pk').values_list('pk', *columns)
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(batch[:chunk_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+class Echo:
+    """
+    Псевдофайл для csv.writer: write() возвращает строку, а не пишет ее
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+STREAMS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
+
+
+def export_stream(kind, fmt, queryset):
+    """
+    Генератор строк выгрузки kind в формате fmt: память не зависит
+    от размера выгрузки
+    """
+    columns = EXPORTS[kind]['columns']
+    return STREAMS[fmt](columns, iter_rows(queryset, columns))
@@ -0,0 +1,118 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .filters import HousingFilter
+from .listing_cache import get_or_compute, listing_key, normalize_params
+from .models import Housing
+
+# Параметры фильтра, которые задает каждый фасет. При подсчете фасета
+# они не применяются: счетчики показывают, сколько объектов даст другой
+# выбор в том же фасете, а не только уже выбранное значение
+FACET_PARAMS = {
+    'types': {'type'},
+    'rooms': {'rooms'},
+    'prices': {'price_min', 'price_max', 'price_range'},
+    'locations': set(),
+}
+
+# Шаг цены: границы ценовых диапазонов включительно, как в price_min/price_max
+PRICE_STEP = Decimal('0.01')
+
+
+def _filter_data(filter, exclude=()):
+    return {
+        name: value for name, value in filter.data.items()
+        if name in filter.filters and name not in exclude
+    }
+
+
+def _price_buckets():
+    """
+    Ценовые диапазоны [(min, max), ...] из границ FACET_PRICE_BUCKETS:
+    min включительно, max не включительно (None - без ограничения)
+    """
+    edges = [None] + [Decimal(edge) for edge in settings.FACET_PRICE_BUCKETS] + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def _count_prices(queryset):
+    buckets = _price_buckets()
+    counts = queryset.aggregate(**{
+        f'bucket_{i}': Count('id', filter=Q(
+            **({'price__gte': low} if low is not None else {}),
+            **({'price__lt': high} if high is not None else {}),
+        ))
+        for i, (low, high) in enumerate(buckets)
+    })
+    return [
+        {
+            # Значения можно передать в price_min/price_max как есть
+            'min': str(low) if low is not None else None,
+            'max': str(high - PRICE_STEP) if high is not None else None,
+            'count': counts[f'bucket_{i}'],
+        }
+        for i, (low, high) in enumerate(buckets)
+    ]
+
+
+def _count_types(queryset):
+    labels = dict(Housing.HousingType.choices)
+    rows = queryset.values('type').annotate(count=Count('id')).order_by('-count', 'type')
+    return [{'value': row['type'], 'label': str(labels.get(row['type'], row['type'])), 'count': row['count']}
+            for row in rows]
+
+
+def _count_rooms(queryset):
+    rows = queryset.values('rooms').annotate(count=Count('id')).order_by('rooms')
+    return [{'value': row['rooms'], 'count': row['count']} for row in rows]
+
+
+def _count_locations(queryset):
+    rows = list(queryset.values('country', 'city').annotate(count=Count('id')).order_by('-count', 'country', 'city'))
+    countries = {}
+    for row in rows:
+        countries[row['country']] = countries.get(row['country'], 0) + row['count']
+    return {
+        'countries': [{'value': country, 'count': count}
+                      for country, count in sorted(countries.items(), key=lambda item: (-item[1], item[0]))],
+        'cities': [{'value': row['city'], 'country': row['country'], 'count': row['count']}
+                   for row in rows[:settings.FACET_CITY_LIMIT]],
+    }
+
+
+COUNTERS = {
+    'types': _count_types,
+    'rooms': _count_rooms,
+    'prices': _count_prices,
+    'locations': _count_locations,
+}
+
+
+def compute_facets(filter):
+    """
+    Счетчики фасетов для фильтра: по одному групповому запросу на фасет.
+    Фильтры, не относящиеся к фасетам (в том числе поиск по ключевым
+    словам), применяются один раз в общем базовом queryset.
+    """
+    facet_params = set().union(*FACET_PARAMS.values())
+    base = HousingFilter(_filter_data(filter, exclude=facet_params), queryset=filter.queryset).qs
+    facets = {}
+    for name, counter in COUNTERS.items():
+        data = {param: value for param, value in _filter_data(filter).items()
+                if param in facet_params - FACET_PARAMS[name]}
+        # Сортировка не нужна и попала бы в GROUP BY
+        facets[name] = counter(HousingFilter(data, queryset=base).qs.order_by())
+    return facets
+
+
+def get_facets(filter, scope):
+    """
+    Фасеты для фильтра из кэша по нормализованным параметрам (без сортировки
+    и курсора) и области видимости scope. Для некорректного фильтра - None.
+    """
+    if not filter.is_valid():
+        return None
+    key = listing_key('facets', scope, normalize_params(filter))
+    return get_or_compute(key, lambda: compute_facets(filter), settings.LISTING_CACHE_TTL)
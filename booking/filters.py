@@ -1,7 +1,12 @@
 from django_filters import *
 from rest_framework import filters
 from .models import *
-from django.db.models import Q
+from datetime import datetime, time, timedelta
+from django import forms
+from django.utils import timezone
+from django.db.models import Exists, OuterRef, Q
+from .availability import ACTIVE_STATUSES
+from .search import get_search_backend
 
 
 class FilterByKeywords:
@@ -14,11 +19,23 @@ class FilterByKeywords:
     # Поля, по которым будет производиться поиск:
     keyword_fields = []
 
+    # Использовать полнотекстовый поисковый бэкенд (только для Housing),
+    # если он недоступен - поиск идет через icontains по keyword_fields
+    use_search_backend = False
+
     def filter(self, queryset, value):
         """
         Фильтрует queryset по указанным полям, используя ключевое слово.
         """
-        if not value or not self.keyword_fields:
+        if not value:
+            return queryset
+
+        if self.use_search_backend:
+            backend = get_search_backend()
+            if backend is not None:
+                return backend.filter(queryset, value)
+
+        if not self.keyword_fields:
             return queryset
 
         query = Q()
@@ -36,6 +53,18 @@ class FilterByKeywords:
         return queryset.filter(query)
 
 
+class RelevanceOrderingFilter(filters.OrderingFilter):
+    """
+    Сортировка API: без явного параметра ordering результаты поиска
+    по ключевым словам остаются в порядке релевантности
+    """
+
+    def get_ordering(self, request, queryset, view):
+        if self.ordering_param not in request.query_params and 'search_rank' in queryset.query.annotations:
+            return None
+        return super().get_ordering(request, queryset, view)
+
+
 class HousingFilter(FilterSet):
     # Переменная для диапазона цен:
     price_range = CharFilter(
@@ -75,15 +104,29 @@ class HousingFilter(FilterSet):
         label="Показывать только видимые объекты"
     )
 
+    # Свободные на все даты периода объекты (границы включительно)
+    available_from = DateFilter(
+        method='filter_by_availability',
+        label='Свободно с',
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    available_to = DateFilter(
+        method='filter_by_availability',
+        label='Свободно по',
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+
     class Meta:
         model = Housing
-        fields = ['type', 'price_range', 'price_min', 'price_max', 'rooms', 'keyword', 'is_visible']
+        fields = ['type', 'price_range', 'price_min', 'price_max', 'rooms', 'keyword', 'is_visible',
+                  'available_from', 'available_to']
 
     def filter_by_keyword(self, queryset, name, value):
         """
         Использует FilterByKeywords для фильтрации по ключевым словам.
         """
         keyword_filter = FilterByKeywords()
+        keyword_filter.use_search_backend = True
 
         # Список полей, по которым производится поиск, задается в фильтре HousingFilter.
         keyword_filter.keyword_fields = [
@@ -108,11 +151,75 @@ class HousingFilter(FilterSet):
                 return queryset.none()
         return queryset
 
+    def filter_by_availability(self, queryset, name, value):
+        """
+        Исключает объекты с активными (подтвержденными или ожидающими)
+        бронированиями, пересекающими период available_from - available_to.
+        Если задана одна граница, период - этот день. Обе границы
+        обрабатываются одним подзапросом NOT EXISTS.
+        """
+        dates = self.form.cleaned_data
+        if name == 'available_to' and dates.get('available_from'):
+            # Период уже учтен при обработке available_from
+            return queryset
+        date_from = dates.get('available_from') or value
+        date_to = dates.get('available_to') or value
+        if date_from > date_to:
+            return queryset.none()
+        busy = Booking.objects.filter(
+            housing=OuterRef('pk'),
+            status__in=ACTIVE_STATUSES,
+            date_from__lte=date_to,
+            date_to__gte=date_from,
+        )
+        return queryset.filter(~Exists(busy))
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Добавляем сортировку по умолчанию здесь:
         self.queryset = self.queryset.order_by('-id')
 
 
+class ExportFilter(FilterSet):
+    """
+    Общие фильтры выгрузок: дата создания записи (границы включительно)
+    и владелец записи
+    """
+    created_from = DateFilter(method='filter_by_created', label='Создано с')
+    created_to = DateFilter(method='filter_by_created', label='Создано по')
+    owner = NumberFilter(field_name='owner_id', label='Владелец (id пользователя)')
+
+    def filter_by_created(self, queryset, name, value):
+        """
+        Сравнение с границами суток, а не по created_at__date: так
+        условие использует индекс по created_at
+        """
+        start = timezone.make_aware(datetime.combine(value, time.min))
+        if name == 'created_from':
+            return queryset.filter(created_at__gte=start)
+        return queryset.filter(created_at__lt=start + timedelta(days=1))
+
 
+class HousingExportFilter(ExportFilter):
+    class Meta:
+        model = Housing
+        fields = ['created_from', 'created_to', 'owner', 'is_visible']
 
+
+class BookingExportFilter(ExportFilter):
+    # Бронирования, период которых пересекается с date_from - date_to
+    date_from = DateFilter(field_name='date_to', lookup_expr='gte', label='Период с')
+    date_to = DateFilter(field_name='date_from', lookup_expr='lte', label='Период по')
+    host = NumberFilter(field_name='housing__owner_id', label='Владелец объекта (id пользователя)')
+
+    class Meta:
+        model = Booking
+        fields = ['created_from', 'created_to', 'owner', 'date_from', 'date_to', 'host', 'housing', 'status']
+
+
+class ReviewExportFilter(ExportFilter):
+    host = NumberFilter(field_name='housing__owner_id', label='Владелец объекта (id пользователя)')
+
+    class Meta:
+        model = Review
+        fields = ['created_from', 'created_to', 'owner', 'host', 'housing']
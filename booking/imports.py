@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from .forms import HousingForm
+from .listing_cache import invalidate_housings
+from .models import Housing
+from .rollups import rebuild_stats
+from .search import get_search_backend
+from .serializers import HousingImportSerializer
+
+FORMATS = ('csv', 'ndjson')
+
+# Поля, которые импорт записывает (и обновляет при повторном импорте)
+IMPORT_FIELDS = HousingForm.Meta.fields
+
+
+def detect_format(filename, default=None):
+    """
+    Формат файла импорта по расширению: .csv или .ndjson/.jsonl
+    """
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+
+def read_rows(file, fmt):
+    """
+    Строки файла импорта (бинарного) по одной: (номер строки, словарь полей).
+    Строка NDJSON, которую не удалось разобрать, возвращается как ValueError.
+    """
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Пустые ячейки - отсутствующие значения (для полей с умолчанием)
+            yield reader.line_num, {name: value for name, value in row.items() if name and value != ''}
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f'Некорректный JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            row = ValueError('Строка должна быть JSON-объектом')
+        yield number, row
+
+
+class ImportReport:
+    """
+    Итог импорта: количество созданных, обновленных и отклоненных строк
+    и ошибки по строкам (хранятся первые IMPORT_MAX_ERRORS)
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row, external_id, errors):
+        self.failed += 1
+        if len(self.errors) < settings.IMPORT_MAX_ERRORS:
+            self.errors.append({'row': row, 'external_id': external_id, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'failed': self.failed, 'errors': self.errors}
+
+
+def _write_chunk(housings, owner_id, report):
+    """
+    Записывает пачку объектов одним INSERT ... ON CONFLICT (ON DUPLICATE KEY
+    в MySQL) в транзакции: новые external_id создаются, существующие
+    обновляются. Поисковые документы пачки перестраиваются в той же транзакции.
+    """
+    external_ids = [housing.external_id for housing in housings]
+    queryset = Housing.objects.filter(owner_id=owner_id, external_id__in=external_ids)
+    # MySQL не принимает unique_fields: там конфликт определяется по любому уникальному ключу
+    unique_fields = ['owner', 'external_id'] if connection.features.supports_update_conflicts_with_target else None
+    with transaction.atomic():
+        existing = dict(queryset.values_list('external_id', 'pk'))
+        Housing.objects.bulk_create(
+            housings,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            # updated_at заполняется pre_save при вставке, при обновлении его нужно указать
+            update_fields=[*IMPORT_FIELDS, 'updated_at'],
+        )
+        backend = get_search_backend()
+        if backend is not None:
+            backend.reindex(queryset)
+        # Цена обновленных объектов могла измениться - выручка пересчитывается
+        if existing:
+            rebuild_stats(existing.values())
+    # bulk_create не отправляет сигналов: кэш списков сбрасывается за всю пачку
+    invalidate_housings(existing.values(), [owner_id])
+    report.updated += len(existing)
+    report.created += len(housings) - len(existing)
+
+
+def import_housings(rows, owner_id, chunk_size=None):
+    """
+    Импортирует объекты владельца owner_id из строк (номер, словарь полей),
+    см. read_rows. Строки проверяются по правилам HousingForm и записываются
+    пачками по chunk_size, каждая пачка - в своей транзакции. Повторный
+    импорт с теми же external_id обновляет объекты, а не создает новые.
+    Возвращает ImportReport.
+    """
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    report = ImportReport()
+    # Один сериализатор на весь импорт: поля ModelSerializer строятся один
+    # раз, а не для каждой строки (иначе это большая часть времени импорта)
+    serializer = HousingImportSerializer()
+    seen = set()
+    chunk = []
+    for number, row in rows:
+        if isinstance(row, Exception):
+            report.add_error(number, None, {'non_field_errors': [str(row)]})
+            continue
+        try:
+            data = serializer.run_validation(row)
+        except ValidationError as e:
+            report.add_error(number, row.get('external_id'), e.detail)
+            continue
+        # В одном INSERT одна строка не может обновиться дважды, да и
+        # повтор в файле - скорее ошибка выгрузки партнера
+        if data['external_id'] in seen:
+            report.add_error(number, data['external_id'], {'external_id': ['Повторяется в файле.']})
+            continue
+        seen.add(data['external_id'])
+        chunk.append(Housing(owner_id=owner_id, **data))
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, owner_id, report)
+            chunk = []
+    if chunk:
+        _write_chunk(chunk, owner_id, report)
+    return report
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Housing
+from .pagination import KeysetPage
+from .search import normalize
+
+# Группы инвалидации. Ключ списка включает поколения всех групп, от которых
+# он зависит; изменение данных сдвигает поколение только затронутых групп.
+PUBLIC = 'public'  # видимые объекты (общие для всех пользователей)
+STAFF = 'staff'  # все объекты (администраторы)
+REVIEWS = 'reviews'  # рейтинги и количество отзывов (сортировки по ним)
+BOOKINGS = 'bookings'  # занятость (фильтры по датам доступности)
+
+# Сортировки, порядок которых зависит от отзывов
+REVIEW_SORTS = {'rating_asc', 'rating_desc', 'review_count_desc'}
+
+# Параметры фильтров, результат которых зависит от бронирований
+BOOKING_PARAMS = {'available_from', 'available_to'}
+
+# Варианты карточки объекта: шаблон списка и признак кнопки редактирования
+CARD_VARIANTS = ('index', 'index_editable', 'list')
+
+# Сколько ждать чужого пересчета того же ключа, прежде чем считать самим (сек.)
+LOCK_TIMEOUT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+def owner_group(user_id):
+    return f'owner:{user_id}'
+
+
+def visibility_scope(user):
+    """
+    Область видимости объектов: anonymous, staff или owner:<id>
+    (видимые объекты плюс собственные объекты пользователя)
+    """
+    if not user.is_authenticated:
+        return 'anonymous'
+    if user.is_staff or user.is_superuser:
+        return STAFF
+    return owner_group(user.pk)
+
+
+def _scope_groups(scope):
+    if scope == STAFF:
+        return [STAFF]
+    if scope.startswith('owner:'):
+        return [PUBLIC, scope]
+    return [PUBLIC]
+
+
+def _generation_key(group):
+    return f'listing_generation:{group}'
+
+
+def get_generations(groups):
+    """
+    Текущие поколения групп. Отсутствующее поколение создается со значением
+    текущего времени, а не нуля: после вытеснения из кэша ключи старых
+    записей не совпадут с новыми.
+    """
+    keys = {_generation_key(group): group for group in groups}
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in sorted(keys)]
+
+
+def bump_generations(*groups):
+    cache.set_many({_generation_key(group): time.time_ns() for group in groups}, None)
+
+
+def normalize_params(filter, sort_by=None, cursor=None):
+    """
+    Параметры списка в каноническом виде: только объявленные фильтры
+    с непустыми значениями, в порядке имен; ключевое слово нормализовано
+    """
+    params = {}
+    for name, value in filter.form.cleaned_data.items():
+        if value in (None, '', [], ()):
+            continue
+        if name == 'keyword':
+            value = normalize(value)
+        elif isinstance(value, Decimal):
+            # 2, 2.0 и 2.00 - один и тот же фильтр
+            value = format(value.normalize(), 'f')
+        params[name] = str(value)
+    if sort_by:
+        params['sort_by'] = sort_by
+    if cursor:
+        params['cursor'] = cursor
+    return sorted(params.items())
+
+
+def listing_key(name, scope, params):
+    """
+    Ключ кэша страницы списка: представление, область видимости,
+    нормализованные параметры и поколения групп, от которых зависит результат
+    """
+    groups = _scope_groups(scope)
+    names = {param for param, _ in params}
+    if dict(params).get('sort_by') in REVIEW_SORTS:
+        groups.append(REVIEWS)
+    if names & BOOKING_PARAMS:
+        groups.append(BOOKINGS)
+    payload = json.dumps([name, scope, params, get_generations(groups)], default=str)
+    return f'listing:{name}:{hashlib.md5(payload.encode()).hexdigest()}'
+
+
+def get_or_compute(key, compute, timeout):
+    """
+    Значение из кэша или результат compute(). Одновременные промахи по одному
+    ключу пересчитывает только один запрос: остальные ждут его результат
+    (не дольше LOCK_TIMEOUT), а не нагружают базу тем же запросом.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return compute()
+
+
+def cached_page(name, scope, params, compute_page):
+    """
+    Страница списка из кэша. В кэше хранятся только id объектов (с владельцами)
+    и курсоры, сами карточки кэшируются отдельно (render_cards).
+    При params=None (например, некорректные фильтры) кэш не используется.
+    """
+    # Объекты только что вычисленной страницы: по ним отрисуем недостающие
+    # карточки без повторного запроса (в кэш они не попадают)
+    objects = {}
+
+    def compute():
+        page = compute_page()
+        objects.update((housing.pk, housing) for housing in page)
+        return {
+            'items': [(housing.pk, housing.owner_id) for housing in page],
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        }
+
+    if params is None:
+        cached = compute()
+    else:
+        cached = get_or_compute(listing_key(name, scope, params), compute, settings.LISTING_CACHE_TTL)
+    return {**cached, 'objects': objects}
+
+
+def card_key(housing_id, variant):
+    return f'housing_card:{housing_id}:{variant}'
+
+
+def render_cards(items, variant, user=None, objects=None):
+    """
+    HTML карточек объектов items [(id, owner_id), ...] в том же порядке.
+    Готовые карточки берутся из кэша одним запросом, недостающие
+    объекты берутся из objects или загружаются одним запросом к базе.
+    """
+    def card_variant(owner_id):
+        if variant == 'index' and user is not None and (user.is_staff or user.pk == owner_id):
+            return 'index_editable'
+        return variant
+
+    keys = [card_key(housing_id, card_variant(owner_id)) for housing_id, owner_id in items]
+    cards = cache.get_many(keys)
+    missing = [housing_id for (housing_id, _), key in zip(items, keys) if key not in cards]
+    if missing:
+        objects = objects or {}
+        loaded = [objects[housing_id] for housing_id in missing if housing_id in objects]
+        to_load = [housing_id for housing_id in missing if housing_id not in objects]
+        if to_load:
+            loaded += list(Housing.objects.filter(pk__in=to_load))
+        rendered = {}
+        for housing in loaded:
+            key = card_key(housing.pk, card_variant(housing.owner_id))
+            rendered[key] = render_to_string('booking/housing_card.html', {
+                'el': housing,
+                'editable': key.endswith('index_editable'),
+                'bookable': variant == 'list',
+            })
+        cache.set_many(rendered, settings.HOUSING_CARD_CACHE_TTL)
+        cards.update(rendered)
+    # Объект мог быть удален после кэширования страницы
+    return [cards[key] for key in keys if key in cards]
+
+
+def cards_page(cached, variant, user=None):
+    """
+    Страница для шаблона: карточки вместо объектов и курсоры навигации
+    """
+    cards = render_cards(cached['items'], variant, user, cached.get('objects'))
+    return KeysetPage(cards, cached['next_cursor'], cached['previous_cursor'])
+
+
+def invalidate_housing(housing, was_visible=None):
+    """
+    Объект создан, изменен или удален: сбрасываются его карточки, списки
+    администраторов и владельца, а общие списки - только если объект
+    видим сейчас или был видим до изменения
+    """
+    cache.delete_many([card_key(housing.pk, variant) for variant in CARD_VARIANTS])
+    groups = [STAFF, owner_group(housing.owner_id)]
+    if housing.is_visible or was_visible:
+        groups.append(PUBLIC)
+    bump_generations(*groups)
+
+
+def invalidate_housings(housing_ids, owner_ids):
+    """
+    Пакетное изменение объектов (импорт): карточки сбрасываются одним
+    запросом к кэшу, поколения групп сдвигаются один раз на пакет
+    """
+    cache.delete_many([card_key(housing_id, variant) for housing_id in housing_ids for variant in CARD_VARIANTS])
+    bump_generations(STAFF, PUBLIC, *{owner_group(owner_id) for owner_id in owner_ids})
+
+
+def invalidate_reviews(housing_id):
+    """
+    Отзыв изменил рейтинг объекта: сбрасываются его карточки
+    и списки с сортировкой по рейтингу или количеству отзывов
+    """
+    cache.delete_many([card_key(housing_id, variant) for variant in CARD_VARIANTS])
+    bump_generations(REVIEWS)
+
+
+def invalidate_bookings():
+    """
+    Изменилась занятость: сбрасываются только списки с фильтрами по датам
+    """
+    bump_generations(BOOKINGS)
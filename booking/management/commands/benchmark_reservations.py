@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, connections
+from django.utils.timezone import now
+
+from booking.availability import ACTIVE_STATUSES, is_available
+from booking.models import Booking, Housing
+from booking.reservations import change_status, reserve
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест резервирования: несколько потоков одновременно бронируют '
+            'один объект (со статусом по умолчанию, как форма на сайте) и подтверждают '
+            'бронирования. Проверяет отсутствие пересечений активных бронирований и считает '
+            'бронирования в секунду.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Количество параллельных клиентов')
+        parser.add_argument('--attempts', type=int, default=50, help='Попыток бронирования на клиента')
+        parser.add_argument('--horizon', type=int, default=365, help='Горизонт бронирования в днях')
+        parser.add_argument('--max-nights', type=int, default=7, help='Максимальная длительность бронирования')
+        parser.add_argument('--unsafe', action='store_true',
+                            help='Проверка и сохранение без блокировки (для сравнения)')
+        parser.add_argument('--keep', action='store_true', help='Не удалять созданные данные')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] == ':memory:':
+            self.stderr.write('Нужна файловая база данных: потоки используют отдельные соединения.')
+            return
+
+        suffix = int(time.time())
+        owner = User.objects.create_user(username=f'benchmark_host_{suffix}')
+        guests = [User.objects.create_user(username=f'benchmark_guest_{suffix}_{i}') for i in range(options['threads'])]
+        housing = Housing.objects.create(
+            name='Benchmark reservations', country='DE', post_code='00000', city='Berlin',
+            rooms=1, description='benchmark', price=100, owner=owner
+        )
+
+        stats = {'reserved': 0, 'conflicts': 0, 'errors': 0}
+        lock = threading.Lock()
+        start_date = now().date() + timedelta(days=1)
+
+        def worker(guest, seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(options['attempts']):
+                    date_from = start_date + timedelta(days=rng.randrange(options['horizon']))
+                    date_to = date_from + timedelta(days=rng.randrange(options['max_nights']))
+                    try:
+                        if options['unsafe']:
+                            # Проверка и сохранение без общей блокировки - возможны двойные бронирования
+                            if not is_available(housing.pk, date_from, date_to):
+                                raise ValidationError('busy')
+                            booking = Booking.objects.create(owner=guest, housing=housing,
+                                                             date_from=date_from, date_to=date_to)
+                            booking.status = Booking.BookingStatus.CONFIRMED
+                            booking.save()
+                        else:
+                            # Заявка гостя со статусом по умолчанию, затем подтверждение владельцем
+                            booking = reserve(housing, guest, date_from, date_to)
+                            change_status(booking, Booking.BookingStatus.CONFIRMED)
+                        result = 'reserved'
+                    except ValidationError:
+                        result = 'conflicts'
+                    except DatabaseError:
+                        result = 'errors'
+                    with lock:
+                        stats[result] += 1
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(guest, i)) for i, guest in enumerate(guests)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        overlaps = self.count_overlaps(housing)
+        total = options['threads'] * options['attempts']
+        self.stdout.write(f'Попыток: {total}, подтверждено: {stats["reserved"]}, '
+                          f'отказов (даты заняты): {stats["conflicts"]}, ошибок БД: {stats["errors"]}')
+        self.stdout.write(f'Время: {elapsed:.2f} сек., {total / elapsed:.1f} попыток/сек., '
+                          f'{stats["reserved"] / elapsed:.1f} подтвержденных бронирований/сек.')
+        style = self.style.SUCCESS if not overlaps else self.style.ERROR
+        self.stdout.write(style(f'Пересекающихся пар бронирований: {overlaps}'))
+
+        if not options['keep']:
+            housing.delete()
+            User.objects.filter(pk__in=[owner.pk] + [guest.pk for guest in guests]).delete()
+
+    def count_overlaps(self, housing):
+        bookings = list(
+            Booking.objects.filter(housing=housing, status__in=ACTIVE_STATUSES)
+            .order_by('date_from').values_list('date_from', 'date_to')
+        )
+        overlaps = 0
+        for i, (date_from, date_to) in enumerate(bookings):
+            for other_from, other_to in bookings[i + 1:]:
+                if other_from > date_to:
+                    break
+                overlaps += 1
+        return overlaps
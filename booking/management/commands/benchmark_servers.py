@@ -0,0 +1,138 @@
+import json
+import os
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from .load_test import DEFAULT_MIX
+
+# Команды запуска серверов: {host}, {port}, {workers}, {threads} подставляются из параметров.
+# Серверы по умолчанию не входят в requirements.txt: pip install -r requirements-bench.txt
+DEFAULT_SERVERS = {
+    'wsgi': 'gunicorn config.wsgi:application --bind {host}:{port} --workers {workers} --threads {threads}',
+    'asgi': 'uvicorn config.asgi:application --host {host} --port {port} --workers {workers}',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность приложения под WSGI- и ASGI-сервером: '
+            'по очереди запускает каждый сервер, нагружает его командой load_test '
+            'с одинаковыми параметрами и выводит сравнение по маршрутам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-command', default=DEFAULT_SERVERS['wsgi'], help='Команда запуска WSGI-сервера')
+        parser.add_argument('--asgi-command', default=DEFAULT_SERVERS['asgi'], help='Команда запуска ASGI-сервера')
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес, на котором запускаются серверы')
+        parser.add_argument('--port', type=int, default=8766, help='Порт, на котором запускаются серверы')
+        parser.add_argument('--workers', type=int, default=2, help='Количество процессов сервера')
+        parser.add_argument('--threads', type=int, default=8, help='Количество потоков WSGI-процесса')
+        parser.add_argument('--clients', type=int, default=100, help='Количество параллельных клиентов')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность теста каждого сервера в секундах')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Сценарии и их веса: name=weight,...')
+        parser.add_argument('--prefix', default='seed', help='Префикс пользователей seed_data')
+        parser.add_argument('--password', default='password', help='Пароль пользователей')
+        parser.add_argument('--seed', type=int, default=None, help='Зерно генератора для воспроизводимости')
+        parser.add_argument('--startup-timeout', type=float, default=30, help='Сколько ждать запуска сервера (сек.)')
+        parser.add_argument('--output', help='Сохранить результаты обоих прогонов в JSON-файл')
+
+    def handle(self, *args, **options):
+        commands = {
+            name: options[f'{name}_command'].format(
+                host=options['host'], port=options['port'],
+                workers=options['workers'], threads=options['threads'],
+            )
+            for name in ('wsgi', 'asgi')
+        }
+        # Оба сервера проверяются до первого прогона
+        executables = [shlex.split(command)[0] for command in commands.values()]
+        missing = [executable for executable in executables if not shutil.which(executable)]
+        if missing:
+            raise CommandError(f'Команда не найдена: {", ".join(missing)}. Установите серверы '
+                               f'(pip install -r requirements-bench.txt) или укажите другие команды запуска.')
+
+        results = {}
+        for name, command in commands.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name.upper()}: {command}'))
+            with self.server(command, options['host'], options['port'], options['startup_timeout']):
+                results[name] = self.run_load_test(options)
+
+        self.print_comparison(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    @contextmanager
+    def server(self, command, host, port, timeout):
+        """
+        Запускает сервер и ждет, пока он начнет принимать соединения;
+        при выходе из блока останавливает его вместе с воркерами
+        """
+        if self.port_open(host, port):
+            raise CommandError(f'Порт {host}:{port} уже занят')
+        with tempfile.TemporaryFile() as log:
+            try:
+                # Своя группа процессов, чтобы остановить и воркеры сервера
+                process = subprocess.Popen(
+                    shlex.split(command), stdout=log, stderr=subprocess.STDOUT, start_new_session=True
+                )
+            except FileNotFoundError:
+                raise CommandError(f'Команда не найдена: {shlex.split(command)[0]}. '
+                                   f'Установите сервер или укажите другую команду запуска.')
+            try:
+                deadline = time.monotonic() + timeout
+                while not self.port_open(host, port):
+                    if process.poll() is not None:
+                        log.seek(0)
+                        raise CommandError(f'Сервер завершился при запуске:\n{log.read().decode(errors="replace")}')
+                    if time.monotonic() > deadline:
+                        raise CommandError(f'Сервер не начал принимать соединения за {timeout} сек.')
+                    time.sleep(0.2)
+                yield process
+            finally:
+                if process.poll() is None:
+                    os.killpg(process.pid, signal.SIGTERM)
+                    try:
+                        process.wait(10)
+                    except subprocess.TimeoutExpired:
+                        os.killpg(process.pid, signal.SIGKILL)
+                        process.wait()
+
+    @staticmethod
+    def port_open(host, port):
+        with socket.socket() as sock:
+            sock.settimeout(0.5)
+            return sock.connect_ex((host, port)) == 0
+
+    def run_load_test(self, options):
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'load_test', base_url=f'http://{options["host"]}:{options["port"]}/',
+                clients=options['clients'], duration=options['duration'], mix=options['mix'],
+                prefix=options['prefix'], password=options['password'], seed=options['seed'],
+                output=output.name, stdout=self.stdout, stderr=self.stderr,
+            )
+            return json.load(output)
+
+    def print_comparison(self, results):
+        wsgi, asgi = results['wsgi']['routes'], results['asgi']['routes']
+        self.stdout.write(self.style.MIGRATE_HEADING('Сравнение WSGI / ASGI'))
+        self.stdout.write(f'{"маршрут":<16}{"req/s WSGI":>12}{"req/s ASGI":>12}{"разница":>10}'
+                          f'{"p95 WSGI":>11}{"p95 ASGI":>11}{"ошибок":>10}')
+        for route in [route for route in wsgi if route in asgi]:
+            before, after = wsgi[route], asgi[route]
+            change = (after['rps'] / before['rps'] - 1) * 100 if before['rps'] else 0.0
+            self.stdout.write(
+                f'{route:<16}{before["rps"]:>12.1f}{after["rps"]:>12.1f}{change:>+9.0f}%'
+                f'{before["p95_ms"]:>11.1f}{after["p95_ms"]:>11.1f}'
+                f'{before["errors"]:>5}/{after["errors"]:<4}'
+            )
+
@@ -0,0 +1,60 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from booking import view_buffer as view_buffer_module
+from booking.models import Housing
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность страницы объекта (housing_detail) '
+            'с буфером просмотров и без него. Все изменения откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Количество запросов в каждом прогоне')
+        parser.add_argument('--housing', type=int, default=10, help='Количество объектов, по которым распределяются просмотры')
+        parser.add_argument('--max-events', type=int, default=500, help='Размер пачки буфера')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            owner = User.objects.create_user(username='benchmark_views_owner')
+            viewer = User.objects.create_user(username='benchmark_views_viewer')
+            housing_ids = [
+                Housing.objects.create(
+                    name=f'Benchmark {i}', country='DE', post_code='00000', city='Berlin',
+                    rooms=1, description='benchmark', price=100, owner=owner
+                ).id
+                for i in range(options['housing'])
+            ]
+            urls = [reverse('housing_detail', args=[housing_id]) for housing_id in housing_ids]
+
+            client = Client()
+            client.force_login(viewer)
+
+            results = {}
+            for label, enabled in (('без буфера', False), ('с буфером', True)):
+                buffer = view_buffer_module.ViewBuffer(
+                    max_events=options['max_events'], flush_interval=3600, background=False
+                )
+                with override_settings(VIEW_BUFFER_ENABLED=enabled, ALLOWED_HOSTS=['*']), \
+                        mock.patch.object(view_buffer_module, 'view_buffer', buffer):
+                    started = time.perf_counter()
+                    for i in range(options['requests']):
+                        client.get(urls[i % len(urls)])
+                    buffer.flush()  # Время финальной записи тоже учитываем
+                    elapsed = time.perf_counter() - started
+                results[label] = options['requests'] / elapsed
+                self.stdout.write(f'{label}: {results[label]:.1f} запросов/сек ({elapsed:.2f} сек.)')
+
+            views = sum(Housing.objects.filter(id__in=housing_ids).values_list('views', flat=True))
+            self.stdout.write(f'Учтено просмотров: {views} из {2 * options["requests"]}')
+            self.stdout.write(self.style.SUCCESS(
+                f'Ускорение: x{results["с буфером"] / results["без буфера"]:.2f}'
+            ))
+            transaction.set_rollback(True)
@@ -0,0 +1,50 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.imports import FORMATS, detect_format, import_housings, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Импортирует объекты из CSV или NDJSON пачками (bulk_create в транзакции '
+            'на пачку). Строки проверяются по правилам формы объекта; объекты '
+            'с уже импортированным external_id владельца обновляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл импорта (.csv, .ndjson или .jsonl)')
+        parser.add_argument('--owner', required=True, help='Владелец объектов: имя пользователя или id')
+        parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию - по расширению)')
+        parser.add_argument('--chunk-size', type=int, help='Строк в пачке (по умолчанию IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--report', help='Сохранить отчет с ошибками по строкам в JSON-файл')
+
+    def handle(self, *args, **options):
+        owner = options['owner']
+        try:
+            owner = User.objects.get(pk=int(owner)) if owner.isdigit() else User.objects.get(username=owner)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь не найден: {options["owner"]}')
+        fmt = options['format'] or detect_format(options['path'])
+        if fmt is None:
+            raise CommandError('Не удалось определить формат файла, укажите --format')
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_housings(read_rows(file, fmt), owner.pk, options['chunk_size'])
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать файл: {e}')
+        elapsed = time.perf_counter() - started
+
+        for error in report.errors:
+            self.stderr.write(f'строка {error["row"]} ({error["external_id"]}): {json.dumps(error["errors"], ensure_ascii=False)}')
+        rows = report.created + report.updated + report.failed
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {report.created}, обновлено: {report.updated}, с ошибками: {report.failed} '
+            f'за {elapsed:.1f} сек. ({rows / elapsed * 60 if elapsed else 0:.0f} строк/мин)'
+        ))
+        if options['report']:
+            with open(options['report'], 'w') as file:
+                json.dump(report.as_dict(), file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Отчет сохранен в {options["report"]}')
@@ -0,0 +1,210 @@
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+from django.utils.timezone import now
+
+from booking.models import Housing, SearchHistory
+from booking.views import SORT_ORDERINGS
+
+# Сценарии по умолчанию и их веса
+DEFAULT_MIX = 'housing_list=4,housing_detail=4,create_booking=1,api_housings=1'
+
+
+def percentile(values, p):
+    """
+    Перцентиль по методу ближайшего ранга (values отсортированы)
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class LoadClient:
+    """
+    Клиент нагрузочного теста: отдельная сессия (cookies) и свой генератор
+    случайных чисел
+    """
+
+    def __init__(self, base_url, rng, timeout):
+        self.base_url = base_url
+        self.rng = rng
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+
+    def cookie(self, name):
+        return next((cookie.value for cookie in self.cookies if cookie.name == name), None)
+
+    def login(self, email, password):
+        url = urljoin(self.base_url, reverse('login'))
+        self.opener.open(url, timeout=self.timeout).read()
+        data = urlencode({
+            'email': email, 'password': password, 'csrfmiddlewaretoken': self.cookie('csrftoken') or '',
+        }).encode()
+        self.opener.open(Request(url, data=data, headers={'Referer': url}), timeout=self.timeout).read()
+        return self.cookie('sessionid') is not None
+
+    def get(self, path):
+        """
+        Выполняет GET-запрос: (длительность в секундах, статус, количество SQL-запросов)
+        """
+        started = time.perf_counter()
+        try:
+            with self.opener.open(urljoin(self.base_url, path), timeout=self.timeout) as response:
+                response.read()
+                status, headers = response.status, response.headers
+        except HTTPError as error:
+            status, headers = error.code, error.headers
+        except (URLError, OSError):
+            status, headers = None, {}
+        query_count = headers.get('X-DB-Query-Count')
+        return time.perf_counter() - started, status, int(query_count) if query_count else None
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера по HTTP: параллельные клиенты открывают '
+            'список объектов, страницу объекта, форму бронирования и API. '
+            'Выводит p50/p95/p99 задержки и пропускную способность по каждому маршруту.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/', help='Адрес тестируемого сервера')
+        parser.add_argument('--clients', type=int, default=10, help='Количество параллельных клиентов')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность теста в секундах')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Сценарии и их веса: name=weight,...')
+        parser.add_argument('--prefix', default='seed',
+                            help='Префикс пользователей seed_data: клиент i входит как <prefix>_user_<i>')
+        parser.add_argument('--password', default='password', help='Пароль пользователей')
+        parser.add_argument('--timeout', type=float, default=30, help='Таймаут одного запроса в секундах')
+        parser.add_argument('--seed', type=int, default=None, help='Зерно генератора для воспроизводимости')
+        parser.add_argument('--output', help='Сохранить результаты в JSON-файл (для сравнения прогонов)')
+
+    def handle(self, *args, **options):
+        self.base_url = options['base_url'].rstrip('/') + '/'
+        mix = self.parse_mix(options['mix'])
+        self.housing_ids = list(
+            Housing.objects.filter(is_visible=True).order_by('?').values_list('id', flat=True)[:1000]
+        )
+        if not self.housing_ids:
+            raise CommandError('Нет объектов для теста: заполните базу командой seed_data')
+        self.keywords = list(
+            SearchHistory.objects.values_list('keyword', flat=True).distinct()[:100]
+        ) or ['berlin']
+        # Данные для сценариев собраны, дальше работаем только по HTTP
+        connections.close_all()
+
+        rng = random.Random(options['seed'])
+        clients = []
+        for i in range(options['clients']):
+            client = LoadClient(self.base_url, random.Random(rng.random()), options['timeout'])
+            try:
+                logged_in = client.login(f'{options["prefix"]}_user_{i}@example.com', options['password'])
+            except (URLError, OSError) as error:
+                raise CommandError(f'Сервер {self.base_url} недоступен: {error}')
+            if not logged_in:
+                raise CommandError(f'Не удалось войти как {options["prefix"]}_user_{i}@example.com')
+            clients.append(client)
+
+        samples = defaultdict(list)  # сценарий -> [(длительность, статус, SQL-запросы), ...]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+        names, weights = zip(*mix.items())
+
+        def worker(client):
+            local = defaultdict(list)
+            while time.perf_counter() < deadline:
+                name = client.rng.choices(names, weights=weights)[0]
+                local[name].append(client.get(getattr(self, f'path_{name}')(client.rng)))
+            with lock:
+                for name, results in local.items():
+                    samples[name].extend(results)
+
+        threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        report = self.build_report(samples, elapsed)
+        self.print_report(report, options['clients'], elapsed)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'clients': options['clients'], 'elapsed': elapsed, 'routes': report}, file, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def parse_mix(self, value):
+        mix = {}
+        for item in value.split(','):
+            name, _, weight = item.strip().partition('=')
+            if not hasattr(self, f'path_{name}'):
+                raise CommandError(f'Неизвестный сценарий: {name}')
+            mix[name] = float(weight or 1)
+        return mix
+
+    # Сценарии: каждый возвращает путь очередного запроса
+
+    def path_housing_list(self, rng):
+        params = {'sort_by': rng.choice(list(SORT_ORDERINGS))}
+        if rng.random() < 0.3:
+            params['keyword'] = rng.choice(self.keywords)
+        if rng.random() < 0.3:
+            # Поиск свободных дат: заезд в ближайшие два месяца на 1-14 ночей
+            date_from = now().date() + timedelta(days=rng.randint(1, 60))
+            params['available_from'] = date_from.isoformat()
+            params['available_to'] = (date_from + timedelta(days=rng.randint(1, 14))).isoformat()
+        return f'{reverse("housing_list")}?{urlencode(params)}'
+
+    def path_housing_detail(self, rng):
+        return reverse('housing_detail', args=[rng.choice(self.housing_ids)])
+
+    def path_create_booking(self, rng):
+        return reverse('create_booking', args=[rng.choice(self.housing_ids)])
+
+    def path_api_housings(self, rng):
+        return f'{reverse("housings-list")}?{urlencode({"page_size": 20})}'
+
+    def build_report(self, samples, elapsed):
+        report = {}
+        everything = []
+        for name, results in sorted(samples.items()):
+            everything.extend(results)
+            report[name] = self.summarize(results, elapsed)
+        report['total'] = self.summarize(everything, elapsed)
+        return report
+
+    def summarize(self, results, elapsed):
+        durations = sorted(duration * 1000 for duration, _, _ in results)
+        queries = [query_count for _, _, query_count in results if query_count is not None]
+        return {
+            'requests': len(results),
+            'errors': sum(1 for _, status, _ in results if status is None or status >= 400),
+            'rps': len(results) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'p99_ms': percentile(durations, 99),
+            'max_ms': durations[-1] if durations else 0.0,
+            'avg_queries': sum(queries) / len(queries) if queries else None,
+        }
+
+    def print_report(self, report, clients, elapsed):
+        self.stdout.write(f'Клиентов: {clients}, длительность: {elapsed:.1f} сек.')
+        self.stdout.write(f'{"маршрут":<16}{"запросов":>10}{"ошибок":>8}{"req/s":>9}'
+                          f'{"p50 мс":>9}{"p95 мс":>9}{"p99 мс":>9}{"max мс":>9}{"SQL":>6}')
+        for name, row in report.items():
+            queries = f'{row["avg_queries"]:.1f}' if row['avg_queries'] is not None else '-'
+            line = (f'{name:<16}{row["requests"]:>10}{row["errors"]:>8}{row["rps"]:>9.1f}'
+                    f'{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}{row["p99_ms"]:>9.1f}{row["max_ms"]:>9.1f}{queries:>6}')
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from booking.availability import rebuild_calendar
+from booking.models import Housing
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает календари занятости объектов по активным бронированиям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('housing_ids', nargs='*', type=int, help='id объектов (по умолчанию - все)')
+
+    def handle(self, *args, **options):
+        housing_ids = options['housing_ids'] or Housing.objects.values_list('id', flat=True).iterator()
+        count = 0
+        for housing_id in housing_ids:
+            rebuild_calendar(housing_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Обновлено календарей: {count}'))
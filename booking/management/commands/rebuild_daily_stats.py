@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from booking.rollups import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает с нуля дневную статистику объектов (забронированные ночи, '
+            'начавшиеся бронирования, выручка, отмены)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('housing_ids', nargs='*', type=int, help='id объектов (по умолчанию - все)')
+
+    def handle(self, *args, **options):
+        count = rebuild_stats(options['housing_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено объектов: {count}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля агрегаты отзывов (количество, сумма, гистограмма оценок) объектов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('housing_ids', nargs='*', type=int, help='id объектов (по умолчанию - все)')
+
+    def handle(self, *args, **options):
+        count = rebuild_ratings(options['housing_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено объектов: {count}'))
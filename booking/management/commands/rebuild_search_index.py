@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.models import Housing
+from booking.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковые документы и полнотекстовый индекс объектов'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError('Поисковый бэкенд отключен (SEARCH_BACKEND)')
+
+        count = backend.reindex(Housing.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано объектов: {count}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from booking.models import PopularHousing
+from booking.popularity import prune_view_counts, refresh_leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинги популярных объектов (24ч, 7д, все время) и удаляет устаревшие счетчики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Размер рейтинга')
+
+    def handle(self, *args, **options):
+        for window in PopularHousing.Window.values:
+            leaderboard = refresh_leaderboard(window, options['limit'])
+            self.stdout.write(f'{window}: {len(leaderboard)} объектов')
+        deleted = prune_view_counts()
+        self.stdout.write(self.style.SUCCESS(f'Удалено устаревших счетчиков: {deleted}'))
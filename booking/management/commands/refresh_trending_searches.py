@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from booking.trending import rebuild_trending, refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Применяет затухание к весам популярных запросов и обновляет их список в кэше'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Размер списка')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Пересчитать веса заново по истории поиска')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = rebuild_trending()
+            self.stdout.write(f'Запросов в истории: {count}')
+        top = refresh_trending(options['limit'])
+        for row in top:
+            self.stdout.write(f'{row.keyword}: {row.score:.2f} ({row.searches} поисков)')
+        self.stdout.write(self.style.SUCCESS(f'Популярных запросов: {len(top)}'))
@@ -0,0 +1,243 @@
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.timezone import now
+
+from booking.availability import ACTIVE_STATUSES
+from booking.models import (Booking, Housing, HousingCalendar, HousingViewCount, PopularHousing, Review,
+                            SearchHistory, ViewHistory)
+from booking.popularity import refresh_leaderboard
+from booking.ratings import rebuild_ratings
+from booking.rollups import rebuild_stats
+from booking.search import get_search_backend, normalize
+from booking.trending import rebuild_trending
+
+# Города с весами: несколько крупных городов получают большую часть объявлений
+CITIES = [
+    ('Berlin', '10115', 30), ('München', '80331', 18), ('Hamburg', '20095', 14),
+    ('Köln', '50667', 10), ('Frankfurt am Main', '60311', 9), ('Stuttgart', '70173', 6),
+    ('Düsseldorf', '40213', 5), ('Leipzig', '04109', 4), ('Dresden', '01067', 3),
+    ('Nürnberg', '90402', 2), ('Bremen', '28195', 2), ('Hannover', '30159', 2),
+]
+STREETS = ['Hauptstraße', 'Bahnhofstraße', 'Gartenweg', 'Schulstraße', 'Lindenallee', 'Bergstraße', 'Kirchplatz']
+NOUNS = {
+    Housing.HousingType.APARTMENT: 'квартира', Housing.HousingType.HOUSE: 'дом',
+    Housing.HousingType.STUDIO: 'студия', Housing.HousingType.CASTLE: 'замок',
+    Housing.HousingType.HOTEL: 'гостиница', Housing.HousingType.VILLA: 'вилла',
+    Housing.HousingType.COTTAGE: 'коттедж',
+}
+TYPE_WEIGHTS = [50, 15, 15, 1, 8, 4, 7]
+FEATURES = ['балкон', 'парковка', 'wifi', 'у метро', 'вид на реку', 'сад', 'камин', 'с животными', 'центр']
+REVIEW_TEXTS = {
+    1: 'Очень плохо', 2: 'Не понравилось', 3: 'Нормально', 4: 'Хорошо, рекомендую', 5: 'Отлично!'
+}
+RATING_WEIGHTS = [3, 5, 12, 35, 45]
+STATUS_WEIGHTS = [
+    (Booking.BookingStatus.CONFIRMED, 50), (Booking.BookingStatus.PENDING, 20),
+    (Booking.BookingStatus.CANCELED, 20), (Booking.BookingStatus.UNCONFIRMED, 10),
+]
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными реалистичного распределения '
+            '(пользователи, объекты, бронирования, отзывы, просмотры, поиски) '
+            'пачками через bulk_create и пересчитывает производные таблицы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Количество пользователей')
+        parser.add_argument('--housings', type=int, default=1000, help='Количество объектов')
+        parser.add_argument('--bookings', type=int, default=10, help='Среднее количество бронирований на объект')
+        parser.add_argument('--review-ratio', type=float, default=0.4,
+                            help='Доля завершенных подтвержденных бронирований с отзывом')
+        parser.add_argument('--views', type=int, default=50000, help='Общее количество просмотров')
+        parser.add_argument('--searches', type=int, default=5000, help='Количество записей истории поиска')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create')
+        parser.add_argument('--prefix', default='seed', help='Префикс имен создаваемых пользователей')
+        parser.add_argument('--password', default='password', help='Пароль создаваемых пользователей')
+        parser.add_argument('--seed', type=int, default=None, help='Зерно генератора для воспроизводимости')
+        parser.add_argument('--flush', action='store_true',
+                            help='Удалить ранее созданных пользователей с этим префиксом и их данные')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+
+        if options['flush']:
+            deleted, _ = User.objects.filter(username__startswith=f'{prefix}_').delete()
+            self.stdout.write(f'Удалено строк: {deleted}')
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = self.create_users(prefix, options['users'], options['password'])
+            housings = self.create_housings(users, options['housings'])
+            bookings = self.create_bookings(users, housings, options['bookings'])
+            self.create_calendars(housings, bookings)
+            self.create_reviews(bookings, options['review_ratio'])
+            self.create_views(users, housings, options['views'])
+            self.create_searches(users, options['searches'])
+        self.stdout.write(f'Данные созданы за {time.perf_counter() - started:.1f} сек.')
+
+        # bulk_create не вызывает сигналы - производные данные пересчитываем явно
+        started = time.perf_counter()
+        housing_ids = [housing.pk for housing in housings]
+        rebuild_ratings(housing_ids)
+        rebuild_stats(housing_ids)
+        backend = get_search_backend()
+        if backend is not None:
+            backend.reindex(Housing.objects.filter(pk__in=housing_ids), batch_size=self.batch_size)
+        for window in PopularHousing.Window.values:
+            refresh_leaderboard(window)
+        rebuild_trending()
+        self.stdout.write(f'Рейтинги, дневная статистика, поисковый индекс, лидерборды и популярные запросы пересчитаны '
+                          f'за {time.perf_counter() - started:.1f} сек.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(users)}, объектов: {len(housings)}, бронирований: {len(bookings)}. '
+            f'Вход: {users[0].email} / {options["password"]}'
+        ))
+
+    def bulk_create(self, model, objects):
+        if connection.features.can_return_rows_from_bulk_insert:
+            return model.objects.bulk_create(objects, batch_size=self.batch_size)
+        # MySQL не возвращает id из bulk_create: перечитываем добавленные строки
+        last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return list(model.objects.filter(id__gt=last_id).order_by('id'))
+
+    def zipf_choices(self, population, k, exponent=1.1):
+        """
+        Выбор с распределением Ципфа: первые элементы популярнее остальных
+        """
+        weights = [1 / (rank ** exponent) for rank in range(1, len(population) + 1)]
+        return self.rng.choices(population, weights=weights, k=k)
+
+    def create_users(self, prefix, count, password):
+        # Хеш пароля вычисляется один раз: make_password для каждого пользователя слишком медленный
+        password_hash = make_password(password)
+        User.objects.bulk_create([
+            User(username=f'{prefix}_user_{i}', email=f'{prefix}_user_{i}@example.com', password=password_hash)
+            for i in range(count)
+        ], batch_size=self.batch_size, ignore_conflicts=True)
+        # Повторный запуск переиспользует пользователей с теми же именами
+        return list(User.objects.filter(username__startswith=f'{prefix}_user_').order_by('id'))
+
+    def create_housings(self, users, count):
+        # Небольшая часть пользователей владеет большинством объектов
+        owners = self.zipf_choices(users, count, exponent=0.8)
+        housings = []
+        for owner in owners:
+            city, post_code, _ = self.rng.choices(CITIES, weights=[c[2] for c in CITIES])[0]
+            housing_type = self.rng.choices(Housing.HousingType.values, weights=TYPE_WEIGHTS)[0]
+            rooms = max(1, min(8, int(self.rng.gauss(2.5, 1.2))))
+            # Цены распределены логнормально: много недорогих, длинный хвост дорогих
+            price = Decimal(int(self.rng.lognormvariate(4.4, 0.5)) + rooms * 10)
+            features = ', '.join(self.rng.sample(FEATURES, self.rng.randint(1, 3)))
+            housings.append(Housing(
+                name=f'{NOUNS[housing_type].capitalize()} в {city}, {rooms} комн.',
+                type=housing_type, country='Deutschland', post_code=post_code, city=city,
+                street=self.rng.choice(STREETS), house_number=str(self.rng.randint(1, 150)),
+                rooms=rooms, price=price, owner=owner,
+                description=f'{rooms}-комнатный объект: {features}.',
+                is_visible=self.rng.random() > 0.05,
+            ))
+        return self.bulk_create(Housing, housings)
+
+    def create_bookings(self, users, housings, average):
+        """
+        Бронирования одного объекта идут подряд без пересечений,
+        часть в прошлом, часть в будущем
+        """
+        today = now().date()
+        statuses, status_weights = zip(*STATUS_WEIGHTS)
+        bookings = []
+        for housing in housings:
+            day = today - timedelta(days=self.rng.randint(180, 365))
+            for _ in range(self.rng.randint(0, 2 * average)):
+                day += timedelta(days=self.rng.randint(0, 30))
+                nights = self.rng.randint(1, 14)
+                bookings.append(Booking(
+                    housing=housing, owner=self.rng.choice(users),
+                    status=self.rng.choices(statuses, weights=status_weights)[0],
+                    date_from=day, date_to=day + timedelta(days=nights),
+                ))
+                day += timedelta(days=nights + 1)
+        return self.bulk_create(Booking, bookings)
+
+    def create_calendars(self, housings, bookings):
+        """
+        Календари занятости строим сразу, как их построил бы rebuild_calendar,
+        иначе первые запросы к каждому объекту создают их по одному
+        """
+        today = now().date()
+        ranges = defaultdict(list)
+        for booking in bookings:
+            if booking.status in ACTIVE_STATUSES and booking.date_to >= today:
+                ranges[booking.housing_id].append(
+                    [booking.date_from.isoformat(), booking.date_to.isoformat(), booking.pk]
+                )
+        HousingCalendar.objects.bulk_create([
+            HousingCalendar(housing_id=housing.pk, ranges=sorted(ranges[housing.pk]))
+            for housing in housings
+        ], batch_size=self.batch_size)
+
+    def create_reviews(self, bookings, ratio):
+        today = now().date()
+        reviews = [
+            Review(
+                housing_id=booking.housing_id, owner_id=booking.owner_id,
+                rating=(rating := self.rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0]),
+                text=REVIEW_TEXTS[rating],
+            )
+            for booking in bookings
+            if booking.status == Booking.BookingStatus.CONFIRMED
+            and booking.date_to < today and self.rng.random() < ratio
+        ]
+        return self.bulk_create(Review, reviews)
+
+    def create_views(self, users, housings, total):
+        """
+        Просмотры распределены по Ципфу (немногие объекты собирают большую часть)
+        и разложены по почасовым счетчикам за последнюю неделю
+        """
+        ranked = self.rng.sample(housings, len(housings))
+        per_user = Counter()
+        per_hour = Counter()
+        period_start = now().replace(minute=0, second=0, microsecond=0)
+        for housing in self.zipf_choices(ranked, total):
+            per_user[(self.rng.choice(users).pk, housing.pk)] += 1
+            per_hour[(housing.pk, period_start - timedelta(hours=self.rng.randrange(24 * 7)))] += 1
+
+        self.bulk_create(ViewHistory, [
+            ViewHistory(user_id=user_id, housing_id=housing_id, view_count=count)
+            for (user_id, housing_id), count in per_user.items()
+        ])
+        self.bulk_create(HousingViewCount, [
+            HousingViewCount(housing_id=housing_id, period_start=period, views=count)
+            for (housing_id, period), count in per_hour.items()
+        ])
+        views = Counter()
+        for (_, housing_id), count in per_user.items():
+            views[housing_id] += count
+        for housing in housings:
+            housing.views = views[housing.pk]
+        Housing.objects.bulk_update(housings, ['views'], batch_size=self.batch_size)
+
+    def create_searches(self, users, count):
+        # Запросы - города и типы объектов, популярные встречаются чаще
+        vocabulary = [normalize(word) for word in [city for city, _, _ in CITIES] + list(NOUNS.values()) + FEATURES]
+        searches = Counter(
+            (self.rng.choice(users), keyword) for keyword in self.zipf_choices(vocabulary, count)
+        )
+        # Как и в housing_list: одна запись на пару (пользователь, запрос) со счетчиком
+        SearchHistory.objects.bulk_create([
+            SearchHistory(user=user, keyword=keyword, search_count=search_count)
+            for (user, keyword), search_count in searches.items()
+        ], batch_size=self.batch_size, ignore_conflicts=True)
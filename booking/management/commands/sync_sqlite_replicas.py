@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из DB_REPLICAS (онлайн-копия '
+            'через backup API). Имитирует репликацию для локальной проверки чтения из реплик: '
+            'между запусками реплики отстают от основной базы.')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite: для MySQL используйте репликацию сервера')
+        if not settings.READ_REPLICAS:
+            raise CommandError('Реплики не настроены (DB_REPLICAS)')
+
+        source = sqlite3.connect(settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'])
+        try:
+            for alias in settings.READ_REPLICAS:
+                # Открытые соединения с репликой читали бы старый файл
+                connections[alias].close()
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: {settings.DATABASES[alias]["NAME"]}')
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f'Обновлено реплик: {len(settings.READ_REPLICAS)}'))
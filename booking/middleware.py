@@ -0,0 +1,124 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('booking.queries')
+
+
+class QueryRecorder:
+    """
+    Собирает SQL-запросы, выполненные через подключенные соединения,
+    и их суммарное время. Работает и без DEBUG.
+    """
+
+    def __init__(self):
+        self.queries = []  # [(sql, длительность в секундах), ...]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def record(self):
+        """
+        Контекстный менеджер, подключающий запись ко всем базам данных
+        """
+        stack = ExitStack()
+        for connection in connections.all(initialized_only=False):
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        """
+        Повторяющиеся запросы (одинаковый SQL без учета параметров) - признак N+1
+        """
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+
+def get_query_budget(budgets, url_name, method):
+    """
+    Бюджет SQL-запросов URL для HTTP-метода: число в budgets - бюджет
+    чтения (GET и HEAD), словарь - бюджеты по методам. None, если не задан.
+    """
+    budget = budgets.get(url_name)
+    if isinstance(budget, dict):
+        return budget.get(method.upper())
+    return budget if method.upper() in ('GET', 'HEAD') else None
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает для каждого запроса количество SQL-запросов, время работы
+    с базой и повторяющиеся запросы. Результат отдается в заголовках
+    X-DB-Query-Count, X-DB-Time-Ms, X-DB-Duplicate-Queries и пишется в лог
+    booking.queries. Превышение бюджета из QUERY_BUDGETS логируется
+    как предупреждение.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        # Под ASGI запросы к базе выполняются в потоке sync_to_async этого
+        # запроса, а соединения у каждого потока свои: обертку подключаем там же
+        recorder = QueryRecorder()
+        recording = await sync_to_async(recorder.record)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close)()
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        """
+        Добавляет заголовки со статистикой запросов к базе и пишет ее в лог
+        """
+        duplicates = recorder.duplicates()
+        duplicate_count = sum(count - 1 for count in duplicates.values())
+        response['X-DB-Query-Count'] = str(recorder.count)
+        response['X-DB-Time-Ms'] = f'{recorder.total_time * 1000:.1f}'
+        response['X-DB-Duplicate-Queries'] = str(duplicate_count)
+
+        url_name = getattr(request.resolver_match, 'url_name', None)
+        budget = get_query_budget(settings.QUERY_BUDGETS, url_name, request.method)
+        over_budget = budget is not None and recorder.count > budget
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            '%s %s (%s): %s queries%s, %.1f ms, %s duplicates',
+            request.method, request.path, url_name, recorder.count,
+            f' (budget {budget})' if over_budget else '',
+            recorder.total_time * 1000, duplicate_count,
+        )
+        if duplicates:
+            for sql, count in sorted(duplicates.items(), key=lambda item: -item[1])[:5]:
+                logger.debug('  x%s: %s', count, sql)
+        return response
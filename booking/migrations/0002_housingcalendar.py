@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HousingCalendar',
+            fields=[
+                ('housing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='calendar', serialize=False, to='booking.housing')),
+                ('ranges', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'housing calendar',
+                'verbose_name_plural': 'housing calendars',
+            },
+        ),
+    ]
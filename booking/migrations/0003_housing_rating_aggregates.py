@@ -0,0 +1,86 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    """
+    Заполняет агрегаты отзывов для уже существующих объектов
+    """
+    Housing = apps.get_model('booking', 'Housing')
+    Review = apps.get_model('booking', 'Review')
+    annotations = {'count': Count('id'), 'total': Sum('rating')}
+    for stars in range(1, 6):
+        annotations[f'stars_{stars}'] = Count('id', filter=Q(rating=stars))
+
+    for row in Review.objects.values('housing').annotate(**annotations):
+        changes = {
+            'review_count': row['count'],
+            'rating_sum': row['total'] or 0,
+            'rating_avg': (row['total'] or 0) / row['count'],
+        }
+        for stars in range(1, 6):
+            changes[f'rating_{stars}_count'] = row[f'stars_{stars}']
+        Housing.objects.filter(pk=row['housing']).update(**changes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_housingcalendar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='housing',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='housing',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='housing',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='housing',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='housing',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='housing',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='housing',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='housing',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='housing',
+            index=models.Index(fields=['rating_avg'], name='booking_hou_rating__d20d63_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='housing',
+            index=models.Index(fields=['review_count'], name='booking_hou_review__76e973_idx'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
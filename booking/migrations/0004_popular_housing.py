@@ -0,0 +1,75 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_housing_views(apps, schema_editor):
+    """
+    Переносит накопленные просмотры из истории в поле Housing.views
+    """
+    Housing = apps.get_model('booking', 'Housing')
+    ViewHistory = apps.get_model('booking', 'ViewHistory')
+    for row in ViewHistory.objects.values('housing').annotate(total_views=Sum('view_count')):
+        Housing.objects.filter(pk=row['housing']).update(views=row['total_views'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0003_housing_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HousingViewCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PopularHousing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('24h', 'Last 24 hours'), ('7d', 'Last 7 days'), ('all', 'All time')], max_length=3)),
+                ('rank', models.PositiveIntegerField()),
+                ('views', models.PositiveIntegerField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['window', 'rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='housing',
+            index=models.Index(fields=['views'], name='booking_hou_views_1785a6_idx'),
+        ),
+        migrations.AddField(
+            model_name='housingviewcount',
+            name='housing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_counts', to='booking.housing'),
+        ),
+        migrations.AddField(
+            model_name='popularhousing',
+            name='housing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booking.housing'),
+        ),
+        migrations.AddIndex(
+            model_name='housingviewcount',
+            index=models.Index(fields=['period_start', 'housing'], name='booking_hou_period__4eec1c_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='housingviewcount',
+            constraint=models.UniqueConstraint(fields=('housing', 'period_start'), name='unique_housing_view_period'),
+        ),
+        migrations.AddConstraint(
+            model_name='popularhousing',
+            constraint=models.UniqueConstraint(fields=('window', 'rank'), name='unique_popular_housing_rank'),
+        ),
+        migrations.RunPython(fill_housing_views, migrations.RunPython.noop),
+    ]
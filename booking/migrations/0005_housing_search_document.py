@@ -0,0 +1,76 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:07
+
+import re
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models
+
+FTS_TABLE = 'booking_housing_fts'
+DOCUMENT_FIELDS = ['name', 'description', 'country', 'city', 'street']
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', (text or '').casefold().replace('ё', 'е')))
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Создает полнотекстовый индекс (FTS5 для SQLite, FULLTEXT для MySQL)
+    и заполняет поисковые документы существующих объектов
+    """
+    Housing = apps.get_model('booking', 'Housing')
+    HousingSearchDocument = apps.get_model('booking', 'HousingSearchDocument')
+    vendor = schema_editor.connection.vendor
+
+    fts = False
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(document, tokenize='unicode61 remove_diacritics 2')"
+            )
+            fts = True
+        except OperationalError:
+            # SQLite собран без FTS5 - поиск будет работать по HousingSearchDocument
+            pass
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            f'CREATE FULLTEXT INDEX booking_housing_search_ft ON {HousingSearchDocument._meta.db_table} (document)'
+        )
+
+    documents = [
+        HousingSearchDocument(
+            housing_id=housing.pk,
+            document=normalize(' '.join(str(getattr(housing, field) or '') for field in DOCUMENT_FIELDS))
+        )
+        for housing in Housing.objects.only('id', *DOCUMENT_FIELDS)
+    ]
+    HousingSearchDocument.objects.bulk_create(documents, batch_size=500)
+    if fts:
+        for document in documents:
+            schema_editor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)',
+                [document.housing_id, document.document]
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0004_popular_housing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HousingSearchDocument',
+            fields=[
+                ('housing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='booking.housing')),
+                ('document', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
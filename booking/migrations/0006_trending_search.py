@@ -0,0 +1,88 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:20
+
+import re
+from datetime import timedelta
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    # Копия booking.search.normalize на момент миграции
+    return ' '.join(TOKEN_RE.findall((text or '').casefold().replace('ё', 'е')))
+
+
+def merge_search_history(apps, schema_editor):
+    """
+    Нормализует запросы истории и объединяет дубликаты (пользователь, запрос)
+    """
+    SearchHistory = apps.get_model('booking', 'SearchHistory')
+    merged = {}
+    for entry in SearchHistory.objects.order_by('id'):
+        keyword = normalize(entry.keyword)[:255]
+        key = (entry.user_id, keyword)
+        if not keyword or (entry.user_id is not None and key in merged):
+            target = merged.get(key)
+            if target is not None:
+                target.search_count += entry.search_count
+                target.last_searched_at = max(target.last_searched_at, entry.last_searched_at)
+            entry.delete()
+            continue
+        entry.keyword = keyword
+        merged[key] = entry
+    for entry in merged.values():
+        # update(), чтобы auto_now не перезаписал время последнего поиска
+        SearchHistory.objects.filter(pk=entry.pk).update(
+            keyword=entry.keyword, search_count=entry.search_count, last_searched_at=entry.last_searched_at
+        )
+
+
+def fill_trending_searches(apps, schema_editor):
+    """
+    Начальные веса популярных запросов: вклад записи истории затухает
+    от момента последнего поиска
+    """
+    SearchHistory = apps.get_model('booking', 'SearchHistory')
+    TrendingSearch = apps.get_model('booking', 'TrendingSearch')
+    moment = django.utils.timezone.now()
+    half_life = timedelta(hours=getattr(settings, 'TRENDING_SEARCH_HALF_LIFE', 24))
+    rows = {}
+    for entry in SearchHistory.objects.all():
+        row = rows.setdefault(entry.keyword, TrendingSearch(keyword=entry.keyword, decayed_at=moment))
+        row.score += entry.search_count * 0.5 ** (max(moment - entry.last_searched_at, timedelta(0)) / half_life)
+        row.searches += entry.search_count
+    TrendingSearch.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_housing_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(max_length=255, unique=True)),
+                ('score', models.FloatField(default=0)),
+                ('searches', models.PositiveIntegerField(default=0)),
+                ('decayed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(merge_search_history, migrations.RunPython.noop),
+        migrations.RunPython(fill_trending_searches, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='searchhistory',
+            constraint=models.UniqueConstraint(fields=('user', 'keyword'), name='unique_user_search_keyword'),
+        ),
+        migrations.AddIndex(
+            model_name='trendingsearch',
+            index=models.Index(fields=['-score'], name='booking_tre_score_16f161_idx'),
+        ),
+    ]
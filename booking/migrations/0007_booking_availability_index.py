@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_trending_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['housing', 'status', 'date_from', 'date_to'], name='booking_boo_housing_a395c0_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_view_history(apps, schema_editor):
+    """
+    Объединяет дубликаты (пользователь, объект) в истории просмотров:
+    счетчики складываются в самую раннюю запись
+    """
+    ViewHistory = apps.get_model('booking', 'ViewHistory')
+    duplicates = (
+        ViewHistory.objects.filter(user__isnull=False)
+        .values('user', 'housing').annotate(entries=Count('id')).filter(entries__gt=1)
+    )
+    for pair in list(duplicates):
+        entries = list(ViewHistory.objects.filter(user=pair['user'], housing=pair['housing']).order_by('id'))
+        target = entries[0]
+        # update(), чтобы auto_now не перезаписал время последнего просмотра
+        ViewHistory.objects.filter(pk=target.pk).update(
+            view_count=sum(entry.view_count for entry in entries),
+            last_viewed_at=max(entry.last_viewed_at for entry in entries),
+        )
+        ViewHistory.objects.filter(pk__in=[entry.pk for entry in entries[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_booking_availability_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_boo_status_e01616_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'created_at'], name='booking_boo_status_4662db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='housing',
+            index=models.Index(fields=['created_at'], name='booking_hou_created_198c08_idx'),
+        ),
+        migrations.RunPython(merge_view_history, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='viewhistory',
+            constraint=models.UniqueConstraint(fields=('user', 'housing'), name='unique_user_housing_view'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_query_plan_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='housing',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='External ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='housing',
+            constraint=models.UniqueConstraint(fields=('owner', 'external_id'), name='unique_owner_external_id'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_housing_external_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HousingDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('nights_booked', models.PositiveIntegerField(default=0)),
+                ('bookings_started', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('housing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='booking.housing')),
+            ],
+            options={
+                'verbose_name': 'housing daily stats',
+                'verbose_name_plural': 'housing daily stats',
+                'indexes': [models.Index(fields=['day'], name='booking_hou_day_59c710_idx')],
+                'constraints': [models.UniqueConstraint(fields=('housing', 'day'), name='unique_housing_day_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:12
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    """
+    Для уже существующих записей время изменения неизвестно: берем время создания
+    """
+    for model_name in ('Housing', 'Booking', 'Review'):
+        apps.get_model('booking', model_name).objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_housing_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='housing',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['updated_at'], name='booking_boo_updated_627c16_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='housing',
+            index=models.Index(fields=['is_visible', 'owner', 'updated_at'], name='booking_hou_is_visi_345151_idx'),
+        ),
+    ]
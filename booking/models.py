@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from django.db import models
 from django.db.models import Avg
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 
@@ -35,7 +36,23 @@ class Housing(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owner_housings')
     is_visible = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Время последнего изменения (в том числе счетчиков и агрегатов отзывов):
+    # по нему API отвечает 304 Not Modified на условные запросы
+    updated_at = models.DateTimeField(auto_now=True)
     views = models.IntegerField(default=0)  # Поле для хранения количества просмотров
+    # Идентификатор объекта в системе партнера (импорт): повторный импорт
+    # обновляет объект с тем же external_id у того же владельца
+    external_id = models.CharField(_('External ID'), max_length=100, null=True, blank=True)
+
+    # Денормализованные агрегаты отзывов, обновляются при изменении отзывов
+    review_count = models.PositiveIntegerField(default=0)  # Количество отзывов
+    rating_sum = models.PositiveIntegerField(default=0)  # Сумма оценок
+    rating_avg = models.FloatField(default=0)  # Средняя оценка (для сортировки)
+    rating_1_count = models.PositiveIntegerField(default=0)  # Гистограмма оценок по звездам
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f'{self.name} (Owner: {self.owner.first_name} {self.owner.last_name})'
@@ -46,11 +63,31 @@ class Housing(models.Model):
         indexes = [
             models.Index(fields=['type']),
             models.Index(fields=['price']),
+            models.Index(fields=['rating_avg']),
+            models.Index(fields=['review_count']),
+            models.Index(fields=['views']),
+            # Список объектов, новые первыми: индекс читается с конца до LIMIT.
+            # Составной индекс с is_visible не используется: Django пишет условие
+            # is_visible=True как WHERE "is_visible", а не сравнение с константой
+            models.Index(fields=['created_at']),
+            # Версия списка API (MAX(updated_at) и COUNT по видимым и своим
+            # объектам) читается из этого индекса, без обхода таблицы
+            models.Index(fields=['is_visible', 'owner', 'updated_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'external_id'], name='unique_owner_external_id'),
         ]
 
     def get_average_rating(self):
-        avg_rating = self.reviews.aggregate(Avg('rating')).get('rating__avg')
-        return avg_rating if avg_rating is not None else 0  # Возвращаем 0, если нет отзывов
+        # Берем среднюю оценку из денормализованных полей, без запроса к отзывам
+        return self.rating_avg  # 0, если нет отзывов
+
+    @property
+    def rating_histogram(self):
+        """
+        Количество отзывов по каждой оценке: {1: ..., 2: ..., 5: ...}
+        """
+        return {stars: getattr(self, f'rating_{stars}_count') for stars in range(1, 6)}
 
 
 class Booking(models.Model):
@@ -77,6 +114,9 @@ class Booking(models.Model):
     created_at = models.DateTimeField(
         auto_now_add=True
     ) # Дата создания бронирования
+    updated_at = models.DateTimeField(
+        auto_now=True
+    ) # Дата последнего изменения бронирования
     date_from = models.DateField(
         _('Booking from'),
         null=True,
@@ -103,15 +143,74 @@ class Booking(models.Model):
         verbose_name_plural = _('bookings')
         verbose_name = _('booking')
         indexes = [
-            models.Index(fields=['status']),
+            # Бронирования на подтверждение, новые первыми
+            models.Index(fields=['status', 'created_at']),
             models.Index(fields=['date_from', 'date_to']),
+            # Поиск пересекающихся активных бронирований объекта (фильтр доступности)
+            models.Index(fields=['housing', 'status', 'date_from', 'date_to']),
+            # Версия списка API: MAX(updated_at) и COUNT по индексу
+            models.Index(fields=['updated_at']),
+        ]
+
+
+class HousingDailyStats(models.Model):
+    """
+    Дневные агрегаты бронирований объекта для аналитики: ночи подтвержденных
+    бронирований, начатые бронирования, выручка (цена объекта за каждую
+    ночь) и отмены. Бронирование занимает дни с date_from по date_to
+    включительно. Хранятся только дни с ненулевыми значениями; строки
+    пересчитываются при изменении бронирований и цены (booking.rollups).
+    """
+    housing = models.ForeignKey(Housing, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    nights_booked = models.PositiveIntegerField(default=0)
+    bookings_started = models.PositiveIntegerField(default=0)  # подтвержденные, начинающиеся в этот день
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cancellations = models.PositiveIntegerField(default=0)  # отмененные, начинавшиеся в этот день
+
+    def __str__(self):
+        return f'{self.housing_id} {self.day}: {self.nights_booked} ночей, {self.revenue}'
+
+    class Meta:
+        verbose_name_plural = _('housing daily stats')
+        verbose_name = _('housing daily stats')
+        constraints = [
+            models.UniqueConstraint(fields=['housing', 'day'], name='unique_housing_day_stats'),
+        ]
+        indexes = [
+            # Аналитика администратора по всем объектам за период
+            models.Index(fields=['day']),
         ]
 
 
+class HousingCalendar(models.Model):
+    """
+    Компактный календарь занятости объекта: одна строка на объект,
+    в которой хранятся интервалы активных бронирований (без прошедших дат)
+    """
+    housing = models.OneToOneField(
+        Housing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='calendar'
+    )
+    # Отсортированный список интервалов: [[date_from, date_to, booking_id], ...]
+    ranges = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Календарь {self.housing_id}: {len(self.ranges)} интервалов"
+
+    class Meta:
+        verbose_name_plural = _('housing calendars')
+        verbose_name = _('housing calendar')
+
+
 class Review(models.Model):
     rating = models.IntegerField(_('Rating'))
     text = models.TextField(_('Review'))
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
     housing = models.ForeignKey(Housing, on_delete=models.CASCADE, related_name='reviews')
 
@@ -135,6 +234,34 @@ class SearchHistory(models.Model):
     def __str__(self):
         return f"{self.keyword} ({self.search_count} раз)"
 
+    class Meta:
+        constraints = [
+            # Запрос хранится нормализованным, одна запись на пару (пользователь, запрос)
+            models.UniqueConstraint(fields=['user', 'keyword'], name='unique_user_search_keyword'),
+        ]
+
+
+class TrendingSearch(models.Model):
+    """
+    Компактная таблица популярных запросов с затуханием по времени:
+    score рассчитан на момент decayed_at, общий для всех строк. Поиск
+    добавляет к score единицу, деленную на коэффициент затухания от этого
+    момента (период полураспада TRENDING_SEARCH_HALF_LIFE); периодический
+    пересчет переносит момент на текущее время.
+    """
+    keyword = models.CharField(max_length=255, unique=True)  # Нормализованный запрос
+    score = models.FloatField(default=0)  # Вес запроса с учетом затухания
+    searches = models.PositiveIntegerField(default=0)  # Всего поисков
+    decayed_at = models.DateTimeField(default=now)  # Момент, на который рассчитан score
+
+    def __str__(self):
+        return f"{self.keyword} ({self.score:.2f})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score']),
+        ]
+
 
 class ViewHistory(models.Model):
     """
@@ -148,4 +275,70 @@ class ViewHistory(models.Model):
     def __str__(self):
         return f"{self.housing.name} - {self.view_count} просмотров"
 
+    class Meta:
+        constraints = [
+            # Одна запись со счетчиком на пару (пользователь, объект)
+            models.UniqueConstraint(fields=['user', 'housing'], name='unique_user_housing_view'),
+        ]
+
+
+
+class HousingViewCount(models.Model):
+    """
+    Почасовой счетчик просмотров объекта (для окон популярности 24ч/7д)
+    """
+    housing = models.ForeignKey(Housing, on_delete=models.CASCADE, related_name='view_counts')
+    period_start = models.DateTimeField()  # Начало часа, к которому относятся просмотры
+    views = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.housing_id} - {self.period_start}: {self.views}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['housing', 'period_start'], name='unique_housing_view_period'),
+        ]
+        indexes = [
+            models.Index(fields=['period_start', 'housing']),
+        ]
+
 
+class PopularHousing(models.Model):
+    """
+    Материализованный рейтинг самых просматриваемых объектов за окно времени
+    """
+    class Window(models.TextChoices):
+        DAY = '24h', _('Last 24 hours')
+        WEEK = '7d', _('Last 7 days')
+        ALL = 'all', _('All time')
+
+    window = models.CharField(max_length=3, choices=Window.choices)
+    rank = models.PositiveIntegerField()
+    housing = models.ForeignKey(Housing, on_delete=models.CASCADE, related_name='+')
+    views = models.PositiveIntegerField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.window} #{self.rank}: {self.housing_id} ({self.views})"
+
+    class Meta:
+        ordering = ['window', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'rank'], name='unique_popular_housing_rank'),
+        ]
+
+
+class HousingSearchDocument(models.Model):
+    """
+    Нормализованный (приведенный к нижнему регистру) текст объекта для полнотекстового поиска
+    """
+    housing = models.OneToOneField(
+        Housing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    document = models.TextField()
+
+    def __str__(self):
+        return f"Поисковый документ {self.housing_id}"
@@ -0,0 +1,298 @@
+import datetime
+import json
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+CURSOR_SALT = 'booking.pagination'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    В отличие от DjangoJSONEncoder, сохраняет микросекунды: значения
+    курсора сравниваются с базой на точное равенство
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorSerializer:
+    """
+    JSON-сериализатор курсора, понимающий даты и Decimal
+    """
+
+    def dumps(self, obj):
+        return json.dumps(obj, cls=CursorEncoder, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(values, reverse=False):
+    """
+    Упаковывает значения ключа сортировки в непрозрачную подписанную строку
+    """
+    return signing.dumps({'v': values, 'r': reverse}, salt=CURSOR_SALT, serializer=CursorSerializer, compress=True)
+
+
+def decode_cursor(cursor):
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT, serializer=CursorSerializer)
+        return data['v'], bool(data['r'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def normalize_ordering(ordering):
+    """
+    Дополняет сортировку полем id, чтобы ключ сортировки был уникальным
+    """
+    ordering = ['id' if field == 'pk' else '-id' if field == '-pk' else field for field in ordering]
+    if not any(field.lstrip('-') == 'id' for field in ordering):
+        descending = ordering and ordering[-1].startswith('-')
+        ordering.append('-id' if descending else 'id')
+    return ordering
+
+
+def _cursor_value(obj, name):
+    """
+    Значение поля сортировки у объекта (для внешних ключей - id)
+    """
+    for part in name.split('__')[:-1]:
+        obj = getattr(obj, part)
+    name = name.split('__')[-1]
+    try:
+        field = obj._meta.get_field(name)
+        if field.is_relation and field.concrete:
+            name = field.attname
+    except (AttributeError, FieldDoesNotExist):
+        pass
+    return getattr(obj, name)
+
+
+def _is_nullable(model, name):
+    """
+    Может ли поле сортировки (в том числе через связи __) быть NULL
+    """
+    try:
+        for part in name.split('__'):
+            field = model._meta.get_field(part)
+            if field.null:
+                return True
+            model = field.related_model
+    except (AttributeError, FieldDoesNotExist):
+        return False
+    return False
+
+
+class KeysetPage:
+    """
+    Страница результатов keyset-пагинации
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Keyset-пагинация: следующая страница выбирается условием по значениям
+    ключа сортировки последней записи, без OFFSET и без COUNT(*), поэтому
+    дальние страницы стоят столько же, сколько первая.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = normalize_ordering(list(ordering))
+        self.page_size = page_size
+        # Поля, которые могут быть NULL: для них NULL считается меньше любого
+        # значения во всех базах (в порядке сортировки и в условии курсора)
+        self.nullable = {field.lstrip('-') for field in self.ordering
+                         if _is_nullable(queryset.model, field.lstrip('-'))}
+
+    def _equal(self, name, value):
+        return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+    def _beyond(self, name, value, descending):
+        """
+        Условие "значение поля строго после value" (NULL - наименьшее значение)
+        """
+        if value is None:
+            # После NULL по возрастанию - любое значение, по убыванию - ничего
+            return Q(**{f'{name}__isnull': False}) if not descending else Q(pk__in=[])
+        step = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+        if descending and name in self.nullable:
+            step |= Q(**{f'{name}__isnull': True})
+        return step
+
+    def _after(self, values, reverse):
+        """
+        Условие "строго после values" в порядке сортировки (или до - при reverse)
+        """
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            step = self._beyond(name, values[i], descending)
+            for previous, value in zip(self.ordering[:i], values):
+                step &= self._equal(previous.lstrip('-'), value)
+            condition |= step
+        return condition
+
+    def _order_by(self, ordering):
+        """
+        Сортировка для запроса: поля, которые могут быть NULL, - с явным
+        положением NULL (в SQLite и MySQL так и есть, в PostgreSQL - наоборот)
+        """
+        expressions = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if name not in self.nullable:
+                expressions.append(field)
+            elif field.startswith('-'):
+                expressions.append(F(name).desc(nulls_last=True))
+            else:
+                expressions.append(F(name).asc(nulls_first=True))
+        return expressions
+
+    def _values(self, obj):
+        return [_cursor_value(obj, field.lstrip('-')) for field in self.ordering]
+
+    def page(self, cursor=None):
+        """
+        Возвращает страницу по курсору (None - первая страница).
+        Некорректный курсор вызывает InvalidCursor.
+        """
+        values, reverse = decode_cursor(cursor) if cursor else (None, False)
+        if values is not None and len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        queryset = self.queryset.order_by(*self._order_by(ordering))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+
+        items = list(queryset[:self.page_size + 1])
+        has_more = len(items) > self.page_size
+        items = items[:self.page_size]
+        if reverse:
+            items.reverse()
+
+        next_cursor = previous_cursor = None
+        if items:
+            if has_more or reverse:
+                next_cursor = encode_cursor(self._values(items[-1]))
+            if values is not None and (has_more or not reverse):
+                previous_cursor = encode_cursor(self._values(items[0]), reverse=True)
+        return KeysetPage(items, next_cursor, previous_cursor)
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Курсорная пагинация для API поверх KeysetPaginator: ключ сортировки
+    берется из сортировки queryset (в т.ч. заданной OrderingFilter)
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    default_ordering = ('-created_at',)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        if ordering and len(ordering) == len(queryset.query.order_by):
+            return ordering
+        if any(field.name == 'created_at' for field in queryset.model._meta.fields):
+            return list(self.default_ordering)
+        return ['id']
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.get_ordering(queryset), self.get_page_size(request))
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Некорректный курсор.')
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def paginate_html(request, queryset, ordering, page_size=None):
+    """
+    Keyset-пагинация для HTML-страниц: курсор передается в GET-параметре cursor.
+    Некорректный курсор открывает первую страницу.
+    """
+    paginator = KeysetPaginator(queryset, ordering, page_size or settings.HTML_PAGE_SIZE)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.page()
@@ -17,10 +17,10 @@ class IsOwnerOrVisibleOrAdmin(BasePermission):
 
         # Разрешить безопасные методы (GET, HEAD или OPTIONS) всем, если объект видим
         if request.method in SAFE_METHODS:
-            return obj.is_visible or obj.owner == request.user
+            return obj.is_visible or obj.owner_id == request.user.pk
 
         # Разрешить редактирование и удаление только владельцу
-        return obj.owner == request.user
+        return obj.owner_id == request.user.pk
 
 
 class IsOwnerOrAdmin(BasePermission):
@@ -33,6 +33,7 @@ class IsOwnerOrAdmin(BasePermission):
         if request.user.is_staff:
             return True
 
-        # Разрешаем доступ, если пользователь - владелец объекта
-        return obj.owner == request.user
+        # Разрешаем доступ, если пользователь - владелец объекта. Сравнение
+        # по id: без загрузки владельца, работает и для TokenUser (JWT)
+        return obj.owner_id == request.user.pk
 
@@ -0,0 +1,153 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils.timezone import now
+
+from .models import Housing, HousingViewCount, PopularHousing
+
+# Длительность окон рейтинга популярности (None - за все время)
+WINDOWS = {
+    PopularHousing.Window.DAY: timedelta(hours=24),
+    PopularHousing.Window.WEEK: timedelta(days=7),
+    PopularHousing.Window.ALL: None,
+}
+
+
+def _cache_key(window):
+    return f'popular_housing:{window}'
+
+
+def _lock_key(window):
+    return f'popular_housing:{window}:refresh'
+
+
+def _period_start(moment):
+    """
+    Начало часа, к которому относится момент просмотра
+    """
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_views(housing_id, count=1, at=None):
+    """
+    Учитывает просмотры объекта: почасовой счетчик и общее поле Housing.views
+    """
+    record_views_bulk({housing_id: count}, at)
+
+
+def record_views_bulk(counts, at=None):
+    """
+    Учитывает пачку просмотров {housing_id: count} за несколько запросов,
+    независимо от числа объектов
+    """
+    counts = {housing_id: count for housing_id, count in counts.items() if count}
+    if not counts:
+        return
+    period_start = _period_start(at or now())
+
+    with transaction.atomic():
+        # Увеличиваем существующие почасовые счетчики
+        buckets = list(HousingViewCount.objects.filter(housing_id__in=counts, period_start=period_start))
+        for bucket in buckets:
+            bucket.views = F('views') + counts[bucket.housing_id]
+        HousingViewCount.objects.bulk_update(buckets, ['views'])
+
+        # Создаем недостающие счетчики
+        existing = {bucket.housing_id for bucket in buckets}
+        for housing_id, count in counts.items():
+            if housing_id in existing:
+                continue
+            try:
+                with transaction.atomic():
+                    HousingViewCount.objects.create(housing_id=housing_id, period_start=period_start, views=count)
+            except IntegrityError:
+                # Счетчик за этот час успели создать параллельно
+                HousingViewCount.objects.filter(
+                    housing_id=housing_id, period_start=period_start
+                ).update(views=F('views') + count)
+
+        # Время изменения не обновляется: просмотры не сбрасывают ETag объектов
+        # и списков, счетчик в ответе API обновится со следующим изменением объекта
+        housing = [Housing(pk=housing_id, views=F('views') + count) for housing_id, count in counts.items()]
+        Housing.objects.bulk_update(housing, ['views'])
+
+
+def _top_housing(window, limit):
+    """
+    Возвращает [(housing_id, views), ...] самых просматриваемых видимых объектов
+    """
+    duration = WINDOWS[window]
+    if duration is None:
+        # За все время используем индексированное поле Housing.views
+        return list(
+            Housing.objects.filter(is_visible=True, views__gt=0)
+            .order_by('-views', 'id')
+            .values_list('id', 'views')[:limit]
+        )
+    return list(
+        HousingViewCount.objects.filter(period_start__gte=_period_start(now() - duration), housing__is_visible=True)
+        .values('housing')
+        .annotate(total_views=Sum('views'))
+        .order_by('-total_views', 'housing')
+        .values_list('housing', 'total_views')[:limit]
+    )
+
+
+def refresh_leaderboard(window, limit=None):
+    """
+    Пересчитывает материализованный рейтинг окна и кладет его в кэш.
+    Возвращает список [(housing, views), ...].
+    """
+    limit = limit or settings.POPULAR_HOUSING_LIMIT
+    top = _top_housing(window, limit)
+    with transaction.atomic():
+        PopularHousing.objects.filter(window=window).delete()
+        PopularHousing.objects.bulk_create([
+            PopularHousing(window=window, rank=rank, housing_id=housing_id, views=views)
+            for rank, (housing_id, views) in enumerate(top, start=1)
+        ])
+
+    housing = Housing.objects.in_bulk([housing_id for housing_id, _ in top])
+    leaderboard = [(housing[housing_id], views) for housing_id, views in top if housing_id in housing]
+    cache.set(_cache_key(window), leaderboard, settings.POPULAR_HOUSING_TTL)
+    return leaderboard
+
+
+def get_leaderboard(window=PopularHousing.Window.ALL):
+    """
+    Рейтинг популярных объектов из кэша. При промахе читает материализованную
+    таблицу одним запросом и пересчитывает ее, если она устарела. Пересчет
+    выполняет один процесс (блокировка в кэше); остальные, как и при ошибке
+    пересчета, получают прежние строки таблицы.
+    """
+    leaderboard = cache.get(_cache_key(window))
+    if leaderboard is not None:
+        return leaderboard
+
+    rows = list(PopularHousing.objects.filter(window=window).select_related('housing'))
+    leaderboard = [(row.housing, row.views) for row in rows]
+    if rows and rows[0].refreshed_at >= now() - timedelta(seconds=settings.POPULAR_HOUSING_TTL):
+        cache.set(_cache_key(window), leaderboard, settings.POPULAR_HOUSING_TTL)
+        return leaderboard
+
+    if not cache.add(_lock_key(window), 1, settings.POPULAR_HOUSING_TTL):
+        return leaderboard
+    try:
+        return refresh_leaderboard(window)
+    except DatabaseError:
+        # Таблицу одновременно пересчитывает команда refresh_popular_housing
+        # (нарушение уникальности rank или взаимная блокировка)
+        return leaderboard
+    finally:
+        cache.delete(_lock_key(window))
+
+
+def prune_view_counts():
+    """
+    Удаляет почасовые счетчики старше самого длинного окна рейтинга
+    """
+    longest = max(duration for duration in WINDOWS.values() if duration is not None)
+    return HousingViewCount.objects.filter(period_start__lt=_period_start(now() - longest)).delete()[0]
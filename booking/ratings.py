@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from django.utils.timezone import now
+
+from .models import Housing, Review
+
+# Допустимые значения оценки, для которых ведется гистограмма
+STARS = range(1, 6)
+
+
+def _average_expression():
+    """
+    Выражение для пересчета средней оценки из счетчиков в той же строке
+    """
+    return Case(
+        When(review_count__gt=0, then=Cast(F('rating_sum'), FloatField()) / F('review_count')),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+
+def apply_rating_delta(housing_id, rating, sign):
+    """
+    Атомарно добавляет (sign=1) или убирает (sign=-1) одну оценку
+    из агрегатов объекта
+    """
+    if housing_id is None or rating is None:
+        return
+
+    changes = {
+        # update() не обновляет auto_now-поля
+        'updated_at': now(),
+        'review_count': F('review_count') + sign,
+        'rating_sum': F('rating_sum') + sign * rating,
+    }
+    if rating in STARS:
+        changes[f'rating_{rating}_count'] = F(f'rating_{rating}_count') + sign
+
+    with transaction.atomic():
+        housing = Housing.objects.filter(pk=housing_id)
+        housing.update(**changes)
+        housing.update(rating_avg=_average_expression())
+
+
+def rebuild_ratings(housing_ids=None):
+    """
+    Пересчитывает агрегаты отзывов с нуля одним групповым запросом.
+    Возвращает количество обновленных объектов.
+    """
+    housing = Housing.objects.all()
+    reviews = Review.objects.all()
+    if housing_ids is not None:
+        housing = housing.filter(id__in=housing_ids)
+        reviews = reviews.filter(housing_id__in=housing_ids)
+
+    annotations = {
+        'count': Count('id'),
+        'total': Sum('rating'),
+    }
+    for stars in STARS:
+        annotations[f'stars_{stars}'] = Count('id', filter=Q(rating=stars))
+    stats = {row['housing']: row for row in reviews.values('housing').annotate(**annotations)}
+
+    objects = []
+    updated_at = now()
+    for obj in housing.only('id').iterator():
+        obj.updated_at = updated_at
+        row = stats.get(obj.id, {})
+        obj.review_count = row.get('count', 0)
+        obj.rating_sum = row.get('total') or 0
+        obj.rating_avg = obj.rating_sum / obj.review_count if obj.review_count else 0
+        for stars in STARS:
+            setattr(obj, f'rating_{stars}_count', row.get(f'stars_{stars}', 0))
+        objects.append(obj)
+
+    fields = ['updated_at', 'review_count', 'rating_sum', 'rating_avg'] + [f'rating_{stars}_count' for stars in STARS]
+    with transaction.atomic():
+        Housing.objects.bulk_update(objects, fields, batch_size=500)
+    return len(objects)
@@ -0,0 +1,206 @@
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.timezone import now
+
+from .availability import ACTIVE_STATUSES, calendar_ranges, get_calendar, is_available
+from .listing_cache import invalidate_bookings
+from .models import Booking, HousingCalendar
+from .rollups import refresh_for_bookings
+
+
+class DatesUnavailable(ValidationError):
+    """
+    Выбранные даты пересекаются с другим активным бронированием объекта
+    """
+
+    def __init__(self):
+        super().__init__('На выбранные даты объект уже забронирован. Пожалуйста, выберите другие даты.')
+
+
+def _lock_calendars(housing_ids):
+    """
+    Захватывает блокировки календарей объектов до конца транзакции и
+    возвращает актуальные календари {housing_id: calendar}.
+
+    UPDATE берет блокировку строк (MySQL, в порядке первичного ключа - без
+    взаимных блокировок) или блокировку записи всей базы (SQLite, где
+    SELECT ... FOR UPDATE не поддерживается), поэтому проверка пересечений
+    и сохранение бронирований выполняются без гонок.
+    """
+    housing_ids = sorted(set(housing_ids))
+    calendars = HousingCalendar.objects.filter(pk__in=housing_ids)
+    if calendars.update(updated_at=now()) < len(housing_ids):
+        existing = set(calendars.values_list('pk', flat=True))
+        for housing_id in housing_ids:
+            if housing_id not in existing:
+                get_calendar(housing_id)
+        calendars.update(updated_at=now())
+    return calendars.select_for_update().in_bulk()
+
+
+def _lock_calendar(housing_id):
+    return _lock_calendars([housing_id])[housing_id]
+
+
+def _check_dates(date_from, date_to):
+    if date_from is None or date_to is None:
+        raise ValidationError('Укажите даты начала и окончания бронирования.')
+    if date_from > date_to:
+        raise ValidationError('Дата начала не может быть позже даты окончания.')
+
+
+def reserve(housing, owner, date_from, date_to, status=None):
+    """
+    Атомарно создает бронирование объекта на период [date_from, date_to].
+    Вызывает DatesUnavailable, если даты заняты активным бронированием:
+    проверяется любое новое бронирование, в том числе неподтвержденное.
+    """
+    _check_dates(date_from, date_to)
+    # owner - пользователь или TokenUser (JWT): достаточно его id
+    booking = Booking(owner_id=owner.pk, housing=housing, date_from=date_from, date_to=date_to)
+    if status is not None:
+        booking.status = status
+
+    with transaction.atomic():
+        calendar = _lock_calendar(housing.pk)
+        if not is_available(housing.pk, date_from, date_to, calendar=calendar):
+            raise DatesUnavailable()
+        booking.save()
+    return booking
+
+
+def update_booking(booking, **changes):
+    """
+    Атомарно изменяет бронирование (даты, статус, объект). Если после
+    изменения бронирование активно, его даты не должны пересекаться
+    с другими активными бронированиями объекта.
+    """
+    previous_housing_id = booking.housing_id
+    for field, value in changes.items():
+        setattr(booking, field, value)
+
+    with transaction.atomic():
+        # При переносе на другой объект блокируются календари обоих объектов:
+        # бронирование освобождает даты прежнего
+        calendar = _lock_calendars([previous_housing_id, booking.housing_id])[booking.housing_id]
+        if booking.status in ACTIVE_STATUSES:
+            _check_dates(booking.date_from, booking.date_to)
+            if not is_available(booking.housing_id, booking.date_from, booking.date_to,
+                                exclude=booking, calendar=calendar):
+                raise DatesUnavailable()
+        booking.save()
+    return booking
+
+
+def reschedule(booking, date_from, date_to):
+    """
+    Атомарно переносит бронирование на новые даты
+    """
+    _check_dates(date_from, date_to)
+    return update_booking(booking, date_from=date_from, date_to=date_to)
+
+
+def change_status(booking, status):
+    """
+    Атомарно меняет статус бронирования. Перевод в подтвержденное или
+    ожидающее подтверждения возможен, только если даты свободны.
+    """
+    return update_booking(booking, status=status)
+
+
+def bulk_update_bookings(user, items, all_or_nothing=False):
+    """
+    Пакетно меняет статусы и даты бронирований объектов пользователя user
+    (владельца объектов или администратора) в одной транзакции.
+
+    items - список словарей {'id': ..., 'status': ..., 'date_from': ..., 'date_to': ...}
+    (status и даты необязательны). Изменения применяются по порядку, как если
+    бы их выполняли по одному: каждое проверяется с учетом уже принятых.
+    Возвращает список результатов в порядке items: {'id', 'ok', 'errors'}.
+    При all_or_nothing=True любая ошибка отменяет весь пакет.
+
+    Количество запросов не зависит от размера пакета: бронирования читаются
+    одним запросом, календари блокируются и обновляются вместе.
+    """
+    results = [{'id': item['id'], 'ok': False, 'errors': []} for item in items]
+    today = now().date()
+
+    with transaction.atomic():
+        bookings = Booking.objects.select_related('housing').in_bulk([item['id'] for item in items])
+
+        accepted = []
+        seen = set()
+        for result, item in zip(results, items):
+            booking = bookings.get(item['id'])
+            if booking is None:
+                result['errors'].append('Бронирование не найдено.')
+            elif not (user.is_staff or booking.housing.owner_id == user.pk):
+                result['errors'].append('У вас нет прав для изменения этого бронирования.')
+            elif booking.pk in seen:
+                result['errors'].append('Бронирование указано в пакете несколько раз.')
+            else:
+                seen.add(booking.pk)
+                accepted.append((result, item, booking))
+
+        calendars = _lock_calendars({booking.housing_id for _, _, booking in accepted})
+        # Занятые интервалы объектов: {housing_id: {booking_id: (date_from, date_to)}}
+        busy = {
+            housing_id: {
+                booking_id: (date.fromisoformat(date_from), date.fromisoformat(date_to))
+                for date_from, date_to, booking_id in calendar.ranges
+            }
+            for housing_id, calendar in calendars.items()
+        }
+
+        changed = []
+        for result, item, booking in accepted:
+            status = item.get('status', booking.status)
+            date_from = item.get('date_from', booking.date_from)
+            date_to = item.get('date_to', booking.date_to)
+            try:
+                if 'date_from' in item or 'date_to' in item:
+                    _check_dates(date_from, date_to)
+                    if date_from < today:
+                        raise ValidationError('Выбранные даты не могут быть в прошлом.')
+                intervals = busy[booking.housing_id]
+                if status in ACTIVE_STATUSES:
+                    _check_dates(date_from, date_to)
+                    if any(date_from <= other_to and other_from <= date_to
+                           for booking_id, (other_from, other_to) in intervals.items() if booking_id != booking.pk):
+                        raise DatesUnavailable()
+            except ValidationError as e:
+                result['errors'].extend(e.messages)
+                continue
+
+            booking.status, booking.date_from, booking.date_to = status, date_from, date_to
+            if status in ACTIVE_STATUSES:
+                intervals[booking.pk] = (date_from, date_to)
+            else:
+                intervals.pop(booking.pk, None)
+            result['ok'] = True
+            changed.append(booking)
+
+        failed = any(not result['ok'] for result in results)
+        if all_or_nothing and failed:
+            for result in results:
+                if result['ok']:
+                    result['ok'] = False
+                    result['errors'].append('Пакет отменен из-за ошибок в других бронированиях.')
+            return results
+
+        if changed:
+            # bulk_update не отправляет сигналы: календари, дневную статистику
+            # и кэш списков обновляем здесь
+            updated_at = now()
+            for booking in changed:
+                booking.updated_at = updated_at
+            Booking.objects.bulk_update(changed, ['status', 'date_from', 'date_to', 'updated_at'])
+            refresh_for_bookings(changed)
+            touched = {booking.housing_id for booking in changed}
+            for housing_id in touched:
+                calendars[housing_id].ranges = calendar_ranges(busy[housing_id])
+            HousingCalendar.objects.bulk_update([calendars[housing_id] for housing_id in touched], ['ranges'])
+            transaction.on_commit(invalidate_bookings)
+    return results
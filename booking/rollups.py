@@ -0,0 +1,228 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth
+
+from .models import Booking, Housing, HousingDailyStats
+
+# Признак того, что исходные даты бронирования не были загружены из базы
+UNKNOWN_SPAN = object()
+
+# Сколько объектов пересчитывать за один проход полного пересчета
+REBUILD_BATCH_SIZE = 500
+
+STAT_FIELDS = ('nights_booked', 'bookings_started', 'revenue', 'cancellations')
+
+
+def _days(date_from, date_to):
+    day = date_from
+    while day <= date_to:
+        yield day
+        day += timedelta(days=1)
+
+
+def compute_stats(bookings, prices, spans=None):
+    """
+    Дневные агрегаты {(housing_id, day): {поле: значение}} по бронированиям
+    [(housing_id, date_from, date_to, status), ...]. spans {housing_id:
+    (start, end)} ограничивает дни объекта периодом пересчета.
+    """
+    stats = {}
+
+    def row(housing_id, day):
+        return stats.setdefault((housing_id, day), {
+            'nights_booked': 0, 'bookings_started': 0, 'revenue': Decimal(0), 'cancellations': 0
+        })
+
+    for housing_id, date_from, date_to, status in bookings:
+        start, end = spans[housing_id] if spans else (date_from, date_to)
+        if status == Booking.BookingStatus.CANCELED:
+            if start <= date_from <= end:
+                row(housing_id, date_from)['cancellations'] += 1
+            continue
+        if start <= date_from <= end:
+            row(housing_id, date_from)['bookings_started'] += 1
+        for day in _days(max(date_from, start), min(date_to, end)):
+            stats_row = row(housing_id, day)
+            stats_row['nights_booked'] += 1
+            stats_row['revenue'] += prices[housing_id]
+    return stats
+
+
+def _bookings(condition):
+    return (
+        Booking.objects.filter(condition)
+        .filter(status__in=[Booking.BookingStatus.CONFIRMED, Booking.BookingStatus.CANCELED],
+                date_from__isnull=False, date_to__isnull=False)
+        .values_list('housing_id', 'date_from', 'date_to', 'status')
+    )
+
+
+def _write(stats, delete):
+    # Внутри внешней транзакции (пакетное изменение бронирований) точка
+    # сохранения не нужна: ошибка все равно откатит всю транзакцию
+    with transaction.atomic(savepoint=False):
+        delete.delete()
+        HousingDailyStats.objects.bulk_create([
+            HousingDailyStats(housing_id=housing_id, day=day, **values)
+            for (housing_id, day), values in stats.items()
+        ], batch_size=500)
+
+
+def refresh_stats(spans, prices=None):
+    """
+    Пересчитывает агрегаты объектов за периоды spans {housing_id: (start, end)}
+    (границы включительно): читаются только бронирования, пересекающие
+    период, строки агрегатов периода заменяются. prices {housing_id: цена} -
+    уже известные цены объектов.
+    """
+    spans = {housing_id: span for housing_id, span in spans.items() if housing_id is not None}
+    if not spans:
+        return
+    overlaps = Q()
+    days = Q()
+    for housing_id, (start, end) in spans.items():
+        overlaps |= Q(housing_id=housing_id, date_from__lte=end, date_to__gte=start)
+        days |= Q(housing_id=housing_id, day__range=(start, end))
+    prices = dict(prices or {})
+    if not spans.keys() <= prices.keys():
+        prices = dict(Housing.objects.filter(pk__in=spans).values_list('pk', 'price'))
+    bookings = [booking for booking in _bookings(overlaps) if booking[0] in prices]
+    _write(compute_stats(bookings, prices, spans), HousingDailyStats.objects.filter(days))
+
+
+def rebuild_stats(housing_ids=None):
+    """
+    Пересчитывает агрегаты с нуля, пачками по REBUILD_BATCH_SIZE объектов.
+    Возвращает количество объектов.
+    """
+    housings = Housing.objects.order_by('pk')
+    if housing_ids is not None:
+        housings = housings.filter(pk__in=housing_ids)
+    count = 0
+    last_pk = 0
+    while True:
+        prices = dict(housings.filter(pk__gt=last_pk).values_list('pk', 'price')[:REBUILD_BATCH_SIZE])
+        if not prices:
+            return count
+        stats = compute_stats(_bookings(Q(housing_id__in=prices)), prices)
+        _write(stats, HousingDailyStats.objects.filter(housing_id__in=prices))
+        count += len(prices)
+        last_pk = max(prices)
+
+
+def booking_span(booking):
+    """
+    Текущие объект и даты бронирования для пересчета агрегатов
+    """
+    return booking.housing_id, booking.date_from, booking.date_to
+
+
+def refresh_for_bookings(bookings):
+    """
+    Пересчитывает агрегаты по изменившимся бронированиям: объединение
+    прежнего (_saved_span, см. booking.signals) и текущего периода
+    каждого бронирования. Если прежние даты неизвестны, объект
+    пересчитывается целиком.
+    """
+    spans = {}
+    full = set()
+    prices = {}
+    for booking in bookings:
+        if Booking.housing.is_cached(booking):
+            prices[booking.housing_id] = booking.housing.price
+        saved = getattr(booking, '_saved_span', None)
+        if saved is UNKNOWN_SPAN:
+            full.add(booking.housing_id)
+            continue
+        for housing_id, date_from, date_to in filter(None, [saved, booking_span(booking)]):
+            if date_from is None or date_to is None:
+                continue
+            start, end = spans.get(housing_id, (date_from, date_to))
+            spans[housing_id] = (min(start, date_from), max(end, date_to))
+    refresh_stats({housing_id: span for housing_id, span in spans.items() if housing_id not in full}, prices)
+    if full:
+        rebuild_stats(full)
+
+
+GROUPS = {
+    'day': TruncDay,
+    'month': TruncMonth,
+}
+
+
+def _period_days(period, group, date_from, date_to):
+    """
+    Количество дней периода (дня или месяца), попадающих в [date_from, date_to]
+    """
+    if group == 'day':
+        return 1
+    next_month = (period.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return (min(next_month - timedelta(days=1), date_to) - max(period, date_from)).days + 1
+
+
+def _money(value):
+    return str(Decimal(value).quantize(Decimal('0.01')))
+
+
+def _occupancy(nights, days):
+    return round(nights / days, 4) if days else None
+
+
+def occupancy_report(housings, date_from, date_to, group='month'):
+    """
+    Загрузка и выручка объектов housings (queryset) за период [date_from,
+    date_to] по дням или месяцам. Читается только дневная статистика:
+    строки по объектам и периодам (объекты без бронирований в периоде
+    не выводятся) и итоги по периодам, где загрузка считается по всем
+    объектам housings.
+    """
+    truncate = GROUPS[group]
+    rows = (
+        HousingDailyStats.objects
+        .filter(housing__in=housings, day__range=(date_from, date_to))
+        .annotate(period=truncate('day'))
+        .values('period', 'housing_id')
+        .annotate(
+            nights_booked=Sum('nights_booked'),
+            bookings_started=Sum('bookings_started'),
+            revenue=Sum('revenue'),
+            cancellations=Sum('cancellations'),
+        )
+        .order_by('period', 'housing_id')
+    )
+    housing_count = housings.count()
+    results = []
+    totals = {}
+    for row in rows:
+        period = row['period']
+        # TruncDay/TruncMonth для DateField возвращают date, но не во всех драйверах
+        period = period.date() if hasattr(period, 'date') else period
+        days = _period_days(period, group, date_from, date_to)
+        results.append({
+            'housing': row['housing_id'],
+            'period': period,
+            'days': days,
+            **{field: row[field] for field in STAT_FIELDS},
+            'revenue': _money(row['revenue']),
+            'occupancy': _occupancy(row['nights_booked'], days),
+        })
+        total = totals.setdefault(period, {
+            'period': period, 'days': days, 'nights_booked': 0, 'bookings_started': 0,
+            'revenue': Decimal(0), 'cancellations': 0,
+        })
+        for field in STAT_FIELDS:
+            total[field] += Decimal(row[field]) if field == 'revenue' else row[field]
+    for total in totals.values():
+        total['occupancy'] = _occupancy(total['nights_booked'], total['days'] * housing_count)
+        total['revenue'] = _money(total['revenue'])
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'group': group,
+        'housings': housing_count,
+        'results': results,
+        'totals': list(totals.values()),
+    }
@@ -0,0 +1,215 @@
+import logging
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import ExpressionWrapper, F, FloatField, IntegerField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Housing, HousingSearchDocument
+
+logger = logging.getLogger(__name__)
+
+# Поля объекта, из которых собирается поисковый документ
+DOCUMENT_FIELDS = ['name', 'description', 'country', 'city', 'street']
+
+# Имя виртуальной таблицы FTS5 для SQLite
+FTS_TABLE = 'booking_housing_fts'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """
+    Приводит текст к виду для поиска: нижний регистр (в том числе для
+    кириллицы), ё -> е, лишние пробелы убраны
+    """
+    return ' '.join(TOKEN_RE.findall((text or '').casefold().replace('ё', 'е')))
+
+
+def build_document(housing):
+    """
+    Собирает нормализованный поисковый документ объекта
+    """
+    return normalize(' '.join(str(getattr(housing, field) or '') for field in DOCUMENT_FIELDS))
+
+
+class SearchBackend:
+    """
+    Базовый поисковый бэкенд: хранит документы в HousingSearchDocument
+    и ищет по ним подстроки всех слов запроса (без ранжирования)
+    """
+
+    def index(self, housing):
+        HousingSearchDocument.objects.update_or_create(
+            housing_id=housing.pk,
+            defaults={'document': build_document(housing)}
+        )
+
+    def remove(self, housing_id):
+        HousingSearchDocument.objects.filter(housing_id=housing_id).delete()
+
+    def reindex(self, queryset, batch_size=1000):
+        """
+        Перестраивает документы для всех объектов queryset пачками.
+        Возвращает количество проиндексированных объектов.
+        """
+        count = 0
+        batch = []
+        for housing in queryset.only('id', *DOCUMENT_FIELDS).iterator(chunk_size=batch_size):
+            batch.append(HousingSearchDocument(housing_id=housing.pk, document=build_document(housing)))
+            if len(batch) >= batch_size:
+                count += self._write_documents(batch)
+                batch = []
+        if batch:
+            count += self._write_documents(batch)
+        return count
+
+    def _write_documents(self, documents):
+        # MySQL не принимает unique_fields: там конфликт определяется по любому уникальному ключу
+        unique_fields = ['housing'] if connection.features.supports_update_conflicts_with_target else None
+        HousingSearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=['document']
+        )
+        return len(documents)
+
+    def match(self, tokens):
+        """
+        Условие на Housing: документ содержит все слова запроса
+        """
+        condition = Q()
+        for token in tokens:
+            condition &= Q(search_document__document__contains=token)
+        return condition
+
+    def rank(self, tokens):
+        """
+        Выражение релевантности для Housing (меньше - релевантнее).
+        Без ранжирования - сначала новые объекты.
+        """
+        return ExpressionWrapper(-F('pk'), output_field=IntegerField())
+
+    def filter(self, queryset, query):
+        """
+        Оставляет в queryset найденные объекты, отсортированные по релевантности
+        (аннотация search_rank). Совпадение проверяется внутри queryset вместе
+        с остальными условиями, ранжируются только попавшие в него объекты.
+        """
+        tokens = normalize(query).split()
+        if not tokens:
+            return queryset.none()
+        return queryset.filter(self.match(tokens)).annotate(search_rank=self.rank(tokens)).order_by('search_rank')
+
+
+def _housing_pk():
+    """
+    Столбец id внешнего запроса по Housing для коррелированных подзапросов
+    """
+    quote = connection.ops.quote_name
+    return f'{quote(Housing._meta.db_table)}.{quote(Housing._meta.pk.column)}'
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Поиск через виртуальную таблицу SQLite FTS5 с ранжированием bm25
+    """
+
+    def index(self, housing):
+        super().index(housing)
+        document = build_document(housing)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [housing.pk])
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)', [housing.pk, document])
+
+    def remove(self, housing_id):
+        super().remove(housing_id)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [housing_id])
+
+    def _write_documents(self, documents):
+        super()._write_documents(documents)
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[d.housing_id] for d in documents])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)',
+                [[d.housing_id, d.document] for d in documents]
+            )
+        return len(documents)
+
+    def _query(self, tokens):
+        # Каждое слово ищем как префикс: "берл"* найдет "берлин"
+        return ' AND '.join(f'"{token}"*' for token in tokens)
+
+    def match(self, tokens):
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [self._query(tokens)]))
+
+    def rank(self, tokens):
+        # bm25 только для строк внешнего запроса: поиск по rowid внутри FTS5
+        return RawSQL(
+            f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {_housing_pk()}',
+            [self._query(tokens)], output_field=FloatField()
+        )
+
+
+class MySQLFullTextBackend(SearchBackend):
+    """
+    Поиск через FULLTEXT-индекс MySQL по HousingSearchDocument.document
+    """
+
+    def _query(self, tokens):
+        return ' '.join(f'+{token}*' for token in tokens)
+
+    def match(self, tokens):
+        table = HousingSearchDocument._meta.db_table
+        return Q(pk__in=RawSQL(
+            f'SELECT housing_id FROM {table} WHERE MATCH(document) AGAINST (%s IN BOOLEAN MODE)',
+            [self._query(tokens)]
+        ))
+
+    def rank(self, tokens):
+        # Чем больше вес MATCH, тем релевантнее: сортируем по нему со знаком минус
+        table = HousingSearchDocument._meta.db_table
+        return RawSQL(
+            f'SELECT -MATCH(document) AGAINST (%s IN BOOLEAN MODE) FROM {table} WHERE housing_id = {_housing_pk()}',
+            [self._query(tokens)], output_field=FloatField()
+        )
+
+
+def fts_table_exists():
+    with connection.cursor() as cursor:
+        return FTS_TABLE in connection.introspection.table_names(cursor)
+
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Возвращает поисковый бэкенд согласно настройке SEARCH_BACKEND:
+    'auto' - по типу базы данных, путь к классу - указанный бэкенд,
+    пустая строка - поиск отключен (используется icontains по полям)
+    """
+    global _backend
+    if _backend is not None:
+        return _backend or None
+
+    path = settings.SEARCH_BACKEND
+    try:
+        if not path:
+            _backend = False
+        elif path != 'auto':
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite' and fts_table_exists():
+            _backend = SQLiteFTSBackend()
+        elif connection.vendor == 'mysql':
+            _backend = MySQLFullTextBackend()
+        else:
+            _backend = SearchBackend()
+    except DatabaseError:
+        logger.exception('Не удалось выбрать поисковый бэкенд')
+        return None
+    return _backend or None
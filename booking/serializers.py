@@ -1,5 +1,85 @@
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.timezone import now
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import deny_token, is_denied, issue_tokens, revoke_user_tokens
+from .forms import HousingForm
 from .models import *
+from .search import normalize
+
+
+# Поля объекта, которые вычисляются приложением и не редактируются через API
+HOUSING_COMPUTED_FIELDS = [
+    'views', 'review_count', 'rating_sum', 'rating_avg',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+]
+
+
+def parse_field_list(value):
+    """
+    Разбирает параметр вида 'id,name,owner.username' в множество имен
+    """
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Разреженные наборы полей для сериализаторов чтения:
+    ?fields=id,name - вернуть только перечисленные поля,
+    ?expand=owner,housing.owner - вложить связанные объекты вместо их id.
+
+    Связи, которые можно раскрыть, описываются в expandable_fields:
+    имя поля -> (класс сериализатора, аргументы, 'select' или 'prefetch').
+    """
+    expandable_fields = {}
+    default_expand = set()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            # Корневой сериализатор берет параметры из запроса
+            request = self.context.get('request')
+            query_params = getattr(request, 'query_params', {})
+            fields = parse_field_list(query_params.get('fields'))
+            expand = parse_field_list(query_params.get('expand')) or set(self.default_expand)
+        self._expand_fields(expand or set())
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def _expand_fields(self, expand):
+        for name in {path.split('.')[0] for path in expand}:
+            if name not in self.expandable_fields:
+                continue
+            serializer_class, options, _ = self.expandable_fields[name]
+            nested = {path.split('.', 1)[1] for path in expand if path.startswith(f'{name}.')}
+            self.fields[name] = serializer_class(read_only=True, fields=set(), expand=nested, **options)
+
+    @classmethod
+    def get_related_paths(cls, expand, prefix=''):
+        """
+        Возвращает (select_related, prefetch_related) для раскрываемых связей
+        """
+        select, prefetch = [], []
+        for name in {path.split('.')[0] for path in expand}:
+            if name not in cls.expandable_fields:
+                continue
+            serializer_class, _, kind = cls.expandable_fields[name]
+            path = f'{prefix}{name}'
+            (select if kind == 'select' else prefetch).append(path)
+            nested = {item.split('.', 1)[1] for item in expand if item.startswith(f'{name}.')}
+            if nested and issubclass(serializer_class, SparseFieldsetMixin):
+                nested_select, nested_prefetch = serializer_class.get_related_paths(nested, f'{path}__')
+                # Связи внутри prefetch тоже подгружаются через prefetch
+                (select if kind == 'select' else prefetch).extend(nested_select)
+                prefetch.extend(nested_prefetch)
+        return select, prefetch
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -7,15 +87,40 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
+        extra_kwargs = {'password': {'write_only': True}}
+
+
+class UserPublicSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Краткие публичные данные пользователя для вложения в другие объекты
+    """
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name']
 
 
 class HousingSerializer(serializers.ModelSerializer):
-    owner = UserSerializer(read_only=True)
+    owner = UserPublicSerializer(read_only=True, fields=set(), expand=set())
 
     class Meta:
         model = Housing
         fields = '__all__'
-        read_only_fields = ['owner']  # Автоматическое добавление владельца объекта
+        # Автоматическое добавление владельца объекта, вычисляемые поля только для чтения;
+        # external_id задается только импортом
+        read_only_fields = ['owner', 'external_id'] + HOUSING_COMPUTED_FIELDS
+
+
+class HousingImportSerializer(serializers.ModelSerializer):
+    """
+    Строка импорта объектов: поля формы HousingForm с теми же правилами
+    проверки и обязательный идентификатор объекта у партнера
+    """
+    external_id = serializers.CharField(max_length=100)
+
+    class Meta:
+        model = Housing
+        fields = HousingForm.Meta.fields + ['external_id']
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -25,14 +130,26 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 
 class BookingSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
     housing = HousingSerializer(read_only=True)
+    # Объект бронирования при создании задается по id
+    housing_id = serializers.PrimaryKeyRelatedField(
+        source='housing',
+        queryset=Housing.objects.all(),
+        write_only=True
+    )
 
     class Meta:
         model = Booking
         fields = '__all__'
         read_only_fields = ('owner',)
 
+    def validate(self, attrs):
+        # Объект задается только при создании: перенос бронирования
+        # на другой объект - это новое бронирование
+        if self.instance is not None and 'housing' in attrs and attrs['housing'].pk != self.instance.housing_id:
+            raise serializers.ValidationError({'housing_id': 'Объект бронирования нельзя изменить.'})
+        return attrs
+
 
 class BookingDetailSerializer(BookingSerializer):
     class Meta:
@@ -51,9 +168,168 @@ class SearchHistorySerializer(serializers.ModelSerializer):
         model = SearchHistory
         fields = '__all__'
 
+    def validate_keyword(self, value):
+        # История хранит запросы в нормализованном виде, как и housing_list
+        keyword = normalize(value)
+        if not keyword:
+            raise serializers.ValidationError('Пустой поисковый запрос')
+        return keyword
+
 
 class ViewHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = ViewHistory
         fields = '__all__'
 
+
+class ReviewReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Компактный сериализатор отзыва для чтения
+    """
+    expandable_fields = {
+        'owner': (UserPublicSerializer, {}, 'select'),
+    }
+
+    class Meta:
+        model = Review
+        fields = ['id', 'rating', 'text', 'created_at', 'owner', 'housing']
+
+
+class HousingReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Компактный сериализатор объекта для чтения: владелец передается по id,
+    ?expand=owner вкладывает краткие данные владельца, ?expand=reviews - отзывы
+    """
+    expandable_fields = {
+        'owner': (UserPublicSerializer, {}, 'select'),
+        'reviews': (ReviewReadSerializer, {'many': True}, 'prefetch'),
+    }
+
+    class Meta:
+        model = Housing
+        fields = [
+            'id', 'name', 'type', 'description', 'country', 'post_code', 'city', 'street', 'house_number',
+            'rooms', 'price', 'is_visible', 'created_at', 'views', 'review_count', 'rating_avg', 'owner',
+        ]
+
+
+class BookingReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Компактный сериализатор бронирования для чтения: объект и гость
+    передаются по id, ?expand=housing,owner,housing.owner вкладывает их данные
+    """
+    expandable_fields = {
+        'housing': (HousingReadSerializer, {}, 'select'),
+        'owner': (UserPublicSerializer, {}, 'select'),
+    }
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'status', 'created_at', 'date_from', 'date_to', 'owner', 'housing']
+
+
+class BookingDetailReadSerializer(BookingReadSerializer):
+    """
+    Бронирование с вложенными объектом и гостем по умолчанию
+    """
+    default_expand = {'housing', 'owner'}
+
+
+class BookingBulkItemSerializer(serializers.Serializer):
+    """
+    Изменение одного бронирования в пакете: новый статус и/или даты
+    """
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Booking.BookingStatus.choices, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if len(attrs) == 1:
+            raise serializers.ValidationError('Укажите новый статус или даты.')
+        return attrs
+
+
+class BookingBulkSerializer(serializers.Serializer):
+    """
+    Пакет изменений бронирований для владельца объектов
+    """
+    items = serializers.ListField(
+        child=BookingBulkItemSerializer(),
+        allow_empty=False,
+        max_length=settings.BOOKING_BULK_MAX_ITEMS
+    )
+    all_or_nothing = serializers.BooleanField(default=False)
+
+
+class TokenObtainClaimsSerializer(TokenObtainPairSerializer):
+    """
+    Пара JWT-токенов по имени пользователя и паролю; в claims - id,
+    имя пользователя и признаки администратора
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        return issue_tokens(user)
+
+
+class TokenRefreshClaimsSerializer(serializers.Serializer):
+    """
+    Новая пара токенов по refresh-токену. Использованный refresh-токен
+    отзывается (повторно его не принять), claims читаются из базы заново:
+    изменение прав попадает в токены не позже следующего обновления.
+    """
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        # deny_token атомарен: из двух одновременных обновлений пройдет одно
+        if is_denied(refresh) or not deny_token(refresh):
+            raise TokenError('Токен отозван.')
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None:
+            raise TokenError('Пользователь не найден или заблокирован.')
+        refresh = issue_tokens(user)
+        return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    """
+    Отзыв refresh-токена (выход из системы), а при all=true - всех
+    токенов пользователя, в том числе уже выданных access-токенов
+    """
+    refresh = serializers.CharField()
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        deny_token(refresh)
+        if attrs['all']:
+            revoke_user_tokens(refresh[api_settings.USER_ID_CLAIM])
+        return {}
+
+
+class OccupancyQuerySerializer(serializers.Serializer):
+    """
+    Параметры отчета о загрузке: период (по умолчанию - последние 12
+    месяцев, не длиннее ANALYTICS_MAX_DAYS), объект и группировка
+    """
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    housing = serializers.IntegerField(required=False)
+    group = serializers.ChoiceField(choices=['month', 'day'], default='month')
+
+    def validate(self, attrs):
+        date_to = attrs.setdefault('date_to', now().date())
+        if 'date_from' not in attrs:
+            # Первое число месяца 11 месяцев назад: 12 полных календарных месяцев
+            months = date_to.year * 12 + date_to.month - 1 - 11
+            attrs['date_from'] = date(months // 12, months % 12 + 1, 1)
+        date_from = attrs['date_from']
+        if date_from > date_to:
+            raise serializers.ValidationError({'date_to': 'Дата окончания раньше даты начала.'})
+        if (date_to - date_from).days + 1 > settings.ANALYTICS_MAX_DAYS:
+            raise serializers.ValidationError(
+                {'date_from': f'Период не может быть длиннее {settings.ANALYTICS_MAX_DAYS} дней.'})
+        return attrs
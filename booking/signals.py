@@ -0,0 +1,273 @@
+from django.contrib.auth.models import Group, User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .authentication import revoke_user_tokens
+from .availability import rebuild_calendar
+from .backends import invalidate_users
+from .listing_cache import invalidate_bookings, invalidate_housing, invalidate_reviews
+from .models import Booking, Housing, Review
+from .ratings import apply_rating_delta, rebuild_ratings
+from .rollups import UNKNOWN_SPAN, booking_span, rebuild_stats, refresh_for_bookings
+from .search import get_search_backend
+
+# Признак того, что исходная оценка отзыва не была загружена из базы
+UNKNOWN_RATING = object()
+
+# Поля пользователя, изменение которых отзывает его JWT-токены
+TOKEN_FIELDS = ('password', 'is_active', 'is_staff', 'is_superuser')
+
+
+@receiver(post_save, sender=Booking)
+def update_housing_calendar(sender, instance, raw=False, **kwargs):
+    """
+    Обновляет календарь занятости объекта при создании, изменении
+    или отмене бронирования. При переносе на другой объект обновляется
+    и календарь прежнего объекта (по _saved_span: этот обработчик
+    подключен раньше update_daily_stats, который его обновляет).
+    """
+    if raw:
+        # Загрузка фикстур: объекта может еще не быть, календари
+        # пересобираются командой rebuild_availability
+        return
+    rebuild_calendar(instance.housing_id)
+    saved = getattr(instance, '_saved_span', None)
+    if saved not in (None, UNKNOWN_SPAN) and saved[0] != instance.housing_id:
+        rebuild_calendar(saved[0], create=False)
+
+
+@receiver(post_delete, sender=Booking)
+def update_housing_calendar_on_delete(sender, instance, **kwargs):
+    """
+    Обновляет календарь при удалении бронирования. Календарь не создается
+    заново: бронирование может удаляться вместе с самим объектом.
+    """
+    rebuild_calendar(instance.housing_id, create=False)
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_span(sender, instance, **kwargs):
+    """
+    Запоминает исходные объект и даты бронирования: при переносе дат
+    дневная статистика пересчитывается и за старый, и за новый период
+    """
+    data = instance.__dict__
+    if not instance.pk:
+        instance._saved_span = None
+    elif all(field in data for field in ('housing_id', 'date_from', 'date_to')):
+        instance._saved_span = booking_span(instance)
+    else:
+        # Даты не загружены (only/defer) - при сохранении пересчитаем объект целиком
+        instance._saved_span = UNKNOWN_SPAN
+
+
+@receiver(post_save, sender=Booking)
+def update_daily_stats(sender, instance, raw=False, **kwargs):
+    """
+    Обновляет дневную статистику объекта за период бронирования
+    при его создании, изменении или отмене
+    """
+    if not raw:
+        refresh_for_bookings([instance])
+        instance._saved_span = booking_span(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def update_daily_stats_on_delete(sender, instance, **kwargs):
+    """
+    Убирает удаленное бронирование из дневной статистики объекта
+    """
+    refresh_for_bookings([instance])
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    """
+    Запоминает исходную оценку отзыва, чтобы при редактировании
+    скорректировать агрегаты объекта без дополнительного запроса
+    """
+    data = instance.__dict__
+    if not instance.pk:
+        instance._saved_rating = None
+    elif 'rating' in data and 'housing_id' in data:
+        instance._saved_rating = (data['housing_id'], data['rating'])
+    else:
+        # Оценка не загружена (only/defer) - при сохранении пересчитаем объект целиком
+        instance._saved_rating = UNKNOWN_RATING
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    """
+    Обновляет агрегаты отзывов объекта при создании или редактировании отзыва
+    """
+    current = (instance.housing_id, instance.rating)
+    previous = None if created else instance._saved_rating
+    if previous is UNKNOWN_RATING:
+        rebuild_ratings([instance.housing_id])
+    elif previous != current:
+        if previous is not None:
+            apply_rating_delta(*previous, sign=-1)
+        apply_rating_delta(*current, sign=1)
+    instance._saved_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    """
+    Убирает оценку удаленного отзыва из агрегатов объекта
+    """
+    if instance._saved_rating is UNKNOWN_RATING:
+        rebuild_ratings([instance.housing_id])
+    elif instance._saved_rating is not None:
+        apply_rating_delta(*instance._saved_rating, sign=-1)
+
+
+@receiver(post_save, sender=Housing)
+def update_search_document(sender, instance, raw=False, **kwargs):
+    """
+    Обновляет поисковый документ объекта при его создании или изменении
+    """
+    backend = get_search_backend()
+    if backend is not None and not raw:
+        backend.index(instance)
+
+
+@receiver(post_delete, sender=Housing)
+def remove_search_document(sender, instance, **kwargs):
+    """
+    Удаляет объект из поискового индекса
+    """
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove(instance.pk)
+
+
+@receiver(post_init, sender=Housing)
+def remember_housing_visibility(sender, instance, **kwargs):
+    """
+    Запоминает исходную видимость объекта: скрытие объекта должно сбросить
+    общие списки, в которых он был виден. Исходная цена нужна для
+    пересчета выручки.
+    """
+    instance._saved_visible = instance.__dict__.get('is_visible') if instance.pk else None
+    instance._saved_price = instance.__dict__.get('price') if instance.pk else None
+
+
+@receiver(post_save, sender=Housing)
+def update_daily_stats_on_price_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Пересчитывает выручку в дневной статистике объекта при изменении цены
+    """
+    if not raw and not created and instance._saved_price != instance.price:
+        rebuild_stats([instance.pk])
+    instance._saved_price = instance.price
+
+
+@receiver(post_save, sender=Housing)
+@receiver(post_delete, sender=Housing)
+def invalidate_housing_listings(sender, instance, raw=False, **kwargs):
+    """
+    Сбрасывает кэш карточки объекта и списков, в которые он входит
+    """
+    if not raw:
+        invalidate_housing(instance, was_visible=instance._saved_visible)
+        instance._saved_visible = instance.is_visible
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_listings(sender, instance, raw=False, **kwargs):
+    """
+    Сбрасывает кэш карточки объекта и списков с сортировкой по рейтингу
+    """
+    if not raw:
+        invalidate_reviews(instance.housing_id)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_listings(sender, instance, raw=False, **kwargs):
+    """
+    Сбрасывает кэш списков, зависящих от занятости объектов
+    """
+    if not raw:
+        invalidate_bookings()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    """
+    Сбрасывает кэш пользователя при изменении (в том числе пароля,
+    is_active, is_staff) и удалении
+    """
+    if not raw:
+        invalidate_users([instance.pk])
+
+
+@receiver(post_init, sender=User)
+def remember_user_credentials(sender, instance, **kwargs):
+    """
+    Запоминает пароль и признаки доступа пользователя: их изменение
+    должно отозвать выданные JWT-токены
+    """
+    data = instance.__dict__
+    if instance.pk and all(field in data for field in TOKEN_FIELDS):
+        instance._saved_credentials = tuple(data[field] for field in TOKEN_FIELDS)
+    else:
+        # Новый пользователь или поля не загружены (only/defer): при
+        # сохранении токены отзываются на всякий случай
+        instance._saved_credentials = None
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_credentials_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Отзывает JWT-токены пользователя при смене пароля, блокировке
+    или изменении признаков администратора
+    """
+    current = tuple(getattr(instance, field) for field in TOKEN_FIELDS)
+    if not raw and not created and instance._saved_credentials != current:
+        revoke_user_tokens(instance.pk)
+    instance._saved_credentials = current
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    """
+    Отзывает JWT-токены удаленного пользователя
+    """
+    revoke_user_tokens(instance.pk)
+
+
+@receiver(user_logged_out)
+def invalidate_user_on_logout(sender, request, user, **kwargs):
+    """
+    Сбрасывает кэш пользователя при выходе из системы
+    """
+    if user is not None:
+        invalidate_users([user.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Сбрасывает кэш прав пользователей, чьи группы или права изменились.
+    Связи читаются до очистки (pre_clear), после нее они уже удалены.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if isinstance(instance, User):
+        user_ids = [instance.pk]
+    elif sender is Group.permissions.through:
+        # Права группы: затронуты все ее участники
+        group_ids = [instance.pk] if not reverse else pk_set if pk_set is not None else instance.group_set.values('pk')
+        user_ids = User.objects.filter(groups__in=group_ids).values_list('pk', flat=True).distinct()
+    else:
+        # Участники группы или права, выданные со стороны группы/права
+        user_ids = pk_set if pk_set is not None else instance.user_set.values_list('pk', flat=True)
+    invalidate_users(list(user_ids))
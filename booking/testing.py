@@ -0,0 +1,128 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .middleware import QueryRecorder, get_query_budget
+
+# LIMIT всего запроса (а не подзапроса) в конце SQL
+LIMIT_RE = re.compile(r'\bLIMIT\s+\d+(\s+OFFSET\s+\d+)?\s*$', re.IGNORECASE)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Базовый класс тестов с бюджетами SQL-запросов по имени URL и методу.
+    Бюджеты берутся из настройки QUERY_BUDGETS, их можно переопределить
+    в атрибуте query_budgets тестового класса.
+    """
+    query_budgets = None
+
+    def get_query_budget(self, url_name, method='get'):
+        budgets = self.query_budgets if self.query_budgets is not None else settings.QUERY_BUDGETS
+        budget = get_query_budget(budgets, url_name, method)
+        if budget is None:
+            self.fail(f'Для {method.upper()} {url_name!r} не задан бюджет запросов')
+        return budget
+
+    def assertQueryBudget(self, url_name, args=None, kwargs=None, method='get', data=None, query='', **extra):
+        """
+        Выполняет запрос к URL и проверяет, что количество SQL-запросов
+        не превышает бюджет. Возвращает ответ. extra передается клиенту
+        (например, content_type='application/json').
+        """
+        budget = self.get_query_budget(url_name, method)
+        url = reverse(url_name, args=args, kwargs=kwargs) + query
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = getattr(self.client, method)(url, data, **extra)
+
+        if recorder.count > budget:
+            duplicates = recorder.duplicates()
+            details = '\n'.join(
+                f'{"x" + str(duplicates[sql]) + " " if sql in duplicates else ""}{sql}'
+                for sql in dict.fromkeys(sql for sql, _ in recorder.queries)
+            )
+            self.fail(f'{url_name}: {recorder.count} SQL-запросов при бюджете {budget}:\n{details}')
+        return response
+
+
+def explain(sql, params=None):
+    """
+    План SQL-запроса: строки EXPLAIN в виде словарей
+    (SQLite - EXPLAIN QUERY PLAN, MySQL - классический EXPLAIN)
+    """
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def query_plan(queryset):
+    """
+    План запроса queryset
+    """
+    return explain(*queryset.query.sql_with_params())
+
+
+def full_scans(plan, sql=''):
+    """
+    Таблицы, которые план читает полным перебором строк, без индекса.
+    Обход индекса целиком не считается полным перебором. В SQLite не
+    считается им и обход таблицы в порядке первичного ключа, если запрос
+    ограничен LIMIT и не сортирует результат во временном B-дереве:
+    чтение останавливается на первых строках.
+    """
+    if connection.vendor == 'sqlite':
+        stops_early = (
+            LIMIT_RE.search(sql) is not None
+            and not any(row['detail'].startswith('USE TEMP B-TREE FOR ORDER BY') for row in plan)
+        )
+        return [
+            row['detail'].split()[1] for row in plan
+            if row['detail'].startswith('SCAN ') and ' INDEX ' not in row['detail']
+            and not row['detail'].startswith('SCAN CONSTANT ROW')
+            and not (stops_early and row['parent'] == 0)
+        ]
+    if connection.vendor == 'mysql':
+        return [row['table'] for row in plan if row['type'] == 'ALL']
+    return []
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Базовый класс тестов планов запросов: проверяет, что горячие запросы
+    используют индексы и не деградируют до полного перебора таблиц
+    """
+
+    def assertNoFullScan(self, queryset, allow=()):
+        """
+        Проверяет, что план запроса queryset не читает таблицы полным
+        перебором (кроме таблиц из allow). Возвращает план.
+        """
+        sql, params = queryset.query.sql_with_params()
+        return self._check_plan(sql, params, allow)
+
+    def assertPageIndexed(self, url, allow=()):
+        """
+        Открывает страницу и проверяет планы всех выполненных ею SELECT-запросов.
+        Возвращает ответ.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertLess(response.status_code, 400, url)
+        for query in context.captured_queries:
+            if query['sql'].lstrip().upper().startswith('SELECT'):
+                self._check_plan(query['sql'], None, allow)
+        return response
+
+    def _check_plan(self, sql, params, allow):
+        plan = explain(sql, params)
+        scans = [table for table in full_scans(plan, sql) if table not in allow]
+        if scans:
+            details = '\n'.join(str(row) for row in plan)
+            self.fail(f'Полный перебор {", ".join(scans)}:\n{sql}\n{details}')
+        return plan
@@ -1,3 +1,2167 @@
-from django.test import TestCase
+import csv
+import json
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.serializers import deserialize, serialize
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.db.models import Count
+from django.http import HttpResponse, QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from django.utils.timezone import now
+from rest_framework_simplejwt.settings import api_settings
+
+from . import listing_cache, search, trending, view_buffer
+from .authentication import is_denied, revoke_user_tokens
+from .availability import ACTIVE_STATUSES, busy_ranges, is_available
+from .backends import CachedModelBackend, user_cache_key
+from .db_router import STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, untracked_writes
+from .facets import get_facets
+from .filters import HousingFilter
+from .listing_cache import PUBLIC
+from .management.commands import load_test
+from .middleware import QueryRecorder, get_query_budget
+from .models import (Booking, Housing, HousingCalendar, HousingDailyStats, HousingSearchDocument, HousingViewCount,
+                     PopularHousing, Review, SearchHistory, TrendingSearch, ViewHistory)
+from .popularity import get_leaderboard, record_views, refresh_leaderboard
+from .reservations import DatesUnavailable, bulk_update_bookings, reserve, update_booking
+from .search import FTS_TABLE, SearchBackend, SQLiteFTSBackend, get_search_backend
+from .serializers import HousingReadSerializer
+from .testing import QueryBudgetTestCase, QueryPlanTestCase
+from .trending import get_trending, record_search, refresh_trending
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class QueryBudgetTests(QueryBudgetTestCase):
+    """
+    Количество SQL-запросов на страницах не должно зависеть от количества
+    строк на них (защита от N+1 в представлениях и шаблонах)
+    """
+    rows = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        today = now().date()
+        for i in range(cls.rows):
+            owner = User.objects.create_user(f'owner{i}', f'owner{i}@example.com', 'password')
+            housing = Housing.objects.create(
+                name=f'Квартира {i}', country='Германия', post_code='10115', city='Берлин',
+                rooms=i % 4 + 1, description='Описание', price=100 + i,
+                owner=cls.host if i % 2 else owner
+            )
+            Review.objects.create(rating=i % 5 + 1, text='Отзыв', owner=cls.guest, housing=housing)
+            Booking.objects.create(
+                owner=cls.guest, housing=housing, status=Booking.BookingStatus.PENDING,
+                date_from=today + timedelta(days=i + 1), date_to=today + timedelta(days=i + 2)
+            )
+            ViewHistory.objects.create(user=cls.guest, housing=housing, view_count=i + 1)
+            record_search(f'Берлин {i % 3}', cls.guest)
+        cls.housing = Housing.objects.filter(owner=cls.host).first()
+
+    def setUp(self):
+        # Бюджет проверяется с пустым кэшем страниц и карточек; периодически
+        # пересчитываемые рейтинги популярности и запросов уже в кэше
+        cache.clear()
+        for window in PopularHousing.Window.values:
+            get_leaderboard(window)
+        get_trending()
+        self.client.force_login(self.guest)
+        # Просмотры копятся в буфере без фонового потока и в базу не пишутся
+        buffer = view_buffer.ViewBuffer(flush_interval=3600, background=False)
+        patcher = mock.patch.object(view_buffer, 'view_buffer', buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_index(self):
+        self.assertQueryBudget('index')
+
+    def test_housing_list(self):
+        self.assertQueryBudget('housing_list', query='?sort_by=rating_desc')
+
+    def test_housing_list_search(self):
+        self.assertQueryBudget('housing_list', query='?keyword=квартира')
+
+    def test_housing_detail(self):
+        self.assertQueryBudget('housing_detail', args=[self.housing.id])
+
+    def test_create_booking_form(self):
+        self.assertQueryBudget('create_booking', args=[self.housing.id])
+
+    def test_my_bookings(self):
+        self.assertQueryBudget('my_bookings')
+
+    def test_my_confirmation(self):
+        self.client.force_login(self.host)
+        self.assertQueryBudget('my_confirmation')
+
+    def test_host_dashboard(self):
+        self.client.force_login(self.host)
+        self.assertQueryBudget('host_dashboard')
+
+    def test_api_host_dashboard(self):
+        self.client.force_login(self.host)
+        self.assertQueryBudget('host-dashboard')
+
+    def test_api_housing_list(self):
+        self.assertQueryBudget('housings-list', query='?expand=owner')
+
+    def test_api_booking_list(self):
+        self.assertQueryBudget('booking-list', query='?expand=housing.owner,owner')
+
+    def test_api_booking_create(self):
+        # Запись проверяется своим бюджетом, а не бюджетом списка
+        start = now().date() + timedelta(days=100)
+        response = self.assertQueryBudget('booking-list', method='post', data={
+            'housing_id': self.housing.id, 'date_from': str(start), 'date_to': str(start + timedelta(days=2)),
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_api_housing_create(self):
+        response = self.assertQueryBudget('housings-list', method='post', data={
+            'name': 'Дом', 'country': 'Германия', 'post_code': '20095', 'city': 'Гамбург',
+            'rooms': 3, 'description': 'Описание', 'price': 150,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_api_review_list(self):
+        self.assertQueryBudget('reviews-list', query='?expand=owner')
+
+    def test_api_booking_details(self):
+        self.assertQueryBudget('booking-details-list')
+
+
+class TrendingSearchTests(TestCase):
+    """
+    Популярные запросы: нормализация, upsert истории и затухание весов
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+
+    def test_keywords_are_normalized_and_merged(self):
+        for keyword in ['Berlin', ' berlin ', 'BERLIN', 'Ёлки']:
+            record_search(keyword, self.user)
+        self.assertEqual(
+            dict(SearchHistory.objects.values_list('keyword', 'search_count')),
+            {'berlin': 3, 'елки': 1}
+        )
+        self.assertEqual(TrendingSearch.objects.get(keyword='berlin').searches, 3)
+
+    def test_anonymous_search_counts_only_in_trending(self):
+        record_search('Hamburg')
+        self.assertFalse(SearchHistory.objects.exists())
+        self.assertAlmostEqual(TrendingSearch.objects.get(keyword='hamburg').score, 1, places=3)
+
+    @override_settings(TRENDING_SEARCH_HALF_LIFE=24)
+    def test_old_searches_decay(self):
+        record_search('old')
+        record_search('old')
+        record_search('new')
+        TrendingSearch.objects.filter(keyword='old').update(decayed_at=now() - timedelta(hours=48))
+        top = refresh_trending()
+        self.assertEqual([row.keyword for row in top], ['new', 'old'])
+        self.assertAlmostEqual(top[1].score, 0.5, places=3)
+
+    @override_settings(TRENDING_SEARCH_HALF_LIFE=24)
+    def test_later_searches_weigh_more_without_refresh(self):
+        record_search('old')
+        record_search('old')
+        record_search('old')
+        later = now() + timedelta(hours=48)
+        with mock.patch('booking.trending.now', return_value=later):
+            for _ in range(2):
+                record_search('new')
+        # Поиски позже точки отсчета весят больше: без пересчета 2 новых > 3 старых
+        self.assertEqual([row.keyword for row in get_trending()], ['new', 'old'])
+
+        with mock.patch('booking.trending.now', return_value=later):
+            top = refresh_trending()
+        self.assertAlmostEqual(top[0].score, 2, places=3)
+        self.assertAlmostEqual(top[1].score, 0.75, places=3)
+        self.assertEqual({row.decayed_at for row in TrendingSearch.objects.all()}, {later})
+
+    @override_settings(TRENDING_SEARCH_HALF_LIFE=24)
+    def test_search_rebases_stale_epoch(self):
+        record_search('old')
+        half_lives = trending.REBASE_HALF_LIVES
+        with mock.patch('booking.trending.now', return_value=now() + timedelta(days=half_lives - 1)):
+            record_search('new')
+        # Вес растет не дольше REBASE_HALF_LIVES периодов полураспада
+        self.assertLess(TrendingSearch.objects.get(keyword='new').score, 2 ** half_lives)
+
+        later = now() + timedelta(days=half_lives)
+        with mock.patch('booking.trending.now', return_value=later):
+            record_search('new')
+        self.assertEqual({row.decayed_at for row in TrendingSearch.objects.all()}, {later})
+        # Угасший запрос удален, вес нового - в единицах текущего момента
+        self.assertEqual([row.keyword for row in get_trending()], ['new'])
+        self.assertAlmostEqual(TrendingSearch.objects.get().score, 1.5, places=3)
+        # Пересчет выполняет один процесс: при занятой блокировке точка отсчета не переносится
+        cache.add(trending.REBASE_LOCK_KEY, 1)
+        with mock.patch('booking.trending.now', return_value=later + timedelta(days=half_lives)):
+            record_search('new')
+        self.assertEqual(TrendingSearch.objects.get().decayed_at, later)
+
+    def test_listing_serves_trending_from_cache(self):
+        record_search('berlin')
+        cache.delete('trending_searches')
+        # Промах кэша - один запрос по индексу, без пересчета затухания
+        with self.assertNumQueries(1):
+            self.assertEqual([row.keyword for row in get_trending()], ['berlin'])
+        with self.assertNumQueries(0):
+            get_trending()
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ListingCacheTests(TestCase):
+    """
+    Кэш списков объектов и карточек: попадание и точечная инвалидация
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.housing = Housing.objects.create(
+            name='Квартира у парка', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=cls.host
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.guest)
+
+    def get_list(self, query=''):
+        return self.client.get(reverse('housing_list') + query).content.decode()
+
+    def test_cached_page_skips_listing_queries(self):
+        self.get_list('?sort_by=price_asc')
+        with self.assertNumQueries(0):
+            listing_cache.cached_page(
+                'housing_list', listing_cache.PUBLIC, [('sort_by', 'price_asc')], lambda: self.fail('not cached')
+            )
+
+    def test_equivalent_params_share_key(self):
+        filter_a = HousingFilter({'keyword': 'Берлин ', 'rooms': '2', 'type': ''})
+        filter_b = HousingFilter({'rooms': '2.0', 'keyword': 'берлин'})
+        self.assertTrue(filter_a.is_valid() and filter_b.is_valid())
+        self.assertEqual(
+            listing_cache.listing_key('housing_list', listing_cache.PUBLIC, listing_cache.normalize_params(filter_a)),
+            listing_cache.listing_key('housing_list', listing_cache.PUBLIC, listing_cache.normalize_params(filter_b)),
+        )
+
+    def test_housing_change_invalidates_card_and_listing(self):
+        self.assertIn('Квартира у парка', self.get_list())
+        self.housing.name = 'Дом у озера'
+        self.housing.save()
+        self.assertIn('Дом у озера', self.get_list())
+        self.housing.is_visible = False
+        self.housing.save()
+        self.assertNotIn('Дом у озера', self.get_list())
+
+    def test_hidden_housing_keeps_public_listings(self):
+        public = listing_cache.get_generations([listing_cache.PUBLIC])
+        Housing.objects.create(
+            name='Черновик', country='Германия', post_code='10115', city='Берлин',
+            rooms=1, description='Описание', price=50, owner=self.host, is_visible=False
+        )
+        self.assertEqual(listing_cache.get_generations([listing_cache.PUBLIC]), public)
+
+    def test_review_invalidates_rating(self):
+        self.get_list('?sort_by=rating_desc')
+        Review.objects.create(rating=4, text='Хорошо', owner=self.guest, housing=self.housing)
+        self.assertIn('Средняя оценка:</strong> 4,0', self.get_list('?sort_by=rating_desc'))
+
+
+class StampedeProtectionTests(SimpleTestCase):
+    """
+    Одновременные промахи по одному ключу вычисляются один раз
+    """
+
+    def test_concurrent_misses_compute_once(self):
+        cache.clear()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(listing_cache.get_or_compute('stampede', compute, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class BookingBulkTests(QueryBudgetTestCase):
+    """
+    Пакетное изменение бронирований владельцем объектов
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.housing = Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=cls.host
+        )
+        cls.other_housing = Housing.objects.create(
+            name='Дом', country='Германия', post_code='10115', city='Берлин',
+            rooms=4, description='Описание', price=200, owner=cls.guest
+        )
+        cls.today = now().date()
+
+    def setUp(self):
+        self.client.force_login(self.host)
+
+    def book(self, start, nights=2, housing=None, status=Booking.BookingStatus.UNCONFIRMED):
+        date_from = self.today + timedelta(days=start)
+        return Booking.objects.create(
+            owner=self.guest, housing=housing or self.housing, status=status,
+            date_from=date_from, date_to=date_from + timedelta(days=nights)
+        )
+
+    def post(self, items, **options):
+        return self.client.post(
+            reverse('booking-bulk'), {'items': items, **options}, content_type='application/json'
+        )
+
+    def test_confirms_batch_and_reports_conflicts(self):
+        first, overlapping, later = self.book(1), self.book(2), self.book(10)
+        foreign = self.book(1, housing=self.other_housing)
+        response = self.post([
+            {'id': first.id, 'status': 'CONFIRMED'},
+            {'id': overlapping.id, 'status': 'CONFIRMED'},
+            {'id': later.id, 'status': 'PENDING'},
+            {'id': foreign.id, 'status': 'CONFIRMED'},
+            {'id': 999999, 'status': 'CONFIRMED'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['ok'] for result in response.json()['results']], [True, False, True, False, False])
+        self.assertEqual(response.json()['succeeded'], 2)
+        statuses = dict(Booking.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[first.id], 'CONFIRMED')
+        self.assertEqual(statuses[overlapping.id], 'UNCONFIRMED')
+        self.assertEqual(statuses[foreign.id], 'UNCONFIRMED')
+        # Календарь занятости обновлен вместе с бронированиями
+        self.assertEqual(
+            [booking_id for _, _, booking_id in self.housing.calendar.ranges], [first.id, later.id]
+        )
+
+    def test_reschedule_checks_dates_against_batch(self):
+        booking = self.book(1, status=Booking.BookingStatus.PENDING)
+        moved = self.today + timedelta(days=20)
+        response = self.post([
+            {'id': booking.id, 'date_from': moved.isoformat(), 'date_to': (moved + timedelta(days=1)).isoformat()},
+            {'id': self.book(20).id, 'status': 'CONFIRMED'},
+        ])
+        self.assertEqual([result['ok'] for result in response.json()['results']], [True, False])
+        booking.refresh_from_db()
+        self.assertEqual(booking.date_from, moved)
+
+    def test_all_or_nothing_rolls_back(self):
+        first, overlapping = self.book(1), self.book(2)
+        response = self.post(
+            [{'id': first.id, 'status': 'CONFIRMED'}, {'id': overlapping.id, 'status': 'CONFIRMED'}],
+            all_or_nothing=True
+        )
+        self.assertEqual(response.json()['succeeded'], 0)
+        self.assertFalse(Booking.objects.filter(status='CONFIRMED').exists())
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.post([{'id': self.book(1).id}]).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+
+    def test_query_budget_does_not_depend_on_batch_size(self):
+        items = [{'id': self.book(start * 3).id, 'status': 'CONFIRMED'} for start in range(20)]
+        response = self.assertQueryBudget(
+            'booking-bulk', method='post', data={'items': items}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['succeeded'], 20)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class AsyncViewTests(TestCase):
+    """
+    Асинхронные представления через ASGI-обработчик: ответы, проверка входа
+    и учет SQL-запросов асинхронной веткой QueryInstrumentationMiddleware
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.housing = Housing.objects.create(
+            name='Квартира у парка', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=cls.user
+        )
+        Review.objects.create(rating=5, text='Отлично', owner=cls.user, housing=cls.housing)
+
+    def setUp(self):
+        cache.clear()
+        for window in PopularHousing.Window.values:
+            get_leaderboard(window)
+        get_trending()
+        buffer = view_buffer.ViewBuffer(flush_interval=3600, background=False)
+        patcher = mock.patch.object(view_buffer, 'view_buffer', buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def get(self, url_name, *args, query=''):
+        response = await self.async_client.get(reverse(url_name, args=args) + query)
+        if response.status_code == 200:
+            budget = get_query_budget(settings.QUERY_BUDGETS, url_name, 'GET')
+            self.assertLessEqual(int(response['X-DB-Query-Count']), budget)
+        return response
+
+    async def test_login_required(self):
+        response = await self.get('housing_detail', self.housing.id)
+        self.assertEqual(response.status_code, 302)
+
+    async def test_housing_detail(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.get('housing_detail', self.housing.id)
+        self.assertContains(response, 'Квартира у парка')
+        self.assertContains(response, 'guest')
+        self.assertEqual((await self.get('housing_detail', 0)).status_code, 404)
+
+    async def test_housing_list(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.get('housing_list', query='?keyword=парк')
+        self.assertContains(response, 'Квартира у парка')
+        self.assertTrue(await TrendingSearch.objects.filter(keyword='парк').aexists())
+
+    async def test_index(self):
+        await self.async_client.aforce_login(self.user)
+        self.assertContains(await self.get('index'), 'Квартира у парка')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class AvailabilityFilterTests(TestCase):
+    """
+    Фильтр свободных дат: объекты с пересекающимися активными бронированиями исключаются
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.today = now().date()
+        cls.busy, cls.canceled, cls.free = [
+            Housing.objects.create(
+                name=name, country='Германия', post_code='10115', city='Берлин',
+                rooms=2, description='Описание', price=100, owner=cls.user
+            )
+            for name in ('Занятая квартира', 'Отмененная квартира', 'Свободная квартира')
+        ]
+        cls.book(cls.busy, 10, 15, Booking.BookingStatus.CONFIRMED)
+        cls.book(cls.canceled, 10, 15, Booking.BookingStatus.CANCELED)
+
+    @classmethod
+    def book(cls, housing, start, end, status=Booking.BookingStatus.PENDING):
+        return Booking.objects.create(
+            owner=cls.user, housing=housing, status=status,
+            date_from=cls.today + timedelta(days=start), date_to=cls.today + timedelta(days=end)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def available(self, start=None, end=None):
+        data = {}
+        if start is not None:
+            data['available_from'] = self.today + timedelta(days=start)
+        if end is not None:
+            data['available_to'] = self.today + timedelta(days=end)
+        return set(HousingFilter(data, queryset=Housing.objects.all()).qs.values_list('name', flat=True))
+
+    def test_overlapping_active_bookings_are_excluded(self):
+        everything = {'Занятая квартира', 'Отмененная квартира', 'Свободная квартира'}
+        self.assertEqual(self.available(12, 20), everything - {'Занятая квартира'})
+        # Границы включительно: выезд в день 15 занимает этот день
+        self.assertEqual(self.available(15, 16), everything - {'Занятая квартира'})
+        self.assertEqual(self.available(16, 20), everything)
+        self.assertEqual(self.available(1, 9), everything)
+        # Одна граница - один день
+        self.assertEqual(self.available(end=10), everything - {'Занятая квартира'})
+        self.assertEqual(self.available(20, 10), set())
+
+    def test_api_and_html_listing(self):
+        start = (self.today + timedelta(days=11)).isoformat()
+        response = self.client.get(reverse('housings-list'), {'available_from': start, 'fields': 'name'})
+        self.assertEqual(
+            {housing['name'] for housing in response.json()['results']},
+            {'Отмененная квартира', 'Свободная квартира'}
+        )
+        response = self.client.get(reverse('housing_list'), {'available_from': start})
+        self.assertNotContains(response, 'Занятая квартира')
+        self.assertContains(response, 'Свободная квартира')
+
+        # Новое бронирование сбрасывает закэшированные списки с фильтром по датам
+        self.book(self.free, 11, 12)
+        response = self.client.get(reverse('housing_list'), {'available_from': start})
+        self.assertNotContains(response, 'Свободная квартира')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], FACET_PRICE_BUCKETS=[100, 200])
+class FacetTests(QueryBudgetTestCase):
+    """
+    Счетчики фасетов: собственный фильтр фасета не учитывается, результат кэшируется
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@example.com', 'password')
+        for name, type, city, rooms, price in [
+            ('Квартира 1', 'APARTMENT', 'Берлин', 1, 50),
+            ('Квартира 2', 'APARTMENT', 'Берлин', 2, 150),
+            ('Дом', 'HOUSE', 'Гамбург', 4, 250),
+            ('Студия', 'STUDIO', 'Гамбург', 1, 99.99),
+        ]:
+            Housing.objects.create(
+                name=name, type=type, country='Германия', post_code='10115', city=city,
+                rooms=rooms, description='Описание', price=price, owner=cls.user
+            )
+        Housing.objects.create(
+            name='Скрытая', country='Германия', post_code='10115', city='Берлин', rooms=1,
+            description='Описание', price=10, owner=User.objects.create_user('host', 'host@example.com'),
+            is_visible=False
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def facets(self, **params):
+        response = self.client.get(reverse('housings-facets'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts(self):
+        facets = self.facets()
+        self.assertEqual([(item['value'], item['count']) for item in facets['types']],
+                         [('APARTMENT', 2), ('HOUSE', 1), ('STUDIO', 1)])
+        self.assertEqual([(item['value'], item['count']) for item in facets['rooms']], [(1, 2), (2, 1), (4, 1)])
+        self.assertEqual(facets['prices'], [
+            {'min': None, 'max': '99.99', 'count': 2},
+            {'min': '100', 'max': '199.99', 'count': 1},
+            {'min': '200', 'max': None, 'count': 1},
+        ])
+        self.assertEqual(facets['locations']['countries'], [{'value': 'Германия', 'count': 4}])
+        self.assertEqual([item['value'] for item in facets['locations']['cities']], ['Берлин', 'Гамбург'])
+
+    def test_facet_ignores_own_filter(self):
+        facets = self.facets(type='APARTMENT', rooms=1)
+        # Типы считаются с фильтром по комнатам, но без фильтра по типу
+        self.assertEqual({item['value']: item['count'] for item in facets['types']}, {'APARTMENT': 1, 'STUDIO': 1})
+        self.assertEqual({item['value']: item['count'] for item in facets['rooms']}, {1: 1, 2: 1})
+        self.assertEqual(sum(item['count'] for item in facets['prices']), 1)
+        # Цена из фасета подставляется в фильтр как есть
+        bucket = self.facets()['prices'][0]
+        self.assertEqual(sum(item['count'] for item in self.facets(price_max=bucket['max'])['types']), 2)
+
+    def test_cached_per_normalized_filter(self):
+        self.assertQueryBudget('housings-facets', query='?rooms=1')
+        # Пользователь тоже берется из кэша, из базы читается только сессия
+        with self.assertNumQueries(1):
+            self.facets(rooms='1.0')
+        self.assertEqual(self.client.get(reverse('housings-facets'), {'rooms': 'x'}).status_code, 400)
+
+    def test_housing_list_sidebar(self):
+        response = self.client.get(reverse('housing_list'))
+        self.assertContains(response, 'Уточнить поиск')
+        self.assertContains(response, 'Гамбург, Германия (2)')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class QueryPlanTests(QueryPlanTestCase):
+    """
+    Планы горячих запросов на данных seed_data: каждый путь доступа
+    должен идти по индексу, а не полным перебором таблицы
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data', users=20, housings=300, bookings=4, views=2000, searches=200,
+            prefix='plan', seed=1, stdout=StringIO()
+        )
+        if connection.vendor == 'sqlite':
+            # Статистика распределения, как в рабочей базе
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        cls.host = User.objects.annotate(housing_count=Count('owner_housings')).order_by('-housing_count').first()
+        cls.housing = Housing.objects.filter(owner=cls.host, is_visible=True).first()
+        cls.today = now().date()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.host)
+        buffer = view_buffer.ViewBuffer(flush_interval=3600, background=False)
+        patcher = mock.patch.object(view_buffer, 'view_buffer', buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_listing(self):
+        visible = Housing.objects.filter(is_visible=True)
+        self.assertNoFullScan(visible.order_by('-created_at', '-id')[:21])
+        self.assertNoFullScan(visible.order_by('price', 'id')[:21])
+        self.assertNoFullScan(visible.order_by('-rating_avg', '-id')[:21])
+        self.assertNoFullScan(visible.order_by('-views', 'id')[:21])
+
+    def test_availability(self):
+        self.assertNoFullScan(Booking.objects.filter(
+            housing=self.housing, status__in=ACTIVE_STATUSES,
+            date_from__lte=self.today + timedelta(days=7), date_to__gte=self.today,
+        ))
+        dates = {'available_from': self.today, 'available_to': self.today + timedelta(days=7)}
+        plan = self.assertNoFullScan(
+            HousingFilter(dates, queryset=Housing.objects.filter(is_visible=True)).qs.order_by('-created_at')[:21]
+        )
+        if connection.vendor == 'sqlite':
+            self.assertIn('booking_boo_housing_a395c0_idx', str(plan))
+
+    def test_bookings_and_history(self):
+        pending = [Booking.BookingStatus.PENDING, Booking.BookingStatus.UNCONFIRMED]
+        self.assertNoFullScan(Booking.objects.filter(housing__owner=self.host, status__in=pending).order_by('-created_at'))
+        self.assertNoFullScan(Booking.objects.filter(status__in=pending).order_by('-created_at'))
+        self.assertNoFullScan(Booking.objects.filter(owner=self.host).select_related('housing'))
+        self.assertNoFullScan(Review.objects.filter(housing=self.housing).select_related('owner'))
+        self.assertNoFullScan(SearchHistory.objects.filter(user=self.host, keyword='berlin'))
+        self.assertNoFullScan(ViewHistory.objects.filter(user_id__in=[self.host.pk], housing_id__in=[self.housing.pk]))
+        self.assertNoFullScan(TrendingSearch.objects.order_by('-score', 'keyword')[:5])
+        self.assertNoFullScan(PopularHousing.objects.filter(window=PopularHousing.Window.DAY).select_related('housing'))
+
+    def test_pages(self):
+        # Фасеты без фильтров по определению считают все видимые объекты:
+        # прогреваем их, чтобы проверять только запросы самого списка
+        for query in ['?sort_by=price_asc', '?sort_by=date_newest', f'?available_from={self.today}']:
+            get_facets(HousingFilter(QueryDict(query[1:]), queryset=Housing.objects.filter(is_visible=True)), PUBLIC)
+            self.assertPageIndexed(reverse('housing_list') + query)
+        self.assertPageIndexed(reverse('housing_detail', args=[self.housing.pk]))
+        self.assertPageIndexed(reverse('create_booking', args=[self.housing.pk]))
+        self.assertPageIndexed(reverse('my_bookings'))
+        self.assertPageIndexed(reverse('my_confirmation'))
+        self.assertPageIndexed(reverse('housings-list'))
+        self.assertPageIndexed(reverse('index'))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class AuthCacheTests(TestCase):
+    """
+    Сессия и пользователь авторизованного запроса берутся из кэша;
+    кэш сбрасывается при выходе, смене пароля и изменении прав
+    """
+    # Страницы для авторизованного пользователя (имя URL, аргументы)
+    pages = [
+        ('index', []),
+        ('housing_list', []),
+        ('housing_detail', ['housing']),
+        ('create_booking', ['housing']),
+        ('my_bookings', []),
+        ('my_confirmation', []),
+        ('housings-list', []),
+        ('booking-list', []),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.housing = Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100,
+            owner=User.objects.create_user('host', 'host@example.com', 'password')
+        )
+
+    def setUp(self):
+        cache.clear()
+        buffer = view_buffer.ViewBuffer(flush_interval=3600, background=False)
+        patcher = mock.patch.object(view_buffer, 'view_buffer', buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def count_queries(self, url):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return recorder.count
+
+    def warm_query_counts(self):
+        """
+        Количество SQL-запросов на каждой странице при повторном открытии
+        (кэши страниц уже прогреты первым открытием)
+        """
+        # Новый клиент: обработчик клиента хранит middleware с движком сессий
+        self.client = self.client_class()
+        self.client.force_login(self.user)
+        counts = {}
+        for url_name, args in self.pages:
+            url = reverse(url_name, args=[getattr(self, arg).pk for arg in args])
+            # Первое открытие с холодными кэшами бюджетом не проверяется
+            with override_settings(QUERY_BUDGETS={}):
+                self.client.get(url)
+            counts[url_name] = self.count_queries(url)
+        return counts
+
+    def test_query_savings_per_page(self):
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db',
+                               AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend']):
+            uncached = self.warm_query_counts()
+        # Сессии в кэше включаются вместе с общим кэшем (CACHE_URL)
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            cached = self.warm_query_counts()
+        # На каждой странице экономятся чтение сессии и пользователя
+        self.assertEqual({name: uncached[name] - cached[name] for name in cached},
+                         {name: 2 for name, _ in self.pages})
+
+    def test_logout_invalidates_user(self):
+        self.client.login(username='guest', password='password')
+        self.client.get(reverse('my_bookings'))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.get(reverse('logout'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get(reverse('my_bookings')).status_code, 302)
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.login(username='guest', password='password')
+        self.assertEqual(self.client.get(reverse('my_bookings')).status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        self.assertEqual(self.client.get(reverse('my_bookings')).status_code, 302)
+
+    def test_permission_change_invalidates_permissions(self):
+        backend = CachedModelBackend()
+        permission = Permission.objects.get(codename='change_housing')
+        self.assertFalse(backend.get_user(self.user.pk).has_perm('booking.change_housing'))
+
+        self.user.user_permissions.add(permission)
+        self.assertTrue(backend.get_user(self.user.pk).has_perm('booking.change_housing'))
+
+        self.user.user_permissions.clear()
+        self.assertFalse(backend.get_user(self.user.pk).has_perm('booking.change_housing'))
+
+        # Права группы меняются у всех ее участников
+        group = Group.objects.create(name='editors')
+        self.user.groups.add(group)
+        self.assertFalse(backend.get_user(self.user.pk).has_perm('booking.change_housing'))
+        group.permissions.add(permission)
+        self.assertTrue(backend.get_user(self.user.pk).has_perm('booking.change_housing'))
+
+    def test_inactive_user_is_not_served_from_cache(self):
+        backend = CachedModelBackend()
+        self.assertIsNotNone(backend.get_user(self.user.pk))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        # update() не отправляет сигналов: кэш устаревает не дольше USER_CACHE_TTL
+        self.assertIsNotNone(backend.get_user(self.user.pk))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class JWTAuthTests(TestCase):
+    """
+    JWT-аутентификация API: пользователь и его права берутся из claims
+    токена без запросов к базе, отзыв токенов - через список в кэше
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        cls.housing = Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин', rooms=2,
+            description='Описание', price=100,
+            owner=User.objects.create_user('host', 'host@example.com', 'password')
+        )
+        today = now().date()
+        cls.booking = Booking.objects.create(
+            owner=cls.guest, housing=cls.housing, date_from=today + timedelta(days=1), date_to=today + timedelta(days=2)
+        )
+        cls.other_booking = Booking.objects.create(
+            owner=cls.admin, housing=cls.housing, date_from=today + timedelta(days=5), date_to=today + timedelta(days=6)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def obtain(self, username='guest', password='password'):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': username, 'password': password})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def api(self, method, url, tokens, data=None):
+        return getattr(self.client, method)(
+            url, data, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}'
+        )
+
+    def test_permissions_from_claims_without_queries(self):
+        tokens = self.obtain()
+        detail = reverse('booking-detail', args=[self.booking.id])
+        with self.assertNumQueries(1):  # только само бронирование
+            self.assertEqual(self.api('get', detail, tokens).status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.api('get', reverse('booking-detail', args=[self.other_booking.id]), tokens)
+        self.assertEqual(response.status_code, 403)
+        # Список пользователей - только для администраторов (is_staff из claims)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api('get', reverse('users-list'), tokens).status_code, 403)
+        self.assertEqual(self.api('get', reverse('users-list'), self.obtain('admin')).status_code, 200)
+
+    def test_create_with_token_user(self):
+        tokens = self.obtain()
+        today = now().date()
+        response = self.api('post', reverse('booking-list'), tokens, {
+            'housing_id': self.housing.id,
+            'date_from': str(today + timedelta(days=10)),
+            'date_to': str(today + timedelta(days=12)),
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Booking.objects.get(pk=response.json()['id']).owner, self.guest)
+
+    def test_refresh_rotates_tokens(self):
+        tokens = self.obtain()
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.api('get', reverse('booking-list'), response.json()).status_code, 200)
+        # Использованный refresh-токен повторно не принимается
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).status_code, 401)
+
+    def test_revoke(self):
+        tokens = self.obtain()
+        self.assertEqual(self.client.post(reverse('token_revoke'), {'refresh': tokens['refresh']}).status_code, 200)
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).status_code, 401)
+        # Access-токен отдельно не отзывается, пока не отозваны все токены пользователя
+        self.assertEqual(self.api('get', reverse('booking-list'), tokens).status_code, 200)
+
+        tokens = self.obtain()
+        self.client.post(reverse('token_revoke'), {'refresh': tokens['refresh'], 'all': True})
+        self.assertEqual(self.api('get', reverse('booking-list'), tokens).status_code, 401)
+
+    def test_credentials_change_revokes_tokens(self):
+        tokens = self.obtain()
+        user = User.objects.get(pk=self.guest.pk)
+        user.last_name = 'Иванов'
+        user.save()
+        self.assertEqual(self.api('get', reverse('booking-list'), tokens).status_code, 200)
+
+        user.set_password('new-password')
+        user.save()
+        self.assertEqual(self.api('get', reverse('booking-list'), tokens).status_code, 401)
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).status_code, 401)
+
+    def test_revocation_boundary_is_next_second(self):
+        with mock.patch('booking.authentication.time') as clock:
+            clock.time.return_value = 1000.5
+            revoke_user_tokens(self.guest.pk)
+        token = {api_settings.JTI_CLAIM: 'jti', api_settings.USER_ID_CLAIM: self.guest.pk}
+        # Токены той же секунды отозваны, повторный вход в следующую секунду проходит
+        self.assertTrue(is_denied({**token, 'iat': 1000}))
+        self.assertFalse(is_denied({**token, 'iat': 1001}))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], EXPORT_CHUNK_SIZE=2)
+class ExportTests(TestCase):
+    """
+    Потоковые выгрузки: права, фильтры, форматы и чтение пачками
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        cls.housing = Housing.objects.create(
+            name='Квартира, центр', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=cls.host
+        )
+        foreign = Housing.objects.create(
+            name='Дом', country='Германия', post_code='20095', city='Гамбург',
+            rooms=4, description='Описание', price=200, owner=other
+        )
+        today = now().date()
+        for i in range(5):
+            Booking.objects.create(owner=cls.guest, housing=cls.housing,
+                                   date_from=today + timedelta(days=i * 3), date_to=today + timedelta(days=i * 3 + 1))
+        Booking.objects.create(owner=cls.guest, housing=foreign, date_from=today, date_to=today)
+        Review.objects.create(rating=5, text='Отлично', owner=cls.guest, housing=cls.housing)
+
+    def export(self, user, name, query=''):
+        self.client.force_login(user)
+        response = self.client.get(reverse('export', args=name.split('.')) + query)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_host_exports_bookings_of_own_housing(self):
+        rows = list(csv.reader(self.export(self.host, 'bookings.csv').splitlines()))
+        self.assertEqual(rows[0][:4], ['id', 'status', 'date_from', 'date_to'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({row[rows[0].index('housing__name')] for row in rows[1:]}, {'Квартира, центр'})
+        self.assertEqual({row[rows[0].index('owner__username')] for row in rows[1:]}, {'guest'})
+
+        # Гость выгружает свои бронирования, администратор - все
+        self.assertEqual(len(self.export(self.guest, 'bookings.ndjson').splitlines()), 6)
+        self.assertEqual(len(self.export(self.admin, 'housings.ndjson').splitlines()), 2)
+
+    def test_filters(self):
+        today = now().date()
+        lines = self.export(self.admin, 'bookings.ndjson', f'?date_from={today + timedelta(days=3)}'
+                                                           f'&date_to={today + timedelta(days=7)}&host={self.host.pk}')
+        self.assertEqual([json.loads(line)['date_from'] for line in lines.splitlines()],
+                         [str(today + timedelta(days=3)), str(today + timedelta(days=6))])
+        self.assertEqual(self.export(self.admin, 'reviews.ndjson', f'?created_from={today + timedelta(days=1)}'), '')
+        self.assertEqual(len(self.export(self.admin, 'reviews.ndjson', f'?created_to={today}').splitlines()), 1)
+
+        response = self.client.get(reverse('export', args=['bookings', 'csv']) + '?created_from=x')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('export', args=['users', 'csv'])).status_code, 404)
+
+    def test_reads_in_batches(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export', args=['bookings', 'ndjson']))
+        # 6 строк пачками по 2: три полные пачки и пустая
+        with self.assertNumQueries(4):
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(len({json.loads(line)['id'] for line in lines}), 6)
+
+    def test_anonymous(self):
+        self.assertEqual(self.client.get(reverse('export', args=['bookings', 'csv'])).status_code, 401)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class HousingImportTests(TestCase):
+    """
+    Импорт объектов пачками: проверка строк, ошибки по строкам,
+    повторный импорт по external_id
+    """
+    header = 'external_id,name,type,description,street,house_number,post_code,city,country,rooms,price,is_visible\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def csv_file(self, rows):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = f'{directory.name}/import.csv'
+        with open(path, 'w') as file:
+            file.write(self.header + ''.join(rows))
+        return path
+
+    def test_command_imports_and_updates(self):
+        rows = [f'P-{i},Лофт {i},APARTMENT,Описание,Gartenweg,{i},10115,Берлин,Германия,2,{100 + i},\n'
+                for i in range(5)]
+        path = self.csv_file(rows + ['P-9,,CASTLE,,,,,,,x,,\n', 'P-0,Дубль,HOUSE,Описание,,,10115,Берлин,Германия,2,1,\n'])
+        out, err = StringIO(), StringIO()
+        call_command('import_housings', path, owner='host', chunk_size=2, stdout=out, stderr=err)
+        self.assertIn('Создано: 5, обновлено: 0, с ошибками: 2', out.getvalue())
+        self.assertIn('строка 7 (P-9)', err.getvalue())
+        self.assertIn('строка 8 (P-0)', err.getvalue())
+
+        housings = Housing.objects.filter(owner=self.host).order_by('external_id')
+        self.assertEqual([housing.external_id for housing in housings], [f'P-{i}' for i in range(5)])
+        # Пустая ячейка is_visible - значение по умолчанию, как в форме
+        self.assertTrue(all(housing.is_visible for housing in housings))
+        self.assertEqual(HousingFilter({'keyword': 'лофт'}, queryset=Housing.objects.all()).qs.count(), 5)
+
+        # Повторный импорт обновляет объекты, а не создает новые
+        path = self.csv_file(['P-1,Лофт обновлен,STUDIO,Описание,,,10115,Берлин,Германия,1,99.50,false\n'])
+        call_command('import_housings', path, owner=str(self.host.pk), stdout=out, stderr=err)
+        self.assertIn('Создано: 0, обновлено: 1, с ошибками: 0', out.getvalue())
+        housing = Housing.objects.get(owner=self.host, external_id='P-1')
+        self.assertEqual((housing.name, housing.type, housing.price, housing.is_visible),
+                         ('Лофт обновлен', 'STUDIO', Decimal('99.50'), False))
+        self.assertEqual(Housing.objects.count(), 5)
+
+    def upload(self, user, content, name='import.ndjson', **data):
+        self.client.force_login(user)
+        return self.client.post(reverse('housings-import'), {
+            'file': SimpleUploadedFile(name, content.encode()), **data
+        })
+
+    def test_api_ndjson(self):
+        lines = [
+            json.dumps({'external_id': 'A-1', 'name': 'Вилла', 'type': 'VILLA', 'description': 'У моря',
+                        'post_code': '18055', 'city': 'Росток', 'country': 'Германия', 'rooms': 6, 'price': 450}),
+            '{"external_id": "A-2", ',
+            json.dumps({'external_id': 'A-3', 'name': 'Студия', 'rooms': 1}),
+        ]
+        response = self.upload(self.host, '\n'.join(lines))
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['created'], report['updated'], report['failed']), (1, 0, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+        self.assertIn('price', report['errors'][1]['errors'])
+        self.assertTrue(Housing.objects.filter(owner=self.host, external_id='A-1', rooms=6).exists())
+
+        # Администратор импортирует для другого владельца; тот же external_id
+        # у другого владельца - другой объект
+        response = self.upload(self.admin, lines[0], owner=self.admin.pk)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(Housing.objects.filter(external_id='A-1').count(), 2)
+
+    def test_api_invalid_request(self):
+        self.assertEqual(self.upload(self.host, 'x', name='import.xml').status_code, 400)
+        self.assertEqual(self.upload(self.admin, '', owner=0).status_code, 400)
+        self.client.force_login(self.host)
+        self.assertEqual(self.client.post(reverse('housings-import')).status_code, 400)
+
+
+class DailyStatsTests(TestCase):
+    """
+    Дневная статистика объектов: инкрементальное обновление совпадает
+    с полным пересчетом, отчет о загрузке читает только статистику
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        cls.housing = Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=cls.host
+        )
+        cls.other_housing = Housing.objects.create(
+            name='Дом', country='Германия', post_code='10115', city='Берлин',
+            rooms=4, description='Описание', price=200, owner=cls.guest
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def book(self, date_from, date_to, housing=None, status=Booking.BookingStatus.CONFIRMED):
+        return Booking.objects.create(owner=self.guest, housing=housing or self.housing, status=status,
+                                      date_from=date_from, date_to=date_to)
+
+    def stats(self):
+        return sorted(HousingDailyStats.objects.values_list(
+            'housing_id', 'day', 'nights_booked', 'bookings_started', 'revenue', 'cancellations'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.stats()
+        call_command('rebuild_daily_stats', stdout=StringIO())
+        self.assertEqual(incremental, self.stats())
+
+    def test_incremental_updates_match_rebuild(self):
+        first = self.book(date(2024, 1, 30), date(2024, 2, 2))
+        self.assertEqual(
+            [(day.isoformat(), nights, started, revenue) for _, day, nights, started, revenue, _ in self.stats()],
+            [('2024-01-30', 1, 1, Decimal(100)), ('2024-01-31', 1, 0, Decimal(100)),
+             ('2024-02-01', 1, 0, Decimal(100)), ('2024-02-02', 1, 0, Decimal(100))],
+        )
+        second = self.book(date(2024, 2, 10), date(2024, 2, 12))
+        pending = self.book(date(2024, 3, 1), date(2024, 3, 5), status=Booking.BookingStatus.PENDING)
+        self.book(date(2024, 2, 1), date(2024, 2, 3), housing=self.other_housing)
+        self.assertMatchesRebuild()
+
+        # Перенос дат, отмена, подтверждение и удаление
+        first.date_from, first.date_to = date(2024, 2, 5), date(2024, 2, 6)
+        first.save()
+        second.status = Booking.BookingStatus.CANCELED
+        second.save()
+        pending.status = Booking.BookingStatus.CONFIRMED
+        pending.save()
+        self.assertMatchesRebuild()
+        Booking.objects.only('id', 'housing_id').get(pk=pending.pk).delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(HousingDailyStats.objects.get(housing=self.housing, day=date(2024, 2, 10)).cancellations, 1)
+
+        # Изменение цены пересчитывает выручку
+        self.housing.price = 150
+        self.housing.save()
+        self.assertEqual(HousingDailyStats.objects.get(housing=self.housing, day=date(2024, 2, 5)).revenue, 150)
+
+        # Пакетное изменение (bulk_update без сигналов)
+        future = now().date() + timedelta(days=10)
+        booking = self.book(future, future + timedelta(days=2), status=Booking.BookingStatus.PENDING)
+        results = bulk_update_bookings(self.host, [
+            {'id': booking.pk, 'status': Booking.BookingStatus.CONFIRMED, 'date_to': future + timedelta(days=4)},
+        ])
+        self.assertTrue(results[0]['ok'])
+        self.assertEqual(HousingDailyStats.objects.filter(housing=self.housing, day__gte=future).count(), 5)
+        self.assertMatchesRebuild()
+
+    def occupancy(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse('analytics-occupancy'), params)
+
+    def test_occupancy_report(self):
+        self.book(date(2024, 1, 30), date(2024, 2, 2))
+        self.book(date(2024, 2, 10), date(2024, 2, 12), status=Booking.BookingStatus.CANCELED)
+        self.book(date(2024, 2, 1), date(2024, 2, 14), housing=self.other_housing)
+
+        response = self.occupancy(self.host, date_from='2024-01-15', date_to='2024-02-29')
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['housings'], 1)
+        self.assertEqual(
+            [(row['period'], row['days'], row['nights_booked'], row['revenue'], row['cancellations'], row['occupancy'])
+             for row in report['results']],
+            [('2024-01-01', 17, 2, '200.00', 0, round(2 / 17, 4)), ('2024-02-01', 29, 2, '200.00', 1, round(2 / 29, 4))],
+        )
+
+        # Администратор видит все объекты; итоги - по всем объектам области
+        report = self.occupancy(self.admin, date_from='2024-02-01', date_to='2024-02-29').json()
+        self.assertEqual(report['housings'], 2)
+        self.assertEqual(report['totals'][0]['nights_booked'], 16)
+        self.assertEqual(report['totals'][0]['occupancy'], round(16 / 58, 4))
+        report = self.occupancy(self.admin, date_from='2024-02-01', date_to='2024-02-03', group='day',
+                                housing=self.other_housing.pk).json()
+        self.assertEqual([row['period'] for row in report['results']], ['2024-02-01', '2024-02-02', '2024-02-03'])
+
+        # Чужой объект владельцу недоступен
+        self.assertEqual(self.occupancy(self.host, housing=self.other_housing.pk).json()['results'], [])
+        self.assertEqual(self.occupancy(self.host, date_from='2023-01-01', date_to='2024-12-31').status_code, 400)
+        self.assertEqual(self.occupancy(self.host, group='week').status_code, 400)
+
+
+class HostDashboardTests(TestCase):
+    """
+    Сводка владельца: счетчики одним запросом, ограниченные списки,
+    количество запросов не растет вместе с количеством объектов
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        cls.other_housing = cls.create_housing(cls.guest)
+        cls.today = now().date()
+        Booking.objects.create(owner=cls.host, housing=cls.other_housing, status=Booking.BookingStatus.PENDING,
+                               date_from=cls.today, date_to=cls.today)
+
+    @classmethod
+    def create_housing(cls, owner):
+        return Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=owner
+        )
+
+    def add_bookings(self, count):
+        statuses = Booking.BookingStatus.values
+        for i in range(count):
+            housing = self.create_housing(self.host)
+            status = statuses[i % len(statuses)]
+            date_from = self.today + timedelta(days=i - 2)
+            Booking.objects.create(owner=self.guest, housing=housing, status=status,
+                                   date_from=date_from, date_to=date_from + timedelta(days=1))
+
+    def dashboard(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('host-dashboard')).json()
+
+    @override_settings(DASHBOARD_ROWS=3)
+    def test_counts_and_rows(self):
+        self.add_bookings(12)
+        dashboard = self.dashboard(self.host)
+        self.assertEqual(dashboard['counts'], {
+            'CONFIRMED': 3, 'PENDING': 3, 'CANCELED': 3, 'UNCONFIRMED': 3, 'total': 12,
+        })
+        upcoming = dashboard['upcoming']
+        self.assertEqual(len(upcoming), 2)
+        self.assertEqual([row['status'] for row in upcoming], ['CONFIRMED', 'CONFIRMED'])
+        self.assertEqual(upcoming[0]['owner']['username'], 'guest')
+        self.assertEqual(upcoming[0]['housing']['name'], 'Квартира')
+        self.assertEqual(len(dashboard['pending']), 3)
+        self.assertTrue(all(row['status'] in ('PENDING', 'UNCONFIRMED') for row in dashboard['pending']))
+
+        # Бронирования чужих объектов не видны, администратор видит все
+        self.assertEqual(self.dashboard(self.guest)['counts']['total'], 1)
+        self.assertEqual(self.dashboard(self.admin)['counts']['total'], 13)
+
+    def test_queries_do_not_grow_with_portfolio(self):
+        self.client.force_login(self.host)
+        # Первый запрос кэширует пользователя сессии
+        self.client.get(reverse('host_dashboard'))
+        queries = []
+        for count in (2, 20):
+            self.add_bookings(count)
+            for name in ('host_dashboard', 'host-dashboard'):
+                with CaptureQueriesContext(connection) as context:
+                    self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+                queries.append(len(context))
+        self.assertEqual(queries[:2], queries[2:])
+
+
+class ConditionalGetTests(TestCase):
+    """
+    ETag и Last-Modified в API: неизменившиеся списки и карточки
+    отдаются как 304 без сериализации
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.housings = [
+            Housing.objects.create(
+                name=f'Квартира {i}', country='Германия', post_code='10115', city='Берлин',
+                rooms=2, description='Описание', price=100, owner=cls.host
+            )
+            for i in range(3)
+        ]
+        future = now().date() + timedelta(days=10)
+        cls.booking = Booking.objects.create(owner=cls.guest, housing=cls.housings[0], date_from=future,
+                                             date_to=future + timedelta(days=2))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.guest)
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+
+    def assertNotModified(self, url, response):
+        with mock.patch.object(HousingReadSerializer, 'to_representation') as to_representation:
+            repeated = self.get(url, if_none_match=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(repeated['ETag'], response['ETag'])
+        to_representation.assert_not_called()
+
+    def test_housing_list(self):
+        url = reverse('housings-list')
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotModified(url, response)
+        # Дата изменения списка не отражает удалений: только ETag
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.get(url, if_modified_since=http_date(time.time() + 60)).status_code, 200)
+        # Другие параметры - другое представление
+        self.assertNotEqual(self.get(url + '?rooms=2')['ETag'], response['ETag'])
+
+        # Новый отзыв меняет агрегаты объекта, удаление - количество объектов
+        Review.objects.create(rating=5, text='Отзыв', owner=self.guest, housing=self.housings[1])
+        changed = self.get(url, if_none_match=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.housings[2].delete()
+        self.assertEqual(self.get(url, if_none_match=changed['ETag']).status_code, 200)
+
+    def test_housing_detail(self):
+        self.client.force_login(self.host)
+        url = reverse('housings-detail', args=[self.housings[0].pk])
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotModified(url, response)
+        self.assertEqual(self.get(url, if_modified_since=response['Last-Modified']).status_code, 304)
+        Housing.objects.filter(pk=self.housings[0].pk).update(updated_at=now() + timedelta(seconds=1))
+        self.assertEqual(self.get(url, if_none_match=response['ETag']).status_code, 200)
+
+    def test_views_keep_validators(self):
+        self.client.force_login(self.host)
+        urls = [reverse('housings-list'), reverse('housings-detail', args=[self.housings[0].pk])]
+        responses = [self.get(url) for url in urls]
+        record_views(self.housings[0].pk, 3)
+        for url, response in zip(urls, responses):
+            self.assertEqual(self.get(url, if_none_match=response['ETag']).status_code, 304, url)
+
+    def test_booking_list_after_bulk_update(self):
+        url = reverse('booking-list')
+        response = self.get(url)
+        self.assertEqual(self.get(url, if_none_match=response['ETag']).status_code, 304)
+        with mock.patch('booking.reservations.now', return_value=now() + timedelta(seconds=1)):
+            results = bulk_update_bookings(self.host, [{'id': self.booking.pk, 'status': Booking.BookingStatus.CONFIRMED}])
+        self.assertTrue(results[0]['ok'])
+        self.assertEqual(self.get(url, if_none_match=response['ETag']).status_code, 200)
+
+
+@override_settings(READ_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Маршрутизация чтений в реплики и закрепление пользователя
+    за основной базой после записи
+    """
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False, untracked=False):
+        """
+        Выполняет запрос через middleware; представление читает,
+        при необходимости пишет и читает еще раз
+        """
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Housing))
+            if write:
+                if untracked:
+                    with untracked_writes():
+                        self.router.db_for_write(Housing)
+                else:
+                    self.router.db_for_write(Housing)
+            reads.append(self.router.db_for_read(Housing))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return reads, response.cookies.get(STICKY_COOKIE)
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.route(self.factory.get('/')), (['replica', 'replica'], None))
+        self.assertEqual(self.route(self.factory.get('/'), write=True, untracked=True), (['replica', 'replica'], None))
+        # Вне HTTP-запроса (команды, фоновые задачи) - основная база
+        self.assertEqual(self.router.db_for_read(Housing), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'booking'))
+        self.assertFalse(self.router.allow_migrate('replica', 'booking'))
+
+    def test_writes_stick_to_primary(self):
+        reads, cookie = self.route(self.factory.get('/'), write=True)
+        self.assertEqual(reads, ['replica', 'default'])
+        self.assertEqual(cookie['max-age'], 5)
+        reads, cookie = self.route(self.factory.post('/'))
+        self.assertEqual(reads, ['default', 'default'])
+        self.assertIsNotNone(cookie)
+
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.route(request), (['default', 'default'], None))
+
+    def test_async_requests(self):
+        reads = []
+
+        def write():
+            reads.append(self.router.db_for_read(Housing))
+            self.router.db_for_write(Housing)
+
+        async def view(request):
+            await sync_to_async(write)()
+            reads.append(self.router.db_for_read(Housing))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.get('/'))
+        self.assertEqual(reads, ['replica', 'default'])
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    @override_settings(READ_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.route(self.factory.post('/'), write=True), (['default', 'default'], None))
+
+
+class ReservationTests(TestCase):
+    """
+    Резервирование: новые бронирования не пересекаются с активными,
+    изменения бронирований поддерживают календарь занятости
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.housing = Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=cls.host
+        )
+        cls.other_housing = Housing.objects.create(
+            name='Дом', country='Германия', post_code='10115', city='Берлин',
+            rooms=4, description='Описание', price=200, owner=cls.host
+        )
+        cls.start = now().date() + timedelta(days=10)
+
+    def setUp(self):
+        cache.clear()
+
+    def days(self, start, nights):
+        date_from = self.start + timedelta(days=start)
+        return date_from, date_from + timedelta(days=nights)
+
+    def test_html_booking_rejects_overlap(self):
+        reserve(self.housing, self.guest, *self.days(0, 3), status=Booking.BookingStatus.CONFIRMED)
+        self.client.force_login(self.guest)
+        date_from, date_to = self.days(2, 2)
+        response = self.client.post(reverse('create_booking', args=[self.housing.pk]),
+                                    {'date_from': date_from, 'date_to': date_to})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('уже забронирован', str(list(get_messages(response.wsgi_request))[0]))
+        self.assertEqual(Booking.objects.filter(housing=self.housing).count(), 1)
+
+        # Заявка со статусом по умолчанию на свободные даты создается
+        date_from, date_to = self.days(5, 2)
+        response = self.client.post(reverse('create_booking', args=[self.housing.pk]),
+                                    {'date_from': date_from, 'date_to': date_to})
+        self.assertRedirects(response, reverse('my_bookings'), fetch_redirect_response=False)
+        self.assertEqual(Booking.objects.get(date_from=date_from).status, Booking.BookingStatus.UNCONFIRMED)
+
+    def test_moving_booking_frees_previous_housing(self):
+        dates = self.days(0, 3)
+        booking = reserve(self.housing, self.guest, *dates, status=Booking.BookingStatus.CONFIRMED)
+        self.assertFalse(is_available(self.housing.pk, *dates))
+        update_booking(booking, housing=self.other_housing)
+        self.assertTrue(is_available(self.housing.pk, *dates))
+        self.assertFalse(is_available(self.other_housing.pk, *dates))
+
+        # Через API объект бронирования не меняется
+        self.client.force_login(self.guest)
+        response = self.client.patch(reverse('booking-detail', args=[booking.pk]), {'housing_id': self.housing.pk},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('housing_id', response.json())
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Курсорная пагинация API: обход вперед и назад без пропусков и повторов,
+    в том числе по полям со значениями NULL, и отказ на подделанный курсор
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@example.com', 'password')
+        streets = [None, 'Ленина', None, 'Арбат', 'Ленина', None]
+        cls.housings = [
+            Housing.objects.create(
+                name=f'Квартира {i}', country='Германия', post_code='10115', city='Берлин', street=street,
+                rooms=2, description='Описание', price=100 + i, owner=cls.user
+            )
+            for i, street in enumerate(streets)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def walk(self, url):
+        """
+        Проходит все страницы по ссылкам next, затем обратно по previous
+        """
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.json()['results']])
+            url = response.json()['next']
+        backward = []
+        url = response.json()['previous']
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            backward.append([item['id'] for item in response.json()['results']])
+            url = response.json()['previous']
+        self.assertEqual(backward, pages[-2::-1])
+        return [pk for page in pages for pk in page]
+
+    def test_forward_and_back(self):
+        expected = [h.pk for h in sorted(self.housings, key=lambda h: h.created_at, reverse=True)]
+        self.assertEqual(self.walk(reverse('housings-list') + '?page_size=2'), expected)
+
+    def test_nullable_ordering(self):
+        # NULL - меньше любого значения: в начале по возрастанию и в конце по убыванию
+        ascending = [h.pk for h in sorted(self.housings, key=lambda h: (h.street is not None, h.street or '', h.pk))]
+        url = reverse('housings-list') + '?ordering=street&page_size=1'
+        self.assertEqual(self.walk(url), ascending)
+
+        descending = [h.pk for h in sorted(self.housings, key=lambda h: (h.street is not None, h.street or '', h.pk),
+                                           reverse=True)]
+        url = reverse('housings-list') + '?ordering=-street&page_size=2'
+        self.assertEqual(self.walk(url), descending)
+
+    def test_tampered_cursor(self):
+        response = self.client.get(reverse('housings-list') + '?page_size=2')
+        cursor = QueryDict(response.json()['next'].split('?', 1)[1])['cursor']
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        self.assertEqual(self.client.get(reverse('housings-list'), {'cursor': tampered}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('housings-list') + '?cursor=garbage').status_code, 404)
+
+
+class ViewBufferTests(TestCase):
+    """
+    Буфер просмотров: пачка записывается целиком, просмотры удаленных
+    объектов отбрасываются, а неудачная пачка возвращается в буфер
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@example.com', 'password')
+        cls.housings = [
+            Housing.objects.create(
+                name=f'Квартира {i}', country='Германия', post_code='10115', city='Берлин',
+                rooms=2, description='Описание', price=100, owner=cls.user
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.buffer = view_buffer.ViewBuffer(max_events=100, flush_interval=3600, background=False)
+
+    def views(self, housing):
+        housing.refresh_from_db(fields=['views'])
+        return housing.views
+
+    def test_flush(self):
+        first, second, _ = self.housings
+        for _ in range(3):
+            self.buffer.add(first.pk, self.user.pk)
+        self.buffer.add(second.pk)
+        self.assertEqual(self.views(first), 0)
+
+        self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual(self.views(first), 3)
+        self.assertEqual(self.views(second), 1)
+        self.assertEqual(ViewHistory.objects.get(user=self.user, housing=first).view_count, 3)
+        self.assertEqual(self.buffer.flush(), 0)
+
+        # Пачка сбрасывается сама, когда набирается max_events событий
+        self.buffer.max_events = 2
+        self.buffer.add(first.pk, self.user.pk)
+        self.buffer.add(first.pk, self.user.pk)
+        self.assertEqual(self.views(first), 5)
+        self.assertEqual(ViewHistory.objects.get(user=self.user, housing=first).view_count, 5)
+
+    def test_deleted_housing_does_not_block_batch(self):
+        first, second, deleted = self.housings
+        self.buffer.add(first.pk, self.user.pk)
+        self.buffer.add(second.pk)
+        self.buffer.add(deleted.pk, self.user.pk)
+        deleted.delete()
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.views(first), 1)
+        self.assertEqual(self.views(second), 1)
+        self.assertFalse(ViewHistory.objects.filter(housing_id=deleted.pk).exists())
+
+    def test_failed_flush_keeps_views(self):
+        first = self.housings[0]
+        self.buffer.add(first.pk, self.user.pk)
+        self.buffer.add(first.pk, self.user.pk)
+        with mock.patch.object(view_buffer, 'record_views_bulk', side_effect=RuntimeError), \
+                self.assertLogs('booking.view_buffer', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.views(first), 0)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.views(first), 2)
+        self.assertEqual(ViewHistory.objects.get(user=self.user, housing=first).view_count, 2)
+
+
+class SearchTests(TestCase):
+    """
+    Полнотекстовый поиск: совпадение проверяется вместе с остальными
+    фильтрами, результаты идут по релевантности, индекс перестраивается
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@example.com', 'password')
+
+        def create(name, description, rooms=2):
+            return Housing.objects.create(
+                name=name, country='Германия', post_code='10115', city='Гамбург', rooms=rooms,
+                description=description, price=100, owner=cls.user
+            )
+
+        # Более старый объект релевантнее: слово запроса встречается чаще
+        cls.relevant = create('Берлин Берлин', 'Берлин, центр')
+        cls.other = create('Квартира', 'Тихий район недалеко от Берлина, рядом парк и озеро, есть балкон')
+        cls.large = create('Дом', 'Берлинская улица', rooms=5)
+        cls.unrelated = create('Дача', 'Лес и озеро')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def api(self, **params):
+        response = self.client.get(reverse('housings-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_backend(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+        found = get_search_backend().filter(Housing.objects.all(), 'берл')
+        self.assertEqual(list(found.values_list('pk', flat=True))[0], self.relevant.pk)
+        self.assertEqual(set(found.values_list('pk', flat=True)), {self.relevant.pk, self.other.pk, self.large.pk})
+        self.assertFalse(get_search_backend().filter(Housing.objects.all(), '!!!').exists())
+
+    def test_relevance_order_and_filters(self):
+        found = self.api(keyword='берлин')
+        self.assertEqual(found[0], self.relevant.pk)
+        self.assertEqual(set(found), {self.relevant.pk, self.other.pk, self.large.pk})
+        # Явная сортировка заменяет порядок релевантности
+        self.assertEqual(self.api(keyword='берлин', ordering='-created_at'),
+                         [self.large.pk, self.other.pk, self.relevant.pk])
+        # Совпадение и фильтры применяются вместе
+        self.assertEqual(self.api(keyword='берл', rooms=5), [self.large.pk])
+        # Курсоры по релевантности
+        response = self.client.get(reverse('housings-list'), {'keyword': 'берлин', 'page_size': 2})
+        first = [item['id'] for item in response.json()['results']]
+        second = [item['id'] for item in self.client.get(response.json()['next']).json()['results']]
+        self.assertEqual(first + second, found)
+
+    def test_base_backend(self):
+        with mock.patch.object(search, '_backend', SearchBackend()):
+            found = search.get_search_backend().filter(Housing.objects.all(), 'берлин')
+            self.assertEqual(list(found.values_list('pk', flat=True)), [self.large.pk, self.other.pk, self.relevant.pk])
+
+    def test_index_follows_changes_and_rebuild(self):
+        self.unrelated.name = 'Берлин'
+        self.unrelated.save()
+        self.assertIn(self.unrelated.pk, self.api(keyword='берлин'))
+        self.unrelated.delete()
+        self.assertNotIn(self.unrelated.pk, self.api(keyword='берлин'))
+
+        # Индекс, потерянный или устаревший, восстанавливается командой
+        HousingSearchDocument.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(self.api(keyword='берлин'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(set(self.api(keyword='берлин')), {self.relevant.pk, self.other.pk, self.large.pk})
+
+
+class AvailabilityCalendarTests(TestCase):
+    """
+    Календарь занятости: хранит только активные будущие бронирования,
+    следит за изменениями бронирований и объединяет занятые периоды
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guest = User.objects.create_user('guest', 'guest@example.com', 'password')
+        cls.housing = Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=cls.host
+        )
+        cls.today = now().date()
+
+    def book(self, start, nights, status=Booking.BookingStatus.CONFIRMED):
+        date_from = self.today + timedelta(days=start)
+        return Booking.objects.create(owner=self.guest, housing=self.housing, status=status,
+                                      date_from=date_from, date_to=date_from + timedelta(days=nights - 1))
+
+    def day(self, offset):
+        return self.today + timedelta(days=offset)
+
+    def ranges(self):
+        return HousingCalendar.objects.get(housing=self.housing).ranges
+
+    def test_calendar_follows_bookings(self):
+        first = self.book(10, 3)
+        second = self.book(20, 2, status=Booking.BookingStatus.PENDING)
+        self.book(30, 2, status=Booking.BookingStatus.UNCONFIRMED)
+        self.book(-10, 2)
+        self.assertEqual([booking_id for _, _, booking_id in self.ranges()], [first.pk, second.pk])
+
+        first.status = Booking.BookingStatus.CANCELED
+        first.save()
+        self.assertEqual([booking_id for _, _, booking_id in self.ranges()], [second.pk])
+
+        second.date_from += timedelta(days=5)
+        second.date_to += timedelta(days=5)
+        second.save()
+        self.assertEqual(self.ranges(), [[second.date_from.isoformat(), second.date_to.isoformat(), second.pk]])
+
+        second.delete()
+        self.assertEqual(self.ranges(), [])
+
+    def test_busy_ranges(self):
+        first = self.book(10, 3)  # 10-12
+        self.book(13, 2)  # 13-14: соседний, объединяется
+        self.book(14, 3, status=Booking.BookingStatus.PENDING)  # 14-16: пересекается
+        self.book(20, 1)
+
+        self.assertEqual(busy_ranges(self.housing.pk), [(self.day(10), self.day(16)), (self.day(20), self.day(20))])
+        # Периоды обрезаются границами запроса
+        self.assertEqual(busy_ranges(self.housing.pk, self.day(12), self.day(18)), [(self.day(12), self.day(16))])
+        self.assertEqual(busy_ranges(self.housing.pk, self.day(12), self.day(18), exclude=first),
+                         [(self.day(13), self.day(16))])
+
+        self.assertTrue(is_available(self.housing.pk, self.day(17), self.day(19)))
+        self.assertFalse(is_available(self.housing.pk, self.day(16), self.day(17)))
+        # Границы включительно: заезд в последний день брони - пересечение
+        self.assertFalse(is_available(self.housing.pk, self.day(20), self.day(22)))
+        self.assertTrue(is_available(self.housing.pk, self.day(10), self.day(12), exclude=first))
+        self.assertTrue(is_available(self.housing.pk, self.day(21), self.day(22)))
+
+    def test_rebuild_command(self):
+        booking = self.book(10, 3)
+        HousingCalendar.objects.filter(housing=self.housing).update(ranges=[])
+        self.assertTrue(is_available(self.housing.pk, booking.date_from, booking.date_to))
+
+        call_command('rebuild_availability', self.housing.pk, stdout=StringIO())
+        self.assertFalse(is_available(self.housing.pk, booking.date_from, booking.date_to))
+
+        # Календарь создается при первом обращении
+        HousingCalendar.objects.all().delete()
+        self.assertFalse(is_available(self.housing.pk, booking.date_from, booking.date_to))
+
+    def test_fixture_loading_skips_calendar(self):
+        fixture = serialize('json', [self.book(10, 3)])
+        Booking.objects.all().delete()
+        HousingCalendar.objects.all().delete()
+        for item in deserialize('json', fixture):
+            item.save()
+        self.assertFalse(HousingCalendar.objects.exists())
+
+    def test_booking_form_shows_busy_ranges(self):
+        self.book(10, 3)
+        self.book(13, 2)
+        self.client.force_login(self.guest)
+        response = self.client.get(reverse('create_booking', args=[self.housing.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['occupied_ranges'],
+                         [(self.day(10), self.day(14))])
+
+
+class RatingAggregateTests(TestCase):
+    """
+    Агрегаты отзывов объекта (количество, сумма, среднее, гистограмма)
+    поддерживаются инкрементально и совпадают с пересчетом с нуля
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.guests = [User.objects.create_user(f'guest{i}', f'guest{i}@example.com', 'password') for i in range(3)]
+        cls.housing, cls.other = [
+            Housing.objects.create(
+                name=f'Квартира {i}', country='Германия', post_code='10115', city='Берлин',
+                rooms=2, description='Описание', price=100, owner=cls.host
+            )
+            for i in range(2)
+        ]
+
+    def aggregates(self, housing):
+        housing.refresh_from_db()
+        return (housing.review_count, housing.rating_sum, round(housing.rating_avg, 6),
+                [getattr(housing, f'rating_{stars}_count') for stars in range(1, 6)])
+
+    def review(self, guest, rating, housing=None):
+        return Review.objects.create(rating=rating, text='Отзыв', owner=guest, housing=housing or self.housing)
+
+    def test_incremental_updates(self):
+        first = self.review(self.guests[0], 5)
+        self.review(self.guests[1], 3)
+        self.assertEqual(self.aggregates(self.housing), (2, 8, 4.0, [0, 0, 1, 0, 1]))
+
+        first.rating = 1
+        first.save()
+        self.assertEqual(self.aggregates(self.housing), (2, 4, 2.0, [1, 0, 1, 0, 0]))
+
+        # Перенос отзыва на другой объект меняет агрегаты обоих
+        first.housing = self.other
+        first.save()
+        self.assertEqual(self.aggregates(self.housing), (1, 3, 3.0, [0, 0, 1, 0, 0]))
+        self.assertEqual(self.aggregates(self.other), (1, 1, 1.0, [1, 0, 0, 0, 0]))
+
+        first.delete()
+        self.assertEqual(self.aggregates(self.other), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_deferred_rating_rebuilds(self):
+        self.review(self.guests[0], 4)
+        review = Review.objects.only('id', 'housing_id').get()
+        review.rating = 2
+        review.save()
+        self.assertEqual(self.aggregates(self.housing), (1, 2, 2.0, [0, 1, 0, 0, 0]))
+
+        Review.objects.only('id', 'housing_id').get().delete()
+        self.assertEqual(self.aggregates(self.housing), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_rebuild_matches_incremental(self):
+        for guest, rating in zip(self.guests, [5, 4, 4]):
+            self.review(guest, rating)
+        self.review(self.guests[0], 2, housing=self.other)
+        expected = [self.aggregates(self.housing), self.aggregates(self.other)]
+
+        # update() обходит сигналы: агрегаты расходятся до пересчета
+        Review.objects.filter(housing=self.housing).update(rating=1)
+        Housing.objects.update(review_count=0, rating_sum=0, rating_avg=0)
+        call_command('rebuild_ratings', self.other.pk, stdout=StringIO())
+        self.assertEqual(self.aggregates(self.other), expected[1])
+        self.assertEqual(self.aggregates(self.housing)[0], 0)
+
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertEqual(self.aggregates(self.housing), (3, 3, 1.0, [3, 0, 0, 0, 0]))
+        self.assertEqual(self.aggregates(self.other), expected[1])
+
+
+@override_settings(POPULAR_HOUSING_LIMIT=2)
+class LeaderboardTests(TestCase):
+    """
+    Рейтинг популярных объектов: окна по почасовым счетчикам, только
+    видимые объекты, материализованная таблица и кэш
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password')
+        cls.housings = [
+            Housing.objects.create(
+                name=f'Квартира {i}', country='Германия', post_code='10115', city='Берлин',
+                rooms=2, description='Описание', price=100, owner=cls.host
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, leaderboard):
+        return [(housing.pk, views) for housing, views in leaderboard]
+
+    def test_windows(self):
+        first, second, third = self.housings
+        moment = now()
+        record_views(first.pk, 3, at=moment - timedelta(days=3))
+        record_views(second.pk, 2, at=moment)
+        record_views(third.pk, 1, at=moment - timedelta(hours=2))
+
+        self.assertEqual(self.ids(get_leaderboard(PopularHousing.Window.DAY)), [(second.pk, 2), (third.pk, 1)])
+        self.assertEqual(self.ids(get_leaderboard(PopularHousing.Window.WEEK)), [(first.pk, 3), (second.pk, 2)])
+        self.assertEqual(self.ids(get_leaderboard(PopularHousing.Window.ALL)), [(first.pk, 3), (second.pk, 2)])
+        self.assertEqual(PopularHousing.objects.filter(window=PopularHousing.Window.WEEK).count(), 2)
+
+    def test_cache_and_materialized_table(self):
+        first, second, third = self.housings
+        record_views(first.pk, 1)
+        self.assertEqual(self.ids(get_leaderboard()), [(first.pk, 1)])
+        record_views(second.pk, 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ids(get_leaderboard()), [(first.pk, 1)])
+
+        # После сброса кэша свежая таблица читается одним запросом
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.ids(get_leaderboard()), [(first.pk, 1)])
+
+        # Команда пересчитывает все окна и удаляет старые счетчики
+        record_views(third.pk, 2, at=now() - timedelta(days=30))
+        call_command('refresh_popular_housing', stdout=StringIO())
+        self.assertEqual(self.ids(get_leaderboard()), [(second.pk, 5), (third.pk, 2)])
+        self.assertFalse(HousingViewCount.objects.filter(housing=third).exists())
+
+    def test_hidden_housing_excluded(self):
+        first, second, _ = self.housings
+        record_views(first.pk, 3)
+        record_views(second.pk, 1)
+        Housing.objects.filter(pk=first.pk).update(is_visible=False)
+        for window in PopularHousing.Window.values:
+            self.assertEqual(self.ids(refresh_leaderboard(window)), [(second.pk, 1)])
+
+    def test_stale_table_served_while_refresh_locked_or_failed(self):
+        first, second, _ = self.housings
+        record_views(first.pk, 1)
+        refresh_leaderboard(PopularHousing.Window.ALL)
+        record_views(second.pk, 5)
+        PopularHousing.objects.update(refreshed_at=now() - timedelta(days=1))
+        cache.clear()
+
+        # Таблицу пересчитывает другой процесс: отдаются прежние строки
+        cache.add('popular_housing:all:refresh', 1)
+        self.assertEqual(self.ids(get_leaderboard()), [(first.pk, 1)])
+        cache.delete('popular_housing:all:refresh')
+
+        with mock.patch('booking.popularity.refresh_leaderboard', side_effect=IntegrityError):
+            self.assertEqual(self.ids(get_leaderboard()), [(first.pk, 1)])
+        self.assertEqual(self.ids(get_leaderboard()), [(second.pk, 5), (first.pk, 1)])
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """
+    Параллельные заявки на пересекающиеся даты: проверка и сохранение
+    под блокировкой календаря не допускают двойных бронирований
+    """
+
+    def setUp(self):
+        cache.clear()
+        host = User.objects.create_user('host', 'host@example.com', 'password')
+        self.guests = [User.objects.create_user(f'guest{i}', f'guest{i}@example.com', 'password') for i in range(6)]
+        self.housing = Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=host
+        )
+
+    def reserve_concurrently(self, periods):
+        """
+        Каждый гость в своем потоке одновременно резервирует свой период
+        (в статусе ожидания подтверждения - он занимает даты).
+        Тестовая база SQLite в памяти сразу отвечает "table is locked"
+        вместо ожидания блокировки: такие попытки повторяются.
+        """
+        barrier = threading.Barrier(len(periods))
+        results = []
+
+        def worker(guest, date_from, date_to):
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        reserve(self.housing, guest, date_from, date_to, status=Booking.BookingStatus.PENDING)
+                        results.append('ok')
+                        return
+                    except DatesUnavailable:
+                        results.append('busy')
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(guest, *period)) for guest, period in zip(self.guests, periods)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_no_double_booking(self):
+        start = now().date() + timedelta(days=10)
+        # Все периоды попарно пересекаются: пройти должен ровно один
+        periods = [(start + timedelta(days=i % 3), start + timedelta(days=4)) for i in range(len(self.guests))]
+        results = self.reserve_concurrently(periods)
+        self.assertEqual(sorted(results), ['busy'] * (len(periods) - 1) + ['ok'])
+
+        booking = Booking.objects.get(housing=self.housing)
+        self.assertEqual(HousingCalendar.objects.get(housing=self.housing).ranges,
+                         [[booking.date_from.isoformat(), booking.date_to.isoformat(), booking.pk]])
+
+    def test_disjoint_periods_all_succeed(self):
+        start = now().date() + timedelta(days=10)
+        periods = [(start + timedelta(days=3 * i), start + timedelta(days=3 * i + 1)) for i in range(len(self.guests))]
+        self.assertEqual(self.reserve_concurrently(periods), ['ok'] * len(periods))
+        self.assertEqual(len(HousingCalendar.objects.get(housing=self.housing).ranges), len(periods))
+
+
+class SparseFieldsetTests(TestCase):
+    """
+    Компактные ответы API: ?fields= оставляет перечисленные поля, ?expand=
+    вкладывает связанные объекты за постоянное число запросов
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user('host', 'host@example.com', 'password', first_name='Анна')
+        cls.guests = [User.objects.create_user(f'guest{i}', f'guest{i}@example.com', 'password') for i in range(4)]
+        cls.housings = [
+            Housing.objects.create(
+                name=f'Квартира {i}', country='Германия', post_code='10115', city='Берлин',
+                rooms=2, description='Описание', price=100, owner=cls.host
+            )
+            for i in range(4)
+        ]
+        start = now().date() + timedelta(days=10)
+        for i, (guest, housing) in enumerate(zip(cls.guests, cls.housings)):
+            Review.objects.create(rating=4, text='Отзыв', owner=guest, housing=housing)
+            Booking.objects.create(owner=guest, housing=housing, date_from=start + timedelta(days=i),
+                                   date_to=start + timedelta(days=i + 1))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.host)
+
+    def results(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def count_queries(self, name, **params):
+        # Первый запрос прогревает кэши пользователя и сессии
+        self.client.get(reverse(name), params)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse(name), params).status_code, 200)
+        return len(queries)
+
+    def test_fields_and_default_ids(self):
+        housing = self.results('housings-list')[0]
+        self.assertEqual(housing['owner'], self.host.pk)
+        self.assertNotIn('rating_sum', housing)
+
+        housing = self.results('housings-list', fields='id,name,nonexistent')[0]
+        self.assertEqual(set(housing), {'id', 'name'})
+
+    def test_expand(self):
+        housing = self.results('housings-list', expand='owner,reviews')[0]
+        self.assertEqual(housing['owner'], {'id': self.host.pk, 'username': 'host', 'first_name': 'Анна',
+                                            'last_name': ''})
+        self.assertEqual(len(housing['reviews']), 1)
+        self.assertIsInstance(housing['reviews'][0]['owner'], int)
+
+        booking = self.results('booking-list', expand='housing.owner')[0]
+        self.assertEqual(booking['housing']['owner']['username'], 'host')
+        self.assertIsInstance(booking['owner'], int)
+        # Неизвестные связи игнорируются
+        self.assertIsInstance(self.results('booking-list', expand='password')[0]['owner'], int)
+
+        # Подробный список вкладывает объект и гостя по умолчанию
+        booking = self.results('booking-details-list')[0]
+        self.assertEqual(set(booking['owner']), {'id', 'username', 'first_name', 'last_name'})
+        self.assertIsInstance(booking['housing'], dict)
+
+    def test_expand_query_count_does_not_grow(self):
+        cases = [
+            ('housings-list', {'expand': 'owner,reviews.owner'}),
+            ('booking-list', {'expand': 'housing.owner,owner'}),
+            ('booking-details-list', {}),
+        ]
+        for name, params in cases:
+            with self.subTest(name=name):
+                many = self.count_queries(name, **params)
+                few = self.count_queries(name, page_size=1, **params)
+                self.assertEqual(many, few)
+
+    def test_write_responses_hide_private_user_fields(self):
+        private = {'password', 'email', 'is_staff', 'is_superuser', 'last_login', 'groups', 'user_permissions'}
+        response = self.client.post(reverse('housings-list'), {
+            'name': 'Дом', 'country': 'Германия', 'post_code': '20095', 'city': 'Гамбург',
+            'rooms': 3, 'description': 'Описание', 'price': 150,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(private & set(response.json()['owner']))
+
+        start = now().date() + timedelta(days=30)
+        response = self.client.post(reverse('booking-list'), {
+            'housing_id': self.housings[0].pk, 'date_from': str(start), 'date_to': str(start + timedelta(days=2)),
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertNotIn('user', response.json())
+        self.assertFalse(private & set(response.json()['housing']['owner']))
+
+
+class SeedDataTests(TestCase):
+    """
+    Генератор синтетических данных: непересекающиеся бронирования
+    и согласованные производные таблицы
+    """
+
+    def seed(self, *args):
+        call_command('seed_data', '--users=8', '--housings=12', '--bookings=4', '--views=300', '--searches=40',
+                     '--seed=1', *args, stdout=StringIO())
+
+    def snapshot(self, housing):
+        return (housing.review_count, housing.rating_sum, [getattr(housing, f'rating_{s}_count') for s in range(1, 6)])
+
+    def test_seed(self):
+        self.seed()
+        self.assertEqual(User.objects.filter(username__startswith='seed_user_').count(), 8)
+        housings = list(Housing.objects.order_by('id'))
+        self.assertEqual(len(housings), 12)
+        self.assertTrue(Booking.objects.exists())
+        self.assertTrue(Review.objects.exists())
+
+        # Активные бронирования одного объекта не пересекаются
+        for housing in housings:
+            spans = list(Booking.objects.filter(housing=housing, status__in=ACTIVE_STATUSES)
+                         .order_by('date_from').values_list('date_from', 'date_to'))
+            for (_, previous_to), (date_from, _) in zip(spans, spans[1:]):
+                self.assertLess(previous_to, date_from)
+
+        # Производные данные совпадают с пересчетом с нуля
+        calendars = dict(HousingCalendar.objects.values_list('housing_id', 'ranges'))
+        ratings = [self.snapshot(housing) for housing in housings]
+        views = [housing.views for housing in housings]
+        call_command('rebuild_availability', stdout=StringIO())
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertEqual(dict(HousingCalendar.objects.values_list('housing_id', 'ranges')), calendars)
+        self.assertEqual([self.snapshot(housing) for housing in Housing.objects.order_by('id')], ratings)
+        self.assertEqual(sum(views), 300)
+        self.assertEqual(HousingSearchDocument.objects.count(), 12)
+        self.assertTrue(PopularHousing.objects.filter(window=PopularHousing.Window.ALL).exists())
+        self.assertTrue(TrendingSearch.objects.exists())
+
+    def test_flush(self):
+        self.seed()
+        self.seed('--flush')
+        self.assertEqual(User.objects.filter(username__startswith='seed_user_').count(), 8)
+        self.assertEqual(Housing.objects.count(), 12)
+
+
+class LoadTestHarnessTests(TestCase):
+    """
+    Нагрузочный тест: сценарии ведут на рабочие страницы,
+    отчет считает перцентили и ошибки
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seed_user_0', 'seed_user_0@example.com', 'password')
+        cls.housing = Housing.objects.create(
+            name='Квартира', country='Германия', post_code='10115', city='Берлин',
+            rooms=2, description='Описание', price=100, owner=cls.user
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Просмотры страниц объекта пишутся в отдельный буфер без фонового потока
+        buffer = view_buffer.ViewBuffer(flush_interval=3600, background=False)
+        patcher = mock.patch.object(view_buffer, 'view_buffer', buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.command = load_test.Command()
+        self.command.housing_ids = [self.housing.pk]
+        self.command.keywords = ['берлин']
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(load_test.percentile(values, 50), 50)
+        self.assertEqual(load_test.percentile(values, 99), 99)
+        self.assertEqual(load_test.percentile([7], 95), 7)
+        self.assertEqual(load_test.percentile([], 95), 0.0)
+
+    def test_mix_and_report(self):
+        self.assertEqual(self.command.parse_mix('housing_list=3,api_housings'), {'housing_list': 3, 'api_housings': 1})
+        with self.assertRaises(CommandError):
+            self.command.parse_mix('unknown=1')
+
+        report = self.command.build_report({
+            'housing_list': [(0.010, 200, 5), (0.030, 200, 7)],
+            'housing_detail': [(0.020, 500, None), (1.0, None, None)],
+        }, elapsed=2)
+        self.assertEqual(report['housing_list']['errors'], 0)
+        self.assertEqual(report['housing_list']['avg_queries'], 6)
+        self.assertEqual(report['housing_detail']['errors'], 2)
+        self.assertIsNone(report['housing_detail']['avg_queries'])
+        self.assertEqual(report['total']['requests'], 4)
+        self.assertEqual(report['total']['rps'], 2)
+        self.assertAlmostEqual(report['total']['max_ms'], 1000)
+
+    def test_scenario_paths(self):
+        self.client.force_login(self.user)
+        rng = random.Random(1)
+        for name in load_test.DEFAULT_MIX.split(','):
+            name = name.split('=')[0]
+            for _ in range(3):
+                path = getattr(self.command, f'path_{name}')(rng)
+                with self.subTest(path=path):
+                    self.assertIn(self.client.get(path).status_code, (200, 302))
+
+    def test_requires_data(self):
+        Housing.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('load_test', '--duration=0', stdout=StringIO())
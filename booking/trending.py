@@ -0,0 +1,166 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .db_router import untracked_writes
+from .models import SearchHistory, TrendingSearch
+from .search import normalize
+
+CACHE_KEY = 'trending_searches'
+EPOCH_CACHE_KEY = 'trending_searches:epoch'
+REBASE_LOCK_KEY = 'trending_searches:rebase'
+
+# Запросы с весом ниже порога удаляются из таблицы при пересчете
+MIN_SCORE = 0.01
+
+# Через сколько периодов полураспада поиск сам переносит точку отсчета:
+# веса растут не больше чем в 2 ** REBASE_HALF_LIVES раз
+REBASE_HALF_LIVES = 8
+
+
+def _half_life():
+    return timedelta(hours=settings.TRENDING_SEARCH_HALF_LIFE)
+
+
+def decay_factor(elapsed):
+    """
+    Коэффициент затухания веса за промежуток времени elapsed
+    """
+    return 0.5 ** (max(elapsed, timedelta(0)) / _half_life())
+
+
+def _increment(model, lookup, defaults, initial=None, **increments):
+    """
+    Увеличивает счетчики строки одним UPDATE. Если строки нет, вставляет
+    нулевую (INSERT без ошибки при конфликте - строку могли создать
+    параллельно) и повторяет UPDATE. Точек сохранения не требуется.
+    initial - значения полей только для новой строки.
+    """
+    updates = {field: F(field) + value for field, value in increments.items()}
+    queryset = model.objects.filter(**lookup)
+    if queryset.update(**updates, **defaults):
+        return
+    zeros = {field: 0 for field in increments}
+    model.objects.bulk_create([model(**lookup, **defaults, **(initial or {}), **zeros)], ignore_conflicts=True)
+    queryset.update(**updates, **defaults)
+
+
+def _epoch():
+    """
+    Момент, относительно которого считаются веса всех запросов (общий
+    decayed_at строк). Сдвигается только пересчетом refresh_trending.
+    """
+    epoch = cache.get(EPOCH_CACHE_KEY)
+    if epoch is None:
+        # Строка с наибольшим весом - по индексу, без чтения всей таблицы
+        epoch = TrendingSearch.objects.order_by('-score').values_list('decayed_at', flat=True).first() or now()
+        cache.set(EPOCH_CACHE_KEY, epoch, settings.TRENDING_SEARCH_TTL)
+    return epoch
+
+
+def _rebase(epoch):
+    """
+    Переносит точку отсчета, если она старше REBASE_HALF_LIVES периодов
+    полураспада. Пересчет выполняет один процесс (блокировка в кэше),
+    остальные продолжают со старой точкой отсчета.
+    """
+    if now() - epoch < _half_life() * REBASE_HALF_LIVES:
+        return epoch
+    if not cache.add(REBASE_LOCK_KEY, 1, settings.TRENDING_SEARCH_TTL):
+        return epoch
+    try:
+        refresh_trending()
+    finally:
+        cache.delete(REBASE_LOCK_KEY)
+    return _epoch()
+
+
+def record_search(keyword, user=None):
+    """
+    Учитывает поисковый запрос: личная история пользователя (если он
+    авторизован) и вес запроса в таблице популярных. Возвращает
+    нормализованный запрос или пустую строку, если учитывать нечего.
+
+    Веса не затухают при каждом чтении: поиск добавляет 1 / decay_factor
+    от общей точки отсчета, поэтому более поздние поиски весят больше,
+    и порядок по score совпадает с порядком по затухшему весу. Слишком
+    старая точка отсчета переносится здесь же (см. _rebase).
+    """
+    keyword = normalize(keyword)[:TrendingSearch._meta.get_field('keyword').max_length]
+    if not keyword:
+        return ''
+    with untracked_writes():
+        epoch = _rebase(_epoch())
+        weight = 1 / decay_factor(now() - epoch)
+        if user is not None and user.is_authenticated:
+            _increment(SearchHistory, {'user': user, 'keyword': keyword}, {'last_searched_at': now()}, search_count=1)
+        _increment(TrendingSearch, {'keyword': keyword}, {}, {'decayed_at': epoch}, score=weight, searches=1)
+    return keyword
+
+
+def refresh_trending(limit=None):
+    """
+    Переносит точку отсчета весов на текущий момент (UPDATE на каждое
+    значение decayed_at, обычно одно), удаляет угасшие запросы и кладет топ
+    в кэш. Запускается командой refresh_trending_searches, а в запросах -
+    только раз в REBASE_HALF_LIVES периодов полураспада: без пересчета
+    веса растут, но порядок остается верным. Возвращает список TrendingSearch.
+    """
+    limit = limit or settings.TRENDING_SEARCH_LIMIT
+    moment = now()
+    with transaction.atomic():
+        epochs = TrendingSearch.objects.order_by().values_list('decayed_at', flat=True).distinct()
+        for epoch in list(epochs):
+            # Выражение, а не значение: поиски, учтенные во время пересчета, не теряются
+            TrendingSearch.objects.filter(decayed_at=epoch).update(
+                score=F('score') * decay_factor(moment - epoch), decayed_at=moment
+            )
+        TrendingSearch.objects.filter(score__lt=MIN_SCORE).delete()
+    cache.set(EPOCH_CACHE_KEY, moment, settings.TRENDING_SEARCH_TTL)
+
+    top = list(TrendingSearch.objects.order_by('-score', 'keyword')[:limit])
+    cache.set(CACHE_KEY, top, settings.TRENDING_SEARCH_TTL)
+    return top
+
+
+def get_trending(limit=None):
+    """
+    Популярные запросы из кэша. При промахе читает верх таблицы одним
+    запросом по индексу; затухание здесь не пересчитывается.
+    """
+    top = cache.get(CACHE_KEY)
+    if top is not None:
+        return top[:limit] if limit else top
+
+    limit = limit or settings.TRENDING_SEARCH_LIMIT
+    top = list(TrendingSearch.objects.order_by('-score', 'keyword')[:limit])
+    cache.set(CACHE_KEY, top, settings.TRENDING_SEARCH_TTL)
+    return top
+
+
+def rebuild_trending():
+    """
+    Пересчитывает таблицу популярных запросов по истории поиска: вес каждой
+    записи истории затухает от момента последнего поиска
+    """
+    moment = now()
+    scores = {}
+    searches = {}
+    for keyword, search_count, last_searched_at in (
+        SearchHistory.objects.values_list('keyword', 'search_count', 'last_searched_at').iterator()
+    ):
+        scores[keyword] = scores.get(keyword, 0) + search_count * decay_factor(moment - last_searched_at)
+        searches[keyword] = searches.get(keyword, 0) + search_count
+
+    with transaction.atomic():
+        TrendingSearch.objects.all().delete()
+        TrendingSearch.objects.bulk_create([
+            TrendingSearch(keyword=keyword, score=score, searches=searches[keyword], decayed_at=moment)
+            for keyword, score in scores.items() if score >= MIN_SCORE
+        ], batch_size=500)
+    cache.delete_many([CACHE_KEY, EPOCH_CACHE_KEY])
+    return len(scores)
@@ -22,6 +22,7 @@ urlpatterns = [
     path('booking/create/<int:housing_id>/', create_booking, name='create_booking'),
     path('my_bookings/', my_bookings, name='my_bookings'),
     path('my_confirmation/', my_confirmation, name='my_confirmation'),
+    path('dashboard/', host_dashboard_page, name='host_dashboard'),
     path('cancel-booking/<int:booking_id>/', cancel_booking, name='cancel_booking'),
     path('booking/edit/<int:booking_id>/', edit_booking, name='edit_booking'),
     path('housing/<int:housing_id>/', housing_detail, name='housing_detail'),
@@ -53,5 +54,19 @@ urlpatterns = [
     # Страница успешного завершения сброса
     path('reset/done/', auth_views.PasswordResetCompleteView.as_view(), name='password_reset_complete'),
 
+    # JWT-токены для клиентов API
+    path('api/token/', TokenObtainView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/revoke/', TokenRevokeView.as_view(), name='token_revoke'),
+
+    # Потоковые выгрузки: bookings, housings, reviews в формате csv или ndjson
+    path('api/export/<str:kind>.<str:fmt>', ExportView.as_view(), name='export'),
+
+    # Сводка владельца по бронированиям его объектов
+    path('api/dashboard/', HostDashboardView.as_view(), name='host-dashboard'),
+
+    # Загрузка и выручка объектов по дневной статистике
+    path('api/analytics/occupancy/', OccupancyView.as_view(), name='analytics-occupancy'),
+
     path('api/', include(router.urls)),
 ]
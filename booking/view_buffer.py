@@ -0,0 +1,194 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .db_router import untracked_writes
+from .models import Housing, ViewHistory
+from .popularity import record_views_bulk
+
+logger = logging.getLogger(__name__)
+
+
+class ViewBuffer:
+    """
+    Буфер просмотров объектов с отложенной записью (write-behind).
+
+    Просмотры копятся в памяти процесса и записываются в базу пачкой,
+    когда набирается max_events событий или проходит flush_interval секунд.
+    Если пачку не удалось записать, она возвращается в буфер и пишется
+    при следующем сбросе; при остановке процесса буфер сбрасывается через
+    atexit. Просмотры удаленных объектов и пользователей отбрасываются.
+    """
+
+    def __init__(self, max_events=500, flush_interval=5.0, background=True):
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self.background = background
+        self._lock = threading.Lock()
+        self._user_views = Counter()  # (user_id, housing_id) -> количество просмотров
+        self._housing_views = Counter()  # housing_id -> количество просмотров
+        self._events = 0
+        self._last_flush = time.monotonic()
+        self._flusher = None
+        self._stopped = threading.Event()
+
+    def add(self, housing_id, user_id=None):
+        """
+        Добавляет просмотр объекта в буфер
+        """
+        with self._lock:
+            self._housing_views[housing_id] += 1
+            if user_id is not None:
+                self._user_views[user_id, housing_id] += 1
+            self._events += 1
+            should_flush = (
+                self._events >= self.max_events
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if self.background:
+            self._start_flusher()
+        if should_flush:
+            # Сброс чужих просмотров не должен закреплять пользователя
+            # за основной базой
+            with untracked_writes():
+                self.flush()
+
+    def _drain(self):
+        with self._lock:
+            user_views, housing_views = self._user_views, self._housing_views
+            self._user_views, self._housing_views = Counter(), Counter()
+            self._events = 0
+            self._last_flush = time.monotonic()
+        return user_views, housing_views
+
+    def _restore(self, user_views, housing_views):
+        # Счетчик событий не увеличиваем: повтор будет по flush_interval,
+        # а не на каждом следующем просмотре
+        with self._lock:
+            self._user_views.update(user_views)
+            self._housing_views.update(housing_views)
+
+    def flush(self):
+        """
+        Записывает накопленные просмотры в базу. Возвращает число
+        записанных просмотров.
+        """
+        user_views, housing_views = self._drain()
+        if not housing_views:
+            return 0
+
+        try:
+            with transaction.atomic():
+                user_views, housing_views = _existing(user_views, housing_views)
+                _upsert_view_history(user_views)
+                record_views_bulk(housing_views)
+        except Exception:
+            logger.exception('Не удалось записать %s просмотров, они возвращены в буфер',
+                             sum(housing_views.values()))
+            self._restore(user_views, housing_views)
+            return 0
+        return sum(housing_views.values())
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name='view-buffer-flusher', daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        # Периодически сбрасываем буфер, даже если новых просмотров нет
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            finally:
+                connections.close_all()
+
+    def stop(self):
+        """
+        Останавливает фоновый поток и сбрасывает остаток буфера
+        """
+        self._stopped.set()
+        self.flush()
+
+
+def _existing(user_views, housing_views):
+    """
+    Отбрасывает просмотры объектов и пользователей, удаленных после
+    просмотра: иначе внешний ключ одной записи не даст записать всю пачку
+    """
+    housing_ids = set(Housing.objects.filter(pk__in=list(housing_views)).values_list('pk', flat=True))
+    user_ids = {user_id for user_id, _ in user_views}
+    if user_ids:
+        user_ids = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    housing_views = Counter({pk: count for pk, count in housing_views.items() if pk in housing_ids})
+    user_views = Counter({key: count for key, count in user_views.items()
+                          if key[0] in user_ids and key[1] in housing_ids})
+    return user_views, housing_views
+
+
+def _upsert_view_history(user_views):
+    """
+    Пачкой увеличивает счетчики ViewHistory. Недостающие записи вставляются
+    с нулевым счетчиком без ошибки при конфликте (их могли создать
+    параллельно), затем все счетчики увеличиваются одним bulk_update.
+    """
+    if not user_views:
+        return
+    user_ids = {user_id for user_id, _ in user_views}
+    housing_ids = {housing_id for _, housing_id in user_views}
+
+    def load():
+        entries = ViewHistory.objects.filter(user_id__in=user_ids, housing_id__in=housing_ids)
+        return {(entry.user_id, entry.housing_id): entry for entry in entries.only('id', 'user_id', 'housing_id')}
+
+    entries = load()
+    missing = [key for key in user_views if key not in entries]
+    if missing:
+        ViewHistory.objects.bulk_create([
+            ViewHistory(user_id=user_id, housing_id=housing_id, view_count=0)
+            for user_id, housing_id in missing
+        ], ignore_conflicts=True)
+        entries = load()
+
+    viewed_at = now()
+    to_update = []
+    for key, count in user_views.items():
+        entry = entries.get(key)
+        if entry is not None:
+            entry.view_count = F('view_count') + count
+            entry.last_viewed_at = viewed_at
+            to_update.append(entry)
+    ViewHistory.objects.bulk_update(to_update, ['view_count', 'last_viewed_at'])
+
+
+view_buffer = ViewBuffer(
+    max_events=settings.VIEW_BUFFER_MAX_EVENTS,
+    flush_interval=settings.VIEW_BUFFER_FLUSH_INTERVAL,
+)
+atexit.register(view_buffer.stop)
+
+
+def record_housing_view(housing_id, user=None):
+    """
+    Учитывает просмотр объекта: через буфер или сразу в базе,
+    в зависимости от настройки VIEW_BUFFER_ENABLED
+    """
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    if settings.VIEW_BUFFER_ENABLED:
+        view_buffer.add(housing_id, user_id)
+        return
+
+    with untracked_writes(), transaction.atomic():
+        if user_id is not None:
+            _upsert_view_history(Counter({(user_id, housing_id): 1}))
+        record_views_bulk({housing_id: 1})
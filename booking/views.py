@@ -1,13 +1,22 @@
+import asyncio
 import logging
 from datetime import datetime, timedelta
-from django.http import HttpResponseForbidden
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import HttpResponseForbidden, StreamingHttpResponse
 from django.utils.timezone import now
 from django.views.generic import DetailView
 from django_filters.views import FilterView
-from rest_framework import viewsets
+from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.views import APIView
+from rest_framework.response import Response
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateAPIView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenViewBase
 from booking.serializers import *
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
 from .filters import *
@@ -16,7 +25,20 @@ from django.shortcuts import redirect
 from django.contrib.auth import logout
 from django.contrib import messages
 from .permissions import *
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from .availability import busy_ranges, get_calendar
+from .reservations import DatesUnavailable, bulk_update_bookings, change_status, reschedule, reserve, update_booking
+from .pagination import paginate_html
+from .conditional import ConditionalGetMixin
+from .dashboard import PENDING_STATUSES, host_bookings, host_dashboard
+from .exports import EXPORTS, FORMATS, export_queryset, export_stream
+from .facets import get_facets
+from .imports import FORMATS as IMPORT_FORMATS, detect_format, import_housings, read_rows
+from .listing_cache import PUBLIC, STAFF, cached_page, cards_page, normalize_params, owner_group, visibility_scope
+from .popularity import get_leaderboard
+from .rollups import occupancy_report
+from .trending import get_trending, record_search
+from .view_buffer import record_housing_view
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, SAFE_METHODS
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, F, Count, Sum
 from rest_framework.filters import SearchFilter, OrderingFilter
@@ -49,11 +71,82 @@ def user_filter(request):
         return housing | Housing.objects.filter(owner=user)
 
 
+# Варианты сортировки списка объектов: значение sort_by -> поля сортировки
+SORT_ORDERINGS = {
+    'price_asc': ['price'],
+    'price_desc': ['-price'],
+    'rating_asc': ['rating_avg'],  # Сортировка по возрастанию рейтинга
+    'rating_desc': ['-rating_avg'],  # Сортировка по убыванию рейтинга
+    'date_newest': ['-created_at'],
+    'date_oldest': ['created_at'],
+    'rooms_asc': ['rooms'],
+    'rooms_desc': ['-rooms'],
+    'country_asc': ['country'],
+    'country_desc': ['-country'],
+    'city_asc': ['city'],
+    'city_desc': ['-city'],
+    'post_code_asc': ['post_code'],
+    'post_code_desc': ['-post_code'],
+    'views_desc': ['-views'],  # Сортировка по просмотрам
+    'review_count_desc': ['-review_count'],  # Сортировка по количеству отзывов
+}
+
+
+async def arequest_user(request):
+    """
+    Пользователь запроса для асинхронных представлений. Загружается
+    асинхронно и подставляется в request.user, чтобы шаблоны и синхронный
+    код не выполняли тот же запрос к базе повторно
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+async def arender(request, template_name, context=None):
+    """
+    render для асинхронных представлений: шаблон отрисовывается в потоке
+    запроса, где разрешены ленивые обращения к базе (контекст-процессоры, сессия)
+    """
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def alist(queryset):
+    """
+    Объекты queryset списком через асинхронный ORM
+    """
+    return [obj async for obj in queryset]
+
+
+def housing_list_page(request, filter, sort_by):
+    """
+    Страница списка объектов (карточки и курсоры навигации)
+    """
+    def compute_page():
+        filtered_housing = filter.qs
+        if sort_by:
+            ordering = SORT_ORDERINGS[sort_by]
+        else:
+            # Без явной сортировки сохраняем порядок queryset (например, по релевантности поиска)
+            ordering = [field for field in filtered_housing.query.order_by if isinstance(field, str)] or ['-created_at']
+        # Курсорная пагинация: дальние страницы стоят столько же, сколько первая
+        return paginate_html(request, filtered_housing, ordering)
+
+    # Список одинаков для всех пользователей (только видимые объекты): страница
+    # кэшируется по нормализованным фильтрам, сортировке и курсору,
+    # карточки объектов - отдельно
+    params = normalize_params(filter, sort_by, request.GET.get('cursor')) if filter.is_valid() else None
+    return cards_page(cached_page('housing_list', PUBLIC, params, compute_page), 'list')
+
+
 @login_required
-def housing_list(request):
+async def housing_list(request):
     """
-    Список объектов жилья с возможностью сортировки и фильтрации
+    Список объектов жилья с возможностью сортировки и фильтрации.
+    Страница списка, фасеты, популярные запросы и популярные объекты
+    загружаются через sync_to_async (thread_sensitive) в одном потоке
+    по очереди: gather не ускоряет их, а только не блокирует цикл событий.
     """
+    user = await arequest_user(request)
 
     # Логика фильтрации объектов
     housing = Housing.objects.filter(is_visible=True).order_by('-created_at')
@@ -61,106 +154,211 @@ def housing_list(request):
     # Получаем ключевое слово из GET-запроса
     keyword = request.GET.get('keyword', None)
 
-    if keyword:
-        # Фильтруем объекты по ключевому слову
-        housing = housing.filter(Q(description__icontains=keyword) | Q(name__icontains=keyword))
-
-        # Сохраняем запрос в историю поиска
-        if request.user.is_authenticated:
-            search_entry, created = SearchHistory.objects.get_or_create(
-                user=request.user, keyword=keyword
-            )
-            if not created:
-                # Если запрос уже существует, увеличиваем счетчик
-                search_entry.search_count = F('search_count') + 1
-                search_entry.save()
-
-    # Аннотируем количество отзывов и средний рейтинг
-    housing = housing.annotate(
-        review_count=Count('reviews'),  # Подсчет количества отзывов
-        average_rating=Avg('reviews__rating')
-    )
+    # Количество отзывов и средний рейтинг хранятся в полях review_count и rating_avg
 
-    # Применяем фильтры
+    # Применяем фильтры (фильтрация по ключевому слову выполняется
+    # в HousingFilter через поисковый бэкенд)
     filter = HousingFilter(request.GET, queryset=housing)
-    filtered_housing = filter.qs
 
-    # Получаем параметр сортировки
+    # Получаем параметр сортировки и применяем его после фильтрации
     sort_by = request.GET.get('sort_by')
-
-    # Применение сортировки после фильтрации
-    if sort_by == 'price_asc':
-        filtered_housing = filtered_housing.order_by('price')
-    elif sort_by == 'price_desc':
-        filtered_housing = filtered_housing.order_by('-price')
-    elif sort_by == 'rating_asc':
-        filtered_housing = filtered_housing.order_by('average_rating')  # Сортировка по возрастанию рейтинга
-    elif sort_by == 'rating_desc':
-        filtered_housing = filtered_housing.order_by('-average_rating')  # Сортировка по убыванию рейтинга
-    elif sort_by == 'date_newest':
-        filtered_housing = filtered_housing.order_by('-created_at')
-    elif sort_by == 'date_oldest':
-        filtered_housing = filtered_housing.order_by('created_at')
-    elif sort_by == 'rooms_asc':
-        filtered_housing = filtered_housing.order_by('rooms')
-    elif sort_by == 'rooms_desc':
-        filtered_housing = filtered_housing.order_by('-rooms')
-    elif sort_by == 'country_asc':
-        filtered_housing = filtered_housing.order_by('country')
-    elif sort_by == 'country_desc':
-        filtered_housing = filtered_housing.order_by('-country')
-    elif sort_by == 'city_asc':
-        filtered_housing = filtered_housing.order_by('city')
-    elif sort_by == 'city_desc':
-        filtered_housing = filtered_housing.order_by('-city')
-    elif sort_by == 'post_code_asc':
-        filtered_housing = filtered_housing.order_by('post_code')
-    elif sort_by == 'post_code_desc':
-        filtered_housing = filtered_housing.order_by('-post_code')
-    elif sort_by == 'views_desc':
-        filtered_housing = filtered_housing.order_by('-views')  # Сортировка по просмотрам
-    elif sort_by == 'review_count_desc':
-        filtered_housing = filtered_housing.order_by('-review_count')  # Сортировка по количеству отзывов
-
-    # Получение популярных запросов (по количеству запросов, сортировка по `search_count`)
-    popular_searches = SearchHistory.objects.values('keyword').annotate(
-        count=models.Count('keyword')
-    ).order_by('-count')[:5]  # Выводим топ-5 популярных запросов
-
-    # Получаем популярные объявления, отсортированные по количеству просмотров
-    popular_housing_data = ViewHistory.objects.values('housing').annotate(
-        total_views=Sum('view_count')
-    ).order_by('-total_views')
-
-    # Создаем список кортежей: (housing_object, total_views)
-    popular_housing_list = [
-        (Housing.objects.get(id=data['housing']), data['total_views'])
-        for data in popular_housing_data
-    ]
+    if sort_by not in SORT_ORDERINGS:
+        sort_by = None
+
+    # Окно рейтинга популярных объявлений
+    popular_window = request.GET.get('popular_window')
+    if popular_window not in PopularHousing.Window.values:
+        popular_window = PopularHousing.Window.ALL
+
+    tasks = []
+    if keyword and not request.GET.get('cursor'):
+        # Учитываем запрос в истории поиска и популярных запросах
+        # (при переходе по страницам результатов - не повторно)
+        tasks.append(sync_to_async(record_search)(keyword, user))
+    page, facets, popular_searches, popular_housing_list = (await asyncio.gather(
+        *tasks,
+        sync_to_async(housing_list_page)(request, filter, sort_by),
+        # Количество объектов по значениям фильтров (кэшируется по фильтрам)
+        sync_to_async(get_facets)(filter, PUBLIC),
+        # Популярные запросы с затуханием по времени (кэшируются, историю не читают)
+        sync_to_async(get_trending)(),
+        # Популярные объявления из материализованного рейтинга (кэшируется):
+        # список кортежей (housing_object, total_views)
+        sync_to_async(get_leaderboard)(popular_window),
+    ))[len(tasks):]
 
     # Передача данных в шаблон
     context = {
-        'housing': filtered_housing,
+        'housing': page,
+        'page': page,
         'filter': filter,
+        'facets': facets,
         'sort_by': sort_by,  # Передаем значение сортировки обратно в шаблон
         'keyword': keyword,
         'popular_searches': popular_searches,  # Передаем популярные запросы в шаблон
         'popular_housing_list': popular_housing_list,  # Передаем список кортежей
+        'popular_window': popular_window,
+        'popular_windows': PopularHousing.Window.choices,
     }
-    return render(request, 'booking/housing_list.html', context)
+    return await arender(request, 'booking/housing_list.html', context)
 
 
+class SparseFieldsetViewMixin:
+    """
+    Для GET-запросов использует компактный сериализатор чтения (read_serializer_class)
+    и подгружает через select_related/prefetch_related ровно те связи,
+    которые раскрыты параметром ?expand=
+    """
+    read_serializer_class = None
 
-class BookingViewSet(viewsets.ModelViewSet):
+    def get_serializer_class(self):
+        if self.request.method in SAFE_METHODS and self.read_serializer_class is not None:
+            return self.read_serializer_class
+        return super().get_serializer_class()
+
+    def optimize_queryset(self, queryset):
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetMixin):
+            return queryset
+        expand = parse_field_list(self.request.query_params.get('expand')) or serializer_class.default_expand
+        select, prefetch = serializer_class.get_related_paths(expand)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+
+def reserve_from_serializer(serializer, user):
+    """
+    Создает бронирование из данных API через сервис резервирования
+    """
+    data = serializer.validated_data
+    try:
+        serializer.instance = reserve(
+            data.get('housing'), user, data.get('date_from'), data.get('date_to'), data.get('status')
+        )
+    except ValidationError as e:
+        raise serializers.ValidationError(e.messages)
+
+
+def update_from_serializer(serializer):
+    """
+    Изменяет бронирование из данных API через сервис резервирования
+    """
+    try:
+        update_booking(serializer.instance, **serializer.validated_data)
+    except ValidationError as e:
+        raise serializers.ValidationError(e.messages)
+
+
+class BookingViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows bookings to be viewed or edited.
     """
     queryset = Booking.objects.all().order_by('id')
     serializer_class = BookingSerializer
+    read_serializer_class = BookingReadSerializer
     permission_classes = (IsAuthenticated, IsOwnerOrAdmin)
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        reserve_from_serializer(serializer, self.request.user)
+
+    def perform_update(self, serializer):
+        update_from_serializer(serializer)
+
+    @action(detail=False, methods=['post'], serializer_class=BookingBulkSerializer)
+    def bulk(self, request):
+        """
+        Пакетное изменение статусов и дат бронирований своих объектов:
+        {"items": [{"id": 1, "status": "CONFIRMED"}, {"id": 2, "date_from": ..., "date_to": ...}],
+         "all_or_nothing": false}. Результат возвращается по каждому бронированию.
+        """
+        serializer = BookingBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_update_bookings(
+            request.user, serializer.validated_data['items'], serializer.validated_data['all_or_nothing']
+        )
+        succeeded = sum(1 for result in results if result['ok'])
+        return Response({
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results,
+        })
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """
+    Формат выгрузки задается расширением в URL, а не заголовком Accept:
+    ошибки отдаются первым рендерером (JSON)
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ExportView(APIView):
+    """
+    Потоковая выгрузка бронирований, объектов или отзывов в CSV или NDJSON:
+    /api/export/bookings.csv?created_from=2024-01-01&owner=5. Администратор
+    выгружает все записи, остальные - по своим объектам и свои собственные.
+    """
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = ExportContentNegotiation
+
+    def get(self, request, kind, fmt):
+        if kind not in EXPORTS or fmt not in FORMATS:
+            raise NotFound()
+        filterset = EXPORTS[kind]['filter'](request.query_params, queryset=export_queryset(kind, request.user))
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=400)
+        response = StreamingHttpResponse(export_stream(kind, fmt, filterset.qs), content_type=FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+        return response
+
+
+class OccupancyView(APIView):
+    """
+    Загрузка и выручка объектов по месяцам или дням из дневной статистики:
+    /api/analytics/occupancy/?date_from=2024-01-01&date_to=2024-12-31&group=month&housing=5.
+    Администратор видит все объекты, остальные - свои.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = OccupancyQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        housings = Housing.objects.all()
+        if not (request.user.is_staff or request.user.is_superuser):
+            housings = housings.filter(owner_id=request.user.pk)
+        if 'housing' in params:
+            housings = housings.filter(pk=params['housing'])
+        return Response(occupancy_report(housings, params['date_from'], params['date_to'], params['group']))
+
+
+class HostDashboardView(APIView):
+    """
+    Сводка владельца по всем его объектам: количество бронирований
+    по статусам, ближайшие заезды и ожидающие подтверждения заявки
+    (не больше DASHBOARD_ROWS, объект и гость вложены)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        dashboard = host_dashboard(request.user)
+        rows = {'fields': set(), 'expand': {'housing', 'owner'}, 'many': True}
+        return Response({
+            'counts': dashboard['counts'],
+            'upcoming': BookingReadSerializer(dashboard['upcoming'], **rows).data,
+            'pending': BookingReadSerializer(dashboard['pending'], **rows).data,
+        })
 
 
 class SearchViewSet(viewsets.ModelViewSet):
@@ -181,27 +379,32 @@ class ViewHistoryViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated, IsOwnerOrAdmin)
 
 
-class BookingDetailListCreateView(ListCreateAPIView):
+class BookingDetailListCreateView(SparseFieldsetViewMixin, ListCreateAPIView):
     queryset = Booking.objects.all().order_by('id')
     permission_classes = (IsAuthenticated, IsOwnerOrAdmin)
+    read_serializer_class = BookingDetailReadSerializer
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
-            return BookingDetailSerializer
+            return super().get_serializer_class()
         return BookingDetailCreateUpdateSerializer
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        reserve_from_serializer(serializer, self.request.user)
 
 
-class BookingDetailListRetrieveUpdateView(RetrieveUpdateAPIView):
+class BookingDetailListRetrieveUpdateView(SparseFieldsetViewMixin, RetrieveUpdateAPIView):
     queryset = Booking.objects.all().order_by('id')
+    read_serializer_class = BookingDetailReadSerializer
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
-            return BookingDetailSerializer
+            return super().get_serializer_class()
         return BookingDetailCreateUpdateSerializer
 
+    def perform_update(self, serializer):
+        update_from_serializer(serializer)
+
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -212,58 +415,126 @@ class UserViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminUser]
 
 
-class HousingViewSet(viewsets.ModelViewSet):
+class HousingViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     Эндпоинт просмотра объектов найма и редактирования
     """
     serializer_class = HousingSerializer
+    read_serializer_class = HousingReadSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, RelevanceOrderingFilter]
     filterset_class = HousingFilter
     ordering_fields = '__all__'  # Позволяет сортировать по всем полям модели
-    ordering = ['-created_at']  # Сортировка по умолчанию
+    ordering = ['-created_at']  # Сортировка по умолчанию (при поиске - по релевантности)
 
-    def get_queryset(self):
+    def get_visible_queryset(self):
         """
-        Получение данных с учетом фильтров и видимости, с учетом прав доступа
+        Объекты, доступные пользователю: администратору - все,
+        остальным - видимые и собственные
         """
         user = self.request.user
 
         if user.is_superuser:
             # Если пользователь администратор, возвращаем все объекты
-            queryset = Housing.objects.all()
-        else:
-            # Для обычных пользователей - только видимые объекты
-            # queryset = Housing.objects.filter(is_visible=True)
-            queryset = Housing.objects.filter(
-                Q(is_visible=True) |
-                Q(owner=user)
-            ).order_by('-id')
+            return Housing.objects.all()
+        # Для обычных пользователей - только видимые объекты
+        # queryset = Housing.objects.filter(is_visible=True)
+        return Housing.objects.filter(
+            Q(is_visible=True) |
+            Q(owner_id=user.pk)
+        ).order_by('-id')
 
+    def get_queryset(self):
+        """
+        Получение данных с учетом фильтров и видимости, с учетом прав доступа
+        """
         # Применение фильтров
-        filterset = self.filterset_class(self.request.GET, queryset=queryset)
-        return filterset.qs
+        filterset = self.filterset_class(self.request.GET, queryset=self.get_visible_queryset())
+        return self.optimize_queryset(filterset.qs)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Количество объектов по типам, странам и городам, числу комнат
+        и ценовым диапазонам для текущих фильтров. Для каждого фасета
+        не учитывается его собственный фильтр. Кэшируется по нормализованным
+        фильтрам и области видимости.
+        """
+        user = request.user
+        scope = STAFF if user.is_superuser else owner_group(user.pk)
+        filterset = self.filterset_class(request.GET, queryset=self.get_visible_queryset())
+        facets = get_facets(filterset, scope)
+        if facets is None:
+            return Response(filterset.errors, status=400)
+        return Response(facets)
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def bulk_import(self, request):
+        """
+        Импорт объектов из файла file (multipart) в формате CSV или NDJSON
+        (по расширению или полю file_format). Объекты с уже импортированным
+        external_id обновляются. Администратор может указать владельца owner.
+        Возвращает количество созданных, обновленных и отклоненных строк
+        и ошибки по строкам.
+        """
+        file = request.FILES.get('file')
+        if file is None:
+            return Response({'file': ['Загрузите файл импорта.']}, status=400)
+        fmt = request.data.get('file_format') or detect_format(file.name)
+        if fmt not in IMPORT_FORMATS:
+            return Response({'file_format': [f'Поддерживаемые форматы: {", ".join(IMPORT_FORMATS)}.']}, status=400)
+        owner_id = request.user.pk
+        if request.data.get('owner') and request.user.is_staff:
+            owner_id = request.data['owner']
+            if not str(owner_id).isdigit() or not User.objects.filter(pk=owner_id).exists():
+                return Response({'owner': ['Пользователь не найден.']}, status=400)
+        report = import_housings(read_rows(file, fmt), int(owner_id))
+        return Response(report.as_dict())
 
     def perform_create(self, serializer):
         """
-        Устанавливает текущего пользователя как владельца
+        Устанавливает текущего пользователя как владельца (по id:
+        при JWT-аутентификации request.user не загружается из базы)
         """
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.pk)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API - просмотр записей об отзывах
     """
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    read_serializer_class = ReviewReadSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
 
     def perform_create(self, serializer):
         """
-        Устанавливает текущего пользователя как владельца
+        Устанавливает текущего пользователя как владельца (по id:
+        при JWT-аутентификации request.user не загружается из базы)
         """
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.pk)
+
+
+class TokenObtainView(TokenObtainPairView):
+    """
+    Выдача пары JWT-токенов (access и refresh) по имени пользователя и паролю
+    """
+    serializer_class = TokenObtainClaimsSerializer
+
+
+class TokenRefreshView(TokenViewBase):
+    """
+    Обновление пары JWT-токенов по refresh-токену
+    """
+    serializer_class = TokenRefreshClaimsSerializer
+
+
+class TokenRevokeView(TokenViewBase):
+    """
+    Отзыв refresh-токена или всех токенов пользователя
+    """
+    serializer_class = TokenRevokeSerializer
 
 
 def login_view(request):
@@ -307,14 +578,30 @@ def logout_view(request):
     return redirect('login')  # Перенаправление на страницу логина или другую нужную страницу
 
 
-def index(request):
+def index_page(request):
+    """
+    Страница объектов главной: видимые объекты и собственные объекты пользователя
+    """
+    housing = user_filter(request)
+    cursor = request.GET.get('cursor')
+    cached = cached_page(
+        'index', visibility_scope(request.user), [('cursor', cursor)] if cursor else [],
+        lambda: paginate_html(request, housing, housing.query.order_by)
+    )
+    return cards_page(cached, 'index', request.user)
+
+
+async def index(request):
     """
     Начальная страница сайта - меню "Главная"
     """
     try:
-        return render(request, 'booking/index.html', {
+        await arequest_user(request)
+        page = await sync_to_async(index_page)(request)
+        return await arender(request, 'booking/index.html', {
             'title': 'AT-Booking Просмотр объектов',
-            'housing': user_filter(request)
+            'housing': page,
+            'page': page,
         })
     except Exception as e:
         # # Логирование ошибки для отладки
@@ -322,7 +609,7 @@ def index(request):
         # logger = logging.getLogger(__name__)
         # logger.error(f"Error occurred: {e}")
         # # Перенаправление на страницу с авторизацией
-        return render(request, 'booking/about.html')
+        return await arender(request, 'booking/about.html')
 
 
 def about(request):
@@ -429,27 +716,15 @@ def create_booking(request, housing_id):
         messages.error(request, 'Вы не можете забронировать свой собственный объект.')
         return redirect('message')  # Перенаправляем на страницу списка объектов
 
-    reviews = Review.objects.filter(housing=housing).order_by('owner_id')
+    reviews = Review.objects.filter(housing=housing).select_related('owner').order_by('owner_id')
 
-    # Получение всех занятых дат для данного объекта
-    bookings = Booking.objects.filter(housing=housing)
-    occupied_dates = []
-    for booking in bookings:
-        start_date = booking.date_from
-        end_date = booking.date_to
-        # Создаем список всех дат в диапазоне бронирования
-        current_date = start_date
-        while current_date <= end_date:
-            occupied_dates.append(format(current_date, 'Y-m-d'))
-            current_date += timedelta(days=1)
+    # Занятые периоды объекта берем из календаря занятости
+    calendar = get_calendar(housing.id)
+    occupied_ranges = busy_ranges(housing.id, start=now().date(), calendar=calendar)
 
     if request.method == 'POST':
         form = BookingForm(request.POST)
         if form.is_valid():
-            booking = form.save(commit=False)
-            booking.owner = request.user  # Устанавливаем владельца бронирования
-            booking.housing = housing  # Устанавливаем жилье для бронирования
-
             # Получаем даты из формы
             date_from = form.cleaned_data['date_from']
             date_to = form.cleaned_data['date_to']
@@ -470,24 +745,17 @@ def create_booking(request, housing_id):
                     'housing': housing
                 })
 
-            # Проверка на наличие пересекающихся бронирований
-            overlapping_bookings = Booking.objects.filter(
-                housing=housing,
-                # Проверяем только подтвержденные и ожидающие подтверждения бронирования
-                status__in=[Booking.BookingStatus.CONFIRMED, Booking.BookingStatus.PENDING]
-            ).filter(
-                # Проверка на пересечение дат
-                Q(date_from__lte=date_to, date_to__gte=date_from)
-            )
-
-            if overlapping_bookings.exists():
-                messages.error(request, 'На выбранные даты объект уже забронирован. Пожалуйста, выберите другие даты.')
+            # Проверка пересечений и сохранение выполняются атомарно под блокировкой календаря
+            try:
+                reserve(housing, request.user, date_from, date_to)
+            except DatesUnavailable as e:
+                messages.error(request, e.message)
                 return render(request, 'booking/create_booking.html', {
                     'form': form,
-                    'housing': housing
+                    'housing': housing,
+                    'occupied_ranges': occupied_ranges,
                 })
 
-            booking.save()
             messages.success(request, 'Бронирование успешно создано и ожидает подтверждения!')
             return redirect('my_bookings')  # Перенаправляем на страницу бронирования
     else:
@@ -497,25 +765,25 @@ def create_booking(request, housing_id):
         'form': form,
         'housing': housing,
         'reviews': reviews,
-        'occupied_dates': occupied_dates,
+        'occupied_ranges': occupied_ranges,
     })
 
 
 @login_required
 def my_bookings(request):
-    # Получение всех бронирований пользователя
-    bookings = Booking.objects.filter(owner=request.user)
-
-    # Получение всех отзывов пользователя
-    reviews = Review.objects.filter(owner=request.user).select_related('housing')
+    # Бронирования пользователя постранично, объект загружается в том же запросе
+    bookings = Booking.objects.filter(owner=request.user).select_related('housing')
+    page = paginate_html(request, bookings, ['-created_at'])
 
-    # Создание словаря отзывов по id жилья
-    housing_reviews = {review.housing.id: review for review in reviews}
+    # Отзывы пользователя только об объектах на странице
+    reviews = Review.objects.filter(owner=request.user, housing_id__in={booking.housing_id for booking in page})
+    housing_reviews = {review.housing_id: review for review in reviews}
+    for booking in page:
+        booking.review = housing_reviews.get(booking.housing_id)
 
-    # Добавление флага наличия отзыва в контексте
     context = {
-        'bookings': bookings,
-        'housing_reviews': housing_reviews,
+        'bookings': page,
+        'page': page,
     }
     return render(request, 'booking/my_bookings.html', context)
 
@@ -549,7 +817,15 @@ def edit_booking(request, booking_id):
     if request.method == 'POST':
         form = EditBookingForm(request.POST, instance=booking)
         if form.is_valid():
-            form.save()
+            # Новые даты не должны пересекаться с другими бронированиями объекта
+            try:
+                reschedule(booking, form.cleaned_data['date_from'], form.cleaned_data['date_to'])
+            except DatesUnavailable as e:
+                messages.error(request, e.message)
+                return render(request, 'booking/edit_booking.html', {
+                    'form': form,
+                    'booking': booking
+                })
             # Перенаправляем на страницу со списком бронирований после сохранения
             return redirect('my_bookings')
     else:
@@ -576,7 +852,15 @@ def change_booking_status(request, booking_id):
     if request.method == 'POST':
         form = ChangeBookingStatusForm(request.POST, instance=booking)
         if form.is_valid():
-            form.save()
+            # Подтверждение возможно, только если даты не заняты другим бронированием
+            try:
+                change_status(booking, form.cleaned_data['status'])
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+                return render(request, 'booking/change_booking_status.html', {
+                    'form': form,
+                    'booking': booking
+                })
             messages.success(request, "Статус бронирования успешно обновлен.")
             # Перенаправляем на страницу со списком бронирований после изменения статуса бронирования
             return redirect('my_confirmation')
@@ -594,44 +878,48 @@ def my_confirmation(request):
     """
     Подтверждение бронирования
     """
-    user = request.user
+    # Администратор видит все заявки со статусом PENDING или UNCONFIRMED,
+    # владелец - заявки на свои объекты; страница ограничена HTML_PAGE_SIZE
+    bookings_status = host_bookings(request.user).filter(
+        status__in=PENDING_STATUSES
+    ).select_related('housing')
+    page = paginate_html(request, bookings_status, ['-created_at'])
 
-    # Если пользователь администратор, получаем все бронирования со статусом PENDING или UNCONFIRMED
-    if user.is_staff or user.is_superuser:
-        bookings_status = Booking.objects.filter(status__in=['PENDING', 'UNCONFIRMED']).order_by('-created_at')
-    else:
-        # Для владельца объекта получаем бронирования его объектов со статусом PENDING или UNCONFIRMED
-        bookings_status = Booking.objects.filter(
-            housing__owner=user, status__in=['PENDING', 'UNCONFIRMED']
-        ).order_by('-created_at')
-
-    return render(request, 'booking/my_confirmation.html', {'bookings_status': bookings_status})
+    return render(request, 'booking/my_confirmation.html', {'bookings_status': page, 'page': page})
 
 
 @login_required
-def housing_detail(request, housing_id):
+def host_dashboard_page(request):
     """
-    Детальная страница объекта жилья
+    Сводка владельца: бронирования по статусам, ближайшие заезды
+    и заявки, ожидающие подтверждения
     """
-    housing = get_object_or_404(Housing, pk=housing_id)
-    reviews = Review.objects.filter(housing=housing)
+    return render(request, 'booking/host_dashboard.html', host_dashboard(request.user))
 
-    # Проверка, есть ли у пользователя запись о просмотре данного объявления
-    if request.user.is_authenticated:
-        view_entry, created = ViewHistory.objects.get_or_create(
-            user=request.user,
-            housing=housing
-        )
-        if not created:
-            # Если запись о просмотре уже существует, увеличиваем счетчик просмотров
-            view_entry.view_count = F('view_count') + 1
-            view_entry.save()
+
+@login_required
+async def housing_detail(request, housing_id):
+    """
+    Детальная страница объекта жилья. Объект (с агрегатами рейтинга)
+    и его отзывы загружаются через асинхронный ORM. Запросы ORM выполняются
+    в одном потоке sync_to_async (thread_sensitive) по очереди: gather
+    не ускоряет их, а только не блокирует цикл событий на время загрузки.
+    """
+    user = await arequest_user(request)
+    reviews = Review.objects.filter(housing_id=housing_id).select_related('owner')
+    housing, reviews = await asyncio.gather(
+        aget_object_or_404(Housing, pk=housing_id),
+        alist(reviews),
+    )
+
+    # Учитываем просмотр (история пользователя, счетчики популярности) через буфер
+    await sync_to_async(record_housing_view)(housing.id, user)
 
     context = {
         'housing': housing,
         'reviews': reviews
     }
-    return render(request, 'booking/housing_detail.html', context)
+    return await arender(request, 'booking/housing_detail.html', context)
 
 
 def message(request):
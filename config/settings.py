@@ -1,6 +1,8 @@
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from environ import Env
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -13,17 +15,35 @@ ALLOWED_HOSTS = env.list('ALLOWED_HOSTS')
 
 # Глобальные настройки Rest-фреймворка:
 REST_FRAMEWORK = {
-    # Глобальная настройка пагинации
+    # Глобальная настройка пагинации: курсорная (keyset), без COUNT(*) и OFFSET
     'DEFAULT_PAGINATION_CLASS':
-        'rest_framework.pagination.PageNumberPagination',
-        # Размер страницы по умолчанию:
-        'PAGE_SIZE': 1,
+        'booking.pagination.KeysetCursorPagination',
+        # Размер страницы по умолчанию (клиент может задать page_size, но не больше 100):
+        'PAGE_SIZE': 20,
 
     # Разрешения доступа по умолчанию
     'DEFAULT_PERMISSION_CLASSES': [
         # по умолчанию разрешен просмотр для всех:
         'rest_framework.permissions.AllowAny',
-    ]
+    ],
+
+    # Аутентификация: JWT без обращения к базе (пользователь из claims),
+    # сессии и Basic - для браузера и старых клиентов
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'booking.authentication.JWTClaimsAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+
+# JWT-токены API (/api/token/): время жизни access- и refresh-токенов.
+# Список отозванных токенов хранится в кэше (для нескольких процессов
+# нужен общий кэш, CACHE_URL, см. CACHES); access-токен после отзыва всех токенов
+# пользователя отклоняется сразу, отдельный access-токен живет до истечения.
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=env.int('JWT_ACCESS_TOKEN_MINUTES', default=5)),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=env.int('JWT_REFRESH_TOKEN_DAYS', default=1)),
+    'UPDATE_LAST_LOGIN': False,
 }
 # Application definition
 
@@ -40,6 +60,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы учитывать и запросы сессий/аутентификации
+    'booking.middleware.QueryInstrumentationMiddleware',
+    # Выбор реплики для чтения до первых запросов к базе (сессия, пользователь)
+    'booking.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,10 +117,135 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Транзакции сразу берут блокировку на запись: иначе при параллельных
+                # запросах SQLite отвечает "database is locked" без ожидания
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
         }
     }
 
 
+# Реплики для чтения (DB_REPLICAS через запятую): для MySQL - хосты
+# host[:port] с теми же базой и учетными данными, для SQLite - файлы баз
+# (копии основной, см. команду sync_sqlite_replicas). Из реплик читают
+# запросы GET/HEAD/OPTIONS; после записи пользователь REPLICA_STICKY_SECONDS
+# читает из основной базы. В тестах реплики - зеркала основной базы.
+for i, replica in enumerate(env.list('DB_REPLICAS', default=[])):
+    if env.bool('MYSQL', default=False):
+        host, _, port = replica.partition(':')
+        replica = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    else:
+        replica = {'NAME': BASE_DIR / replica}
+    DATABASES[f'replica_{i}'] = {**DATABASES['default'], **replica, 'TEST': {'MIRROR': 'default'}}
+READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=5)
+DATABASE_ROUTERS = ['booking.db_router.ReplicaRouter']
+
+
+# Максимальное количество бронирований в одном пакетном изменении (API)
+BOOKING_BULK_MAX_ITEMS = env.int('BOOKING_BULK_MAX_ITEMS', default=100)
+
+# Размер пачки строк потоковой выгрузки (/api/export/): столько строк
+# читается из базы одним запросом и держится в памяти
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=2000)
+
+# Импорт объектов (команда import_housings, /api/housings/import/):
+# строк в одной пачке (одна транзакция) и сколько ошибок по строкам
+# возвращать в отчете
+IMPORT_CHUNK_SIZE = env.int('IMPORT_CHUNK_SIZE', default=500)
+IMPORT_MAX_ERRORS = env.int('IMPORT_MAX_ERRORS', default=1000)
+
+# Максимальная длина периода отчета о загрузке (/api/analytics/occupancy/), дней
+ANALYTICS_MAX_DAYS = env.int('ANALYTICS_MAX_DAYS', default=366)
+
+# Размер страницы списков объектов на HTML-страницах
+HTML_PAGE_SIZE = env.int('HTML_PAGE_SIZE', default=20)
+
+# Сколько ближайших заездов и ожидающих заявок показывает сводка владельца
+DASHBOARD_ROWS = env.int('DASHBOARD_ROWS', default=10)
+
+# Кэш (по умолчанию - в памяти процесса, для нескольких процессов
+# задайте CACHE_URL, например redis://127.0.0.1:6379/1)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+# Общий для всех процессов кэш (не в памяти процесса и не заглушка)
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+# Кэш в памяти процесса допустим только при одном процессе: runserver
+# с DEBUG, тесты или SINGLE_PROCESS=True
+SINGLE_PROCESS = env.bool('SINGLE_PROCESS', default=DEBUG or sys.argv[1:2] == ['test'])
+# Список отозванных JWT-токенов и отметки использованных refresh-токенов
+# хранятся в кэше: без общего кэша другой процесс примет отозванный токен
+if ('booking.authentication.JWTClaimsAuthentication' in REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES']
+        and not SHARED_CACHE and not SINGLE_PROCESS):
+    raise ImproperlyConfigured('JWT token revocation requires a shared cache (CACHE_URL) or SINGLE_PROCESS=True')
+
+# Кэш страниц списков объектов (сек.): сбрасывается сигналами при изменении
+# объектов, отзывов и бронирований, TTL ограничивает устаревание сортировки
+# по просмотрам. Карточки объектов кэшируются отдельно.
+LISTING_CACHE_TTL = env.int('LISTING_CACHE_TTL', default=60)
+HOUSING_CARD_CACHE_TTL = env.int('HOUSING_CARD_CACHE_TTL', default=3600)
+
+# Фасеты фильтра (кэшируются вместе со списками): границы ценовых
+# диапазонов и сколько городов показывать
+FACET_PRICE_BUCKETS = env.list('FACET_PRICE_BUCKETS', cast=int, default=[50, 100, 150, 250, 500])
+FACET_CITY_LIMIT = env.int('FACET_CITY_LIMIT', default=20)
+
+# Рейтинг популярных объектов: размер и время жизни в кэше (сек.)
+POPULAR_HOUSING_LIMIT = env.int('POPULAR_HOUSING_LIMIT', default=10)
+POPULAR_HOUSING_TTL = env.int('POPULAR_HOUSING_TTL', default=300)
+
+# Популярные запросы: размер списка, время жизни в кэше (сек.)
+# и период полураспада веса запроса (часы)
+TRENDING_SEARCH_LIMIT = env.int('TRENDING_SEARCH_LIMIT', default=5)
+TRENDING_SEARCH_TTL = env.int('TRENDING_SEARCH_TTL', default=300)
+TRENDING_SEARCH_HALF_LIFE = env.float('TRENDING_SEARCH_HALF_LIFE', default=24)
+
+# Буфер просмотров объектов: просмотры записываются в базу пачками
+# по достижении VIEW_BUFFER_MAX_EVENTS событий или раз в VIEW_BUFFER_FLUSH_INTERVAL сек.
+VIEW_BUFFER_ENABLED = env.bool('VIEW_BUFFER_ENABLED', default=True)
+VIEW_BUFFER_MAX_EVENTS = env.int('VIEW_BUFFER_MAX_EVENTS', default=500)
+VIEW_BUFFER_FLUSH_INTERVAL = env.float('VIEW_BUFFER_FLUSH_INTERVAL', default=5.0)
+
+
+# Поисковый бэкенд для фильтра по ключевым словам: 'auto' - SQLite FTS5
+# или MySQL FULLTEXT по типу базы, путь к классу - свой бэкенд,
+# пустая строка - поиск через icontains по полям объекта
+SEARCH_BACKEND = env.str('SEARCH_BACKEND', default='auto')
+
+
+# Бюджеты SQL-запросов на одну страницу (по имени URL): число - бюджет
+# GET и HEAD, словарь - бюджеты по HTTP-методам. Превышение логируется
+# middleware и проваливает тесты booking.tests
+QUERY_BUDGETS = {
+    'index': 5,
+    # Без кэша: страница списка, запись поиска и фасеты (до 5 запросов)
+    'housing_list': 15,
+    'housing_detail': 5,
+    'create_booking': 7,
+    'my_bookings': 5,
+    'my_confirmation': 4,
+    'host_dashboard': 5,
+    'host-dashboard': 5,
+    # Создание объекта - вместе с поисковым документом и индексом FTS
+    'housings-list': {'GET': 4, 'POST': 12},
+    # Создание бронирования - под блокировкой календаря, с его пересчетом
+    # и пересчетом дневной статистики
+    'booking-list': {'GET': 4, 'POST': 16},
+    'reviews-list': 4,
+    'booking-details-list': 4,
+    # Вместе с чтением сессии и пересчетом дневной статистики (3 запроса на пакет)
+    'booking-bulk': {'POST': 12},
+    'housings-facets': 7,
+    'analytics-occupancy': 4,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -139,9 +288,23 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',  # стандартный бэкенд, оставляем для поддержки других методов
+    # Стандартный ModelBackend с кэшем пользователя сессии и его прав
+    'booking.backends.CachedModelBackend',
 ]
 
+# Сессии хранятся в базе. Сессии в кэше (backends.cache, backends.cached_db)
+# допустимы только с общим кэшем (CACHE_URL): с кэшем в памяти процесса
+# выход из системы не сбросит сессию в других процессах.
+SESSION_ENGINE = env.str('SESSION_ENGINE', default='django.contrib.sessions.backends.db')
+if SESSION_ENGINE in ('django.contrib.sessions.backends.cache',
+                      'django.contrib.sessions.backends.cached_db') and not SHARED_CACHE:
+    raise ImproperlyConfigured(f'SESSION_ENGINE={SESSION_ENGINE} requires a shared cache (CACHE_URL)')
+
+# Время жизни пользователя сессии и его прав в кэше (сек.). Кэш сбрасывается
+# при изменении пользователя, групп и прав, TTL ограничивает устаревание
+# в процессах с собственным (не общим) кэшем.
+USER_CACHE_TTL = env.int('USER_CACHE_TTL', default=60)
+
 LOGIN_URL = 'login'  # URL для перенаправления на страницу входа
 LOGIN_REDIRECT_URL = '/'  # На какую страницу перенаправить после входа
 LOGOUT_REDIRECT_URL = '/'  # URL для перенаправления после выхода
@@ -0,0 +1,21 @@
+#!/bin/bash
+# Подключает реплику к основному серверу mysql (выполняется один раз,
+# при инициализации пустого тома реплики). База и пользователь приложения
+# создаются на обоих серверах при инициализации без записи в журнал,
+# поэтому реплицируются только последующие изменения (миграции и данные).
+# Если основная база заполнялась до включения журнала (старый том
+# mysql_data), перенесите ее на реплику вручную (mysqldump).
+set -e
+mysql -uroot -p"$MYSQL_ROOT_PASSWORD" <<SQL
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST='mysql',
+    SOURCE_USER='root',
+    SOURCE_PASSWORD='$MYSQL_ROOT_PASSWORD',
+    SOURCE_AUTO_POSITION=1,
+    SOURCE_CONNECT_RETRY=5,
+    GET_SOURCE_PUBLIC_KEY=1;
+START REPLICA;
+-- Только чтение для пользователя приложения (не для репликации); не в
+-- параметрах запуска: инициализация тома создает базу и пользователя
+SET PERSIST read_only = ON;
+SQL